@@ -3,6 +3,9 @@ import torch.nn as nn
 from torch.distributions import MultivariateNormal
 from torch.distributions import Categorical
 
+from returns import discounted_returns
+from compile_policy import categorical_sample, compile_rollout_policy, gaussian_sample
+
 
 
 ################################## set device ##################################
@@ -29,20 +32,43 @@ print("=========================================================================
 
 
 class RolloutBuffer:
-    def __init__(self):
-        self.actions = []
-        self.states = []
-        self.logprobs = []
-        self.rewards = []
-        self.is_terminals = []
+    # fixed capacity buffer backed by preallocated tensors, writes are O(1)
+    # and batch() hands out views instead of stacking lists of tensors
+    def __init__(self, capacity, state_dim, action_dim, has_continuous_action_space):
+        self.capacity = capacity
+        self.states = torch.zeros((capacity, state_dim), dtype=torch.float32)
+        if has_continuous_action_space:
+            self.actions = torch.zeros((capacity, action_dim), dtype=torch.float32)
+        else:
+            self.actions = torch.zeros(capacity, dtype=torch.int32)
+        self.logprobs = torch.zeros(capacity, dtype=torch.float32)
+        self.rewards = torch.zeros(capacity, dtype=torch.float32)
+        self.is_terminals = torch.zeros(capacity, dtype=torch.bool)
+        self.size = 0
+
+
+    def add(self, state, action, action_logprob):
+        assert self.size < self.capacity, "RolloutBuffer is full ({} transitions), call clear() first".format(self.capacity)
+        self.states[self.size] = state
+        self.actions[self.size] = action.reshape(self.actions[self.size].shape)
+        self.logprobs[self.size] = action_logprob.reshape(())
+        self.size += 1
+
+
+    def add_reward(self, reward, is_terminal):
+        # outcome of the action stored by the last add()
+        self.rewards[self.size - 1] = reward
+        self.is_terminals[self.size - 1] = is_terminal
+
+
+    def batch(self):
+        n = self.size
+        return self.states[:n], self.actions[:n], self.logprobs[:n], self.rewards[:n], self.is_terminals[:n]
     
 
     def clear(self):
-        del self.actions[:]
-        del self.states[:]
-        del self.logprobs[:]
-        del self.rewards[:]
-        del self.is_terminals[:]
+        # storage is kept and reused by the next rollout
+        self.size = 0
 
 
 class ActorCritic(nn.Module):
@@ -137,8 +163,25 @@ class ActorCritic(nn.Module):
         return action_logprobs, state_values, dist_entropy
 
 
+class RolloutPolicy(nn.Module):
+    # act() of an ActorCritic as one module that torch.jit.trace /
+    # torch.compile can take, the actor is shared with the policy
+    def __init__(self, policy):
+        super(RolloutPolicy, self).__init__()
+        self.actor = policy.actor
+        self.has_continuous_action_space = policy.has_continuous_action_space
+        if self.has_continuous_action_space:
+            self.register_buffer('action_var', policy.action_var.clone())
+
+    def forward(self, state):
+        if self.has_continuous_action_space:
+            return gaussian_sample(self.actor(state), self.action_var)
+        return categorical_sample(self.actor(state))
+
+
 class PPO:
-    def __init__(self, state_dim, action_dim, lr_actor, lr_critic, gamma, K_epochs, eps_clip, has_continuous_action_space, action_std_init=0.6):
+    def __init__(self, state_dim, action_dim, lr_actor, lr_critic, gamma, K_epochs, eps_clip, has_continuous_action_space, action_std_init=0.6,
+                    buffer_size=4000, rollout_compile=None):
 
         self.has_continuous_action_space = has_continuous_action_space
 
@@ -149,7 +192,7 @@ class PPO:
         self.eps_clip = eps_clip
         self.K_epochs = K_epochs
         
-        self.buffer = RolloutBuffer()
+        self.buffer = RolloutBuffer(buffer_size, state_dim, action_dim, has_continuous_action_space)
 
         self.policy = ActorCritic(state_dim, action_dim, has_continuous_action_space, action_std_init).to(device)
         self.optimizer = torch.optim.Adam([
@@ -159,6 +202,13 @@ class PPO:
 
         self.policy_old = ActorCritic(state_dim, action_dim, has_continuous_action_space, action_std_init).to(device)
         self.policy_old.load_state_dict(self.policy.state_dict())
+
+        # None / 'trace' / 'compile' : rollout actions from a compiled copy of
+        # policy_old (see compile_policy.py), rebuilt lazily when it changes
+        self.rollout_compile = rollout_compile
+        self.rollout_module = None
+        self.rollout_policy = None
+        self.rollout_stale = True
         
         self.MseLoss = nn.MSELoss()
 
@@ -169,6 +219,7 @@ class PPO:
             self.action_std = new_action_std
             self.policy.set_action_std(new_action_std)
             self.policy_old.set_action_std(new_action_std)
+            self.rollout_stale = True
         
         else:
             print("--------------------------------------------------------------------------------------------")
@@ -195,50 +246,68 @@ class PPO:
         print("--------------------------------------------------------------------------------------------")
 
 
+    def refresh_rollout_policy(self):
+        # the compiled module shares the actor weights with policy_old, only
+        # the action variance has to be copied over
+        self.rollout_stale = False
+        if self.rollout_compile is None:
+            return
+        if self.rollout_module is not None:
+            if self.has_continuous_action_space:
+                self.rollout_module.action_var.copy_(self.policy_old.action_var)
+            return
+        self.rollout_module = RolloutPolicy(self.policy_old).to(device)
+        example_inputs = (torch.zeros(self.policy_old.actor[0].in_features, device=device),)
+        self.rollout_policy = compile_rollout_policy(self.rollout_module, example_inputs, self.rollout_compile)
+        if self.rollout_policy is None:
+            # eager fallback, stop trying
+            self.rollout_compile = None
+
+
+    def rollout_act(self, state):
+        # policy_old.act(), through the compiled module when there is one
+        if self.rollout_stale:
+            self.refresh_rollout_policy()
+        if self.rollout_policy is None:
+            return self.policy_old.act(state)
+        return self.rollout_policy(state)
+
+
     def select_action(self, state):
 
         if self.has_continuous_action_space:
             with torch.no_grad():
                 state = torch.FloatTensor(state).to(device)
-                action, action_logprob = self.policy_old.act(state)
+                action, action_logprob = self.rollout_act(state)
 
-            self.buffer.states.append(state)
-            self.buffer.actions.append(action)
-            self.buffer.logprobs.append(action_logprob)
+            self.buffer.add(state, action, action_logprob)
 
             return action.detach().cpu().numpy().flatten()
 
         else:
             with torch.no_grad():
                 state = torch.FloatTensor(state).to(device)
-                action, action_logprob = self.policy_old.act(state)
+                action, action_logprob = self.rollout_act(state)
             
-            self.buffer.states.append(state)
-            self.buffer.actions.append(action)
-            self.buffer.logprobs.append(action_logprob)
+            self.buffer.add(state, action, action_logprob)
 
             return action.item()
 
 
     def update(self):
 
+        # views into the buffer storage, nothing is copied on cpu
+        buffer_states, buffer_actions, buffer_logprobs, buffer_rewards, buffer_is_terminals = self.buffer.batch()
+
         # Monte Carlo estimate of returns
-        rewards = []
-        discounted_reward = 0
-        for reward, is_terminal in zip(reversed(self.buffer.rewards), reversed(self.buffer.is_terminals)):
-            if is_terminal:
-                discounted_reward = 0
-            discounted_reward = reward + (self.gamma * discounted_reward)
-            rewards.insert(0, discounted_reward)
+        rewards = discounted_returns(buffer_rewards, buffer_is_terminals, self.gamma).to(device)
             
         # Normalizing the rewards
-        rewards = torch.tensor(rewards, dtype=torch.float32).to(device)
         rewards = (rewards - rewards.mean()) / (rewards.std() + 1e-7)
 
-        # convert list to tensor
-        old_states = torch.squeeze(torch.stack(self.buffer.states, dim=0)).detach().to(device)
-        old_actions = torch.squeeze(torch.stack(self.buffer.actions, dim=0)).detach().to(device)
-        old_logprobs = torch.squeeze(torch.stack(self.buffer.logprobs, dim=0)).detach().to(device)
+        old_states = buffer_states.to(device)
+        old_actions = buffer_actions.to(device)
+        old_logprobs = buffer_logprobs.to(device)
 
         
         # Optimize policy for K epochs
@@ -268,6 +337,7 @@ class PPO:
             
         # Copy new weights into old policy
         self.policy_old.load_state_dict(self.policy.state_dict())
+        self.rollout_stale = True
 
         # clear buffer
         self.buffer.clear()
@@ -280,6 +350,7 @@ class PPO:
     def load(self, checkpoint_path):
         self.policy_old.load_state_dict(torch.load(checkpoint_path, map_location=lambda storage, loc: storage))
         self.policy.load_state_dict(torch.load(checkpoint_path, map_location=lambda storage, loc: storage))
+        self.rollout_stale = True
         
         
        
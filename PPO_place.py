@@ -1,10 +1,19 @@
+import copy
+import time
+
 import torch
 import torch.nn as nn
 from torch.distributions import MultivariateNormal
 from torch.distributions import Categorical
-from gcn import PlaceGCN
+from gcn import DEFAULT_BACKEND, PlaceGCN
+from compile_policy import categorical_sample, compile_rollout_policy
 import torchvision.models as models
-from resnet import resnet20
+from encoders import make_canvas_encoder
+from profiler import profiler
+from metrics import metrics
+from ddp import allreduce_gradients, broadcast_module
+from canvas import canvas_input, pack_canvases, packed_size
+from returns import discounted_returns, gae
 
 ################################## set device ##################################
 
@@ -29,25 +38,107 @@ print("=========================================================================
 ################################## PPO Policy ##################################
 
 
+def split_state(state):
+    # (node id, flattened canvas) vector or (node_ids, canvases) tuple ->
+    # (node_ids, canvases) batch of one
+    if isinstance(state, tuple):
+        return state
+    return state[0:1], state[1:].unsqueeze(0)
+
+
 class RolloutBuffer:
-    def __init__(self):
-        self.actions = []
-        self.states = []
-        self.logprobs = []
-        self.rewards = []
-        self.is_terminals = []
+    # fixed capacity buffer backed by preallocated tensors with compact
+    # dtypes; writes are O(1), batch() returns views (no stack / copy) and
+    # the storage is reused by every rollout. Storage is time major,
+    # (capacity // num_envs, num_envs, ...), so that returns of environments
+    # stepped in lockstep (BatchPlaceEnv) stay separated. Canvases are kept
+    # bit packed (canvas.py), 1 bit per cell.
+    def __init__(self, capacity, canvas_size, num_envs=1):
+        assert capacity % num_envs == 0
+        self.capacity = capacity
+        self.num_envs = num_envs
+        self.canvas_size = canvas_size
+        num_rows = capacity // num_envs
+        self.node_ids = torch.zeros((num_rows, num_envs), dtype=torch.int32)
+        self.canvases = torch.zeros((num_rows, num_envs, packed_size(canvas_size)), dtype=torch.uint8)
+        self.actions = torch.zeros((num_rows, num_envs), dtype=torch.int32)
+        self.logprobs = torch.zeros((num_rows, num_envs), dtype=torch.float32)
+        self.rewards = torch.zeros((num_rows, num_envs), dtype=torch.float32)
+        self.is_terminals = torch.zeros((num_rows, num_envs), dtype=torch.bool)
+        self.size = 0   # rows written
+
+
+    def add(self, state, action, action_logprob):
+        # state : (node id, flattened canvas) vector as passed to ActorCritic.act(),
+        # or a (node_ids, canvases) tuple of one state
+        assert self.num_envs == 1, "use add_batch() with num_envs > 1"
+        node_ids, canvases = split_state(state)
+        self.add_batch(node_ids, canvases, action, action_logprob)
+
+
+    def add_batch(self, node_ids, canvases, actions, action_logprobs):
+        # one row of num_envs transitions, canvases plain or already packed
+        assert self.size < self.node_ids.shape[0], "RolloutBuffer is full ({} transitions), call clear() first".format(self.capacity)
+        self.node_ids[self.size] = node_ids
+        if canvases.shape[-1] == self.canvas_size:
+            canvases = pack_canvases(canvases)
+        self.canvases[self.size] = canvases
+        self.actions[self.size] = actions
+        self.logprobs[self.size] = action_logprobs
+        self.size += 1
+
+
+    def add_rows(self, node_ids, canvases, actions, action_logprobs, rewards, is_terminals):
+        # n consecutive rows with their outcomes at once, e.g. a whole episode
+        # from an actor process (actor_learner.py); canvases plain or packed
+        n = node_ids.shape[0]
+        assert self.size + n <= self.node_ids.shape[0], "RolloutBuffer is full ({} transitions), call clear() first".format(self.capacity)
+        rows = slice(self.size, self.size + n)
+        if canvases.shape[-1] == self.canvas_size:
+            canvases = pack_canvases(canvases)
+        self.node_ids[rows] = node_ids.reshape(n, self.num_envs)
+        self.canvases[rows] = canvases.reshape(n, self.num_envs, -1)
+        self.actions[rows] = actions.reshape(n, self.num_envs)
+        self.logprobs[rows] = action_logprobs.reshape(n, self.num_envs)
+        self.rewards[rows] = rewards.reshape(n, self.num_envs)
+        self.is_terminals[rows] = is_terminals.reshape(n, self.num_envs)
+        self.size += n
+
+
+    def add_reward(self, reward, is_terminal):
+        # outcome of the action(s) stored by the last add() / add_batch()
+        self.rewards[self.size - 1] = torch.as_tensor(reward, dtype=torch.float32)
+        self.is_terminals[self.size - 1] = torch.as_tensor(is_terminal, dtype=torch.bool)
+
+
+    def batch(self):
+        # (rows, num_envs, ...) views of the stored transitions
+        n = self.size
+        return (self.node_ids[:n], self.canvases[:n], self.actions[:n], self.logprobs[:n],
+                self.rewards[:n], self.is_terminals[:n])
     
 
     def clear(self):
-        del self.actions[:]
-        del self.states[:]
-        del self.logprobs[:]
-        del self.rewards[:]
-        del self.is_terminals[:]
+        self.size = 0
+
+
+    def state_dict(self):
+        # stored rows only (views, snapshot them before the buffer moves on)
+        return {'size' : self.size, 'rows' : self.batch()}
+
+
+    def load_state_dict(self, state):
+        n = state['size']
+        for storage, rows in zip((self.node_ids, self.canvases, self.actions, self.logprobs, self.rewards,
+                                    self.is_terminals), state['rows']):
+            assert rows.shape[1:] == storage.shape[1:], "RolloutBuffer layout of the checkpoint does not match"
+            storage[:n] = rows
+        self.size = n
 
 
 class ActorCritic(nn.Module):
-    def __init__(self, state_dim, action_dim, graph_emb_dim, graph, has_continuous_action_space, action_std_init):
+    def __init__(self, state_dim, action_dim, graph_emb_dim, graph, has_continuous_action_space, action_std_init,
+                    gcn_input_mode = 'one_hot', gcn_backend = DEFAULT_BACKEND, canvas_encoder = 'resnet20'):
         super(ActorCritic, self).__init__()
 
         self.has_continuous_action_space = has_continuous_action_space
@@ -55,12 +146,18 @@ class ActorCritic(nn.Module):
         if has_continuous_action_space:
             self.action_dim = action_dim
             self.action_var = torch.full((action_dim,), action_std_init * action_std_init).to(device)
+        # one action per canvas cell, canvases may come in bit packed
+        self.num_cells = action_dim
 
         # gcn
-        self.gcn = PlaceGCN(graph_emb_dim).to(device)
+        self.gcn = PlaceGCN(graph_emb_dim, input_mode = gcn_input_mode, backend = gcn_backend).to(device)
+        # canvas encoder, see encoders.CANVAS_ENCODERS (kept under the
+        # resnet name so checkpoints keep their keys)
+        self.resnet = make_canvas_encoder(canvas_encoder).to(device)
+        cnn_dim = self.resnet.out_dim
         # actor
         self.actor = nn.Sequential(
-                        nn.Linear(32 + 64, 64), # GCN + CNN
+                        nn.Linear(32 + cnn_dim, 64), # GCN + CNN
                         nn.Tanh(),
                         nn.Linear(64, 64),
                         nn.Tanh(),
@@ -70,16 +167,22 @@ class ActorCritic(nn.Module):
         
         # critic
         self.critic = nn.Sequential(
-                        nn.Linear(32 + 64, 64),
+                        nn.Linear(32 + cnn_dim, 64),
                         nn.Tanh(),
                         nn.Linear(64, 64),
                         nn.Tanh(),
                         nn.Linear(64, 1)
                     )
         
-        self.graph = graph
-        self.resnet = resnet20().to(device)
+        self.graph = self.gcn.prepare_graph(graph)
         self.softmax = nn.Softmax(dim=-1)
+
+        # cached GCN output, see node_embeddings()
+        self.node_emb = None
+
+        # e.g. torch.bfloat16 : reduced precision act() for rollout-only
+        # copies, see action_probs(); evaluate() always runs in float32
+        self.autocast_dtype = None
         
     def set_action_std(self, new_action_std):
 
@@ -93,28 +196,75 @@ class ActorCritic(nn.Module):
 
     def forward(self):
         raise NotImplementedError
+
+
+    def node_embeddings(self):
+        # the GCN output only depends on the netlist graph and the GCN weights
+        # (which are not in the optimizer), so it is computed once per policy
+        # version and shared by every act() / evaluate() call. It is always
+        # float32, also when the first call comes from a bfloat16 act()
+        if self.node_emb is None:
+            with torch.no_grad(), torch.autocast(device.type, enabled = False):
+                gcn_input = self.gcn.node_features(self.graph.num_nodes()).to(device)
+                self.node_emb = self.gcn(self.graph, gcn_input)
+        return self.node_emb
+
+
+    def clear_node_embeddings(self):
+        self.node_emb = None
+
+
+    def load_state_dict(self, state_dict, strict=True):
+        self.clear_node_embeddings()
+        return super(ActorCritic, self).load_state_dict(state_dict, strict)
+
+
+    def _apply(self, fn, *args, **kwargs):
+        # .to() / .cuda() / .float() etc. must not leave a stale cached tensor
+        self.clear_node_embeddings()
+        return super(ActorCritic, self)._apply(fn, *args, **kwargs)
+    
+
+    def features(self, node_ids, canvases):
+        # node_ids : (B,) int, canvases : (B, grid * grid) occupancy of any
+        # dtype or (B, packed size) bit packed, unpacked here for the batch
+        with profiler.phase('gcn'):
+            gcn_res = self.node_embeddings()
+        canvases = canvas_input(canvases.to(device), self.num_cells)
+        grid = int(canvases.shape[-1] ** 0.5)
+        cnn_input = canvases.reshape(-1, 1, grid, grid)
+        with profiler.phase('canvas encoder'):
+            cnn_res = self.resnet(cnn_input)
+        # no squeeze() here, a minibatch may hold a single state
+        gcn_res = torch.index_select(gcn_res, 0, node_ids.long().to(device))
+        return torch.cat((gcn_res, cnn_res), dim = -1)
     
 
     def act(self, state):
-        one_hot_input = torch.eye(self.graph.num_nodes()).to(device)
-        gcn_res = self.gcn(self.graph, one_hot_input)
-        grid = int((state.shape[-1]-1) ** 0.5)
-        cnn_input = state[1:].reshape(1, 1, grid, grid).float().to(device)
-        # print("cnn_input", cnn_input)
-        cnn_res = self.resnet(cnn_input)
-        gcn_res = gcn_res[state[0].int()]
-        gcn_res = gcn_res.squeeze()
-        cnn_res = cnn_res.squeeze()
-        # print("gcn_res shape", gcn_res.shape)
-        # print("cnn_res shape", cnn_res.shape)
-        cat_feature = torch.cat((gcn_res, cnn_res)).to(device)
-        # print("cat feature", cat_feature)
-        action_probs_tmp = self.actor(cat_feature)
-        mask = state[1:].float().to(device)
+        # state : (node id, flattened canvas) vector or (node_ids, canvases) tuple
+        action, action_logprob = self.act_batch(*split_state(state))
+        return action[0], action_logprob[0]
+
+
+    def action_probs(self, node_ids, canvases):
+        # masked action distribution of act_batch(); with autocast_dtype set
+        # the networks run under autocast and only the logits are cast back,
+        # masking and softmax stay in float32
+        canvases = canvas_input(canvases.to(device), self.num_cells)
+        with torch.autocast(device.type, dtype = self.autocast_dtype or torch.bfloat16,
+                            enabled = self.autocast_dtype is not None):
+            cat_feature = self.features(node_ids, canvases)
+            # print("cat feature", cat_feature)
+            with profiler.phase('actor head'):
+                action_probs_tmp = self.actor(cat_feature)
+        mask = canvases
         # print("mask sum = {}".format(mask.sum()))
-        # print("mask", mask)
-        # print("mask shape", mask.shape)
-        action_probs = self.softmax(action_probs_tmp - 1.0e8 * mask)
+        with profiler.phase('actor head'):
+            return self.softmax(action_probs_tmp.float() - 1.0e8 * mask)
+
+
+    def act_batch(self, node_ids, canvases):
+        action_probs = self.action_probs(node_ids, canvases)
         # print("action_probs", action_probs)
         dist = Categorical(action_probs)
 
@@ -124,38 +274,51 @@ class ActorCritic(nn.Module):
         return action.detach(), action_logprob.detach()
     
 
-    def evaluate(self, state, action):
-        # print("===evaluate state===")
-        # print(state)
-        # print("state shape", state.shape)
-        one_hot_input = torch.eye(self.graph.num_nodes()).to(device)
-        gcn_res = self.gcn(self.graph, one_hot_input)
-        grid = int((state.shape[-1] - 1) ** 0.5)
-        # print("state shape", state.shape)
-        cnn_input = state[:, 1:].reshape(-1, 1, grid, grid).float().to(device)
-        # print("cnn_input shape", cnn_input.shape)
-        cnn_res = self.resnet(cnn_input)
-        # print("cnn_res shape", cnn_res.shape)
-        gcn_res = torch.index_select(gcn_res, 0, state[:, 0].int().squeeze())
-        # print("gcn_res shape", gcn_res.shape)
-        gcn_res = gcn_res.squeeze()
-        cnn_res = cnn_res.squeeze()
-        cat_feature = torch.cat((gcn_res, cnn_res), dim = -1)
-        action_probs_tmp = self.actor(cat_feature)
-        mask = state[:, 1:].float().to(device)
-        action_probs = self.softmax(mask * action_probs_tmp)
-        dist = Categorical(action_probs)
-
-        action_logprobs = dist.log_prob(action)
-        dist_entropy = dist.entropy()
-        state_values = self.critic(cat_feature)
+    def evaluate(self, node_ids, canvases, action):
+        canvases = canvas_input(canvases.to(device), self.num_cells)
+        cat_feature = self.features(node_ids, canvases)
+        with profiler.phase('heads'):
+            action_probs_tmp = self.actor(cat_feature)
+            mask = canvases
+            action_probs = self.softmax(mask * action_probs_tmp)
+            dist = Categorical(action_probs)
+
+            action_logprobs = dist.log_prob(action.long())
+            dist_entropy = dist.entropy()
+            state_values = self.critic(cat_feature)
         
         return action_logprobs, state_values, dist_entropy
 
 
+    def value(self, node_ids, canvases):
+        return self.critic(self.features(node_ids, canvases)).reshape(-1)
+
+
+class RolloutPolicy(nn.Module):
+    # act_batch() of an ActorCritic as one module that torch.jit.trace /
+    # torch.compile can take: the GCN output is a buffer filled from the
+    # policy's embedding cache, resnet and actor are shared with the policy
+    def __init__(self, policy, node_emb, grid):
+        super(RolloutPolicy, self).__init__()
+        self.resnet = policy.resnet
+        self.actor = policy.actor
+        self.register_buffer('node_emb', node_emb.detach().clone())
+        self.grid = grid
+
+    def forward(self, node_ids, canvases):
+        cnn_res = self.resnet(canvases.reshape(-1, 1, self.grid, self.grid).float())
+        gcn_res = torch.index_select(self.node_emb, 0, node_ids.long())
+        action_probs_tmp = self.actor(torch.cat((gcn_res, cnn_res), dim = -1))
+        action_probs = torch.softmax(action_probs_tmp - 1.0e8 * canvases.float(), dim = -1)
+        return categorical_sample(action_probs)
+
+
 class PPO:
     def __init__(self, state_dim, action_dim, graph_emb_dim, graph, lr_actor, lr_critic, gamma, K_epochs, 
-                    eps_clip, has_continuous_action_space, action_std_init=0.6):
+                    eps_clip, has_continuous_action_space, action_std_init=0.6, gcn_input_mode='one_hot',
+                    minibatch_size=None, shuffle=True, buffer_size=4000, gae_lambda=None, num_envs=1,
+                    gcn_backend=DEFAULT_BACKEND, rollout_bf16=False, rollout_compile=None, canvas_encoder='resnet20',
+                    single_network=False, distributed=False):
 
         self.has_continuous_action_space = has_continuous_action_space
 
@@ -165,17 +328,62 @@ class PPO:
         self.gamma = gamma
         self.eps_clip = eps_clip
         self.K_epochs = K_epochs
-        
-        self.buffer = RolloutBuffer()
 
-        self.policy = ActorCritic(state_dim, action_dim, graph_emb_dim, graph, has_continuous_action_space, action_std_init).to(device)
+        # None : one full-buffer step per epoch, else K_epochs passes over
+        # the buffer in minibatches of this size (bounds peak memory)
+        self.minibatch_size = minibatch_size
+        self.shuffle = shuffle
+
+        # None : normalized Monte Carlo returns as advantage baseline target,
+        # else GAE(lambda) advantages with bootstrapped critic values
+        self.gae_lambda = gae_lambda
+        
+        # state = (node id, flattened grid * grid canvas)
+        self.buffer = RolloutBuffer(buffer_size, action_dim, num_envs)
+
+        # gcn_backend = 'spmm' : DGL-free sparse matrix GCN, the graph is
+        # converted once and shared with policy_old; the default is 'dgl'
+        # when DGL can be imported
+        self.policy = ActorCritic(state_dim, action_dim, graph_emb_dim, graph, has_continuous_action_space, action_std_init,
+                                    gcn_input_mode, gcn_backend, canvas_encoder).to(device)
+        graph = self.policy.graph
         self.optimizer = torch.optim.Adam([
                         {'params': self.policy.actor.parameters(), 'lr': lr_actor},
                         {'params': self.policy.critic.parameters(), 'lr': lr_critic}
                     ])
 
-        self.policy_old = ActorCritic(state_dim, action_dim, graph_emb_dim, graph, has_continuous_action_space, action_std_init).to(device)
-        self.policy_old.load_state_dict(self.policy.state_dict())
+        # distributed = True : data parallel updates (ddp.py), every rank
+        # starts from the weights of rank 0 and gradients are averaged over
+        # the ranks before each optimizer step
+        self.distributed = distributed
+        if distributed:
+            broadcast_module(self.policy)
+
+        # single_network = True : rollouts sample from policy itself. The
+        # buffer keeps the old log-probs, so the replica is not needed while
+        # rollouts and updates alternate; inference_copy() gives a frozen
+        # copy for actors running concurrently with update()
+        self.single_network = single_network
+        if single_network:
+            self.policy_old = self.policy
+        else:
+            self.policy_old = ActorCritic(state_dim, action_dim, graph_emb_dim, graph, has_continuous_action_space, action_std_init,
+                                        gcn_input_mode, gcn_backend, canvas_encoder).to(device)
+            self.policy_old.load_state_dict(self.policy.state_dict())
+        # rollout actions in bfloat16: the autocast only covers act() /
+        # select_action() (action_probs()), evaluate() and the PPO loss stay
+        # float32, also with single_network where policy_old is policy
+        if rollout_bf16:
+            self.policy_old.autocast_dtype = torch.bfloat16
+
+        # None / 'trace' / 'compile' : rollout actions from a compiled copy of
+        # policy_old (see compile_policy.py), rebuilt lazily after update()
+        self.rollout_compile = None if rollout_bf16 else rollout_compile
+        if rollout_bf16 and rollout_compile is not None:
+            print("rollout_compile is ignored with rollout_bf16, the bfloat16 rollout policy runs eager")
+        self.rollout_module = None
+        self.rollout_policy = None
+        self.rollout_stale = True
         
         self.MseLoss = nn.MSELoss()
         self.graph = graph
@@ -213,6 +421,41 @@ class PPO:
         print("--------------------------------------------------------------------------------------------")
 
 
+    def refresh_rollout_policy(self):
+        # compiled module with the current policy_old embeddings; the module
+        # shares resnet / actor weights with policy_old, only the GCN output
+        # buffer has to be refreshed after an update
+        self.rollout_stale = False
+        if self.rollout_compile is None:
+            return
+        node_emb = self.policy_old.node_embeddings()
+        if self.rollout_module is not None:
+            self.rollout_module.node_emb.copy_(node_emb)
+            return
+        action_dim = self.policy_old.actor[-1].out_features
+        grid = int(action_dim ** 0.5)
+        self.rollout_module = RolloutPolicy(self.policy_old, node_emb, grid).to(device)
+        example_inputs = (torch.zeros(1, dtype=torch.int32, device=device),
+                          torch.zeros((1, grid * grid), dtype=torch.uint8, device=device))
+        self.rollout_policy = compile_rollout_policy(self.rollout_module, example_inputs, self.rollout_compile)
+        if self.rollout_policy is None:
+            # eager fallback, stop trying
+            self.rollout_compile = None
+
+
+    def rollout_act(self, node_ids, canvases):
+        # policy_old.act_batch(), through the compiled module when there is one
+        if self.rollout_stale:
+            with profiler.phase('refresh rollout policy'):
+                self.refresh_rollout_policy()
+        if self.rollout_policy is None:
+            return self.policy_old.act_batch(node_ids, canvases)
+        # the compiled module takes plain canvases, as in its example inputs
+        canvases = canvas_input(canvases.to(device), self.policy_old.num_cells, torch.uint8)
+        with profiler.phase('compiled policy'):
+            return self.rollout_policy(node_ids.to(device), canvases)
+
+
     def select_action(self, state):
 
         if self.has_continuous_action_space:
@@ -220,74 +463,162 @@ class PPO:
                 # state = torch.FloatTensor(state).to(device)
                 action, action_logprob = self.policy_old.act(state)
             # print("===state", state)
-            self.buffer.states.append(torch.tensor([state], dtype = torch.int32))
-            self.buffer.actions.append(action)
-            self.buffer.logprobs.append(action_logprob)
+            self.buffer.add(state, action, action_logprob)
 
             return action.detach().cpu().numpy().flatten()
 
         else:
-            with torch.no_grad():
+            with torch.no_grad(), profiler.phase('act'):
                 # state = torch.FloatTensor(state).to(device)
-                action, action_logprob = self.policy_old.act(state)
+                action, action_logprob = self.rollout_act(*split_state(state))
+                action, action_logprob = action[0], action_logprob[0]
             # print("===state", state)
-            self.buffer.states.append(state)
-            self.buffer.actions.append(action)
-            self.buffer.logprobs.append(action_logprob)
+            with profiler.phase('buffer'):
+                self.buffer.add(state, action, action_logprob)
 
             return action.item()
 
 
-    def update(self):
-
-        # Monte Carlo estimate of returns
-        rewards = []
-        discounted_reward = 0
-        for reward, is_terminal in zip(reversed(self.buffer.rewards), reversed(self.buffer.is_terminals)):
-            if is_terminal:
-                discounted_reward = 0
-            discounted_reward = reward + (self.gamma * discounted_reward)
-            rewards.insert(0, discounted_reward)
-            
-        # Normalizing the rewards
-        rewards = torch.tensor(rewards, dtype=torch.float32).to(device)
-        rewards = (rewards - rewards.mean()) / (rewards.std() + 1e-7)
-
-        # convert list to 
-        # print("===self.buffer.states===")
-        # print(self.buffer.states)
-        old_states = torch.squeeze(torch.stack(self.buffer.states, dim=0)).detach().to(device)
-        old_actions = torch.squeeze(torch.stack(self.buffer.actions, dim=0)).detach().to(device)
-        old_logprobs = torch.squeeze(torch.stack(self.buffer.logprobs, dim=0)).detach().to(device)
+    def select_actions(self, node_ids, canvases):
+        # batched select_action() for num_envs environments stepped together,
+        # node_ids : (num_envs,), canvases : (num_envs, grid * grid)
+        with torch.no_grad(), profiler.phase('act'):
+            actions, action_logprobs = self.rollout_act(node_ids, canvases)
+        with profiler.phase('buffer'):
+            self.buffer.add_batch(node_ids, canvases, actions, action_logprobs)
+        return actions.cpu().numpy()
 
-        
-        # Optimize policy for K epochs
-        for _ in range(self.K_epochs):
 
-            # Evaluating old actions and values
-            logprobs, state_values, dist_entropy = self.policy.evaluate(old_states, old_actions)
+    def minibatches(self, *tensors):
+        # one epoch worth of (minibatch of each tensor) tuples
+        buffer_size = tensors[0].shape[0]
+        if self.minibatch_size is None or self.minibatch_size >= buffer_size:
+            yield tensors
+            return
 
-            # match state_values tensor dimensions with rewards tensor
-            state_values = torch.squeeze(state_values)
+        if self.shuffle:
+            indices = torch.randperm(buffer_size, device=tensors[0].device)
+        else:
+            indices = torch.arange(buffer_size, device=tensors[0].device)
+        for start in range(0, buffer_size, self.minibatch_size):
+            mb_indices = indices[start:start + self.minibatch_size]
+            yield tuple(t if t is None else t[mb_indices] for t in tensors)
+
+
+    def state_values(self, node_ids, canvases):
+        # critic values of the whole buffer, in minibatch sized chunks
+        chunk_size = self.minibatch_size or node_ids.shape[0]
+        with torch.no_grad():
+            return torch.cat([self.policy.value(node_ids[i:i + chunk_size], canvases[i:i + chunk_size])
+                                for i in range(0, node_ids.shape[0], chunk_size)])
+
+
+    def bootstrap_values(self, next_state):
+        # critic value of the state(s) following the last stored row; either a
+        # single (node id, flattened canvas) vector or a batched (node_ids,
+        # canvases) tuple
+        if next_state is None:
+            return torch.zeros(self.buffer.num_envs)
+        node_ids, canvases = split_state(next_state)
+        with torch.no_grad():
+            return self.policy.value(node_ids, canvases).cpu()
+
+
+    def update(self, next_state=None):
+        # next_state : state following the last stored transition, used by
+        # GAE to bootstrap an episode cut off by the end of the rollout
+
+        # new policy version, drop embeddings computed with the previous one
+        self.policy.clear_node_embeddings()
+
+        # views into the buffer storage, nothing is copied on cpu
+        buffer_node_ids, buffer_canvases, buffer_actions, buffer_logprobs, buffer_rewards, buffer_is_terminals = \
+            self.buffer.batch()
+
+        # (rows, num_envs, ...) -> flat batch in time major order
+        old_node_ids = buffer_node_ids.reshape(-1).to(device)
+        old_canvases = buffer_canvases.reshape(-1, buffer_canvases.shape[-1]).to(device)
+        old_actions = buffer_actions.reshape(-1).to(device)
+        old_logprobs = buffer_logprobs.reshape(-1).to(device)
+
+        with profiler.phase('returns'):
+            # returns are computed per environment on the (rows, num_envs) layout
+            if self.gae_lambda is None:
+                # Monte Carlo estimate of returns
+                rewards = discounted_returns(buffer_rewards, buffer_is_terminals, self.gamma).reshape(-1).to(device)
             
-            # Finding the ratio (pi_theta / pi_theta__old)
-            ratios = torch.exp(logprobs - old_logprobs.detach())
+                # Normalizing the rewards
+                rewards = (rewards - rewards.mean()) / (rewards.std() + 1e-7)
+                fixed_advantages = None
+            else:
+                values = self.state_values(old_node_ids, old_canvases).cpu().reshape(buffer_rewards.shape)
+                fixed_advantages, rewards = gae(buffer_rewards, values, buffer_is_terminals,
+                                                self.gamma, self.gae_lambda, self.bootstrap_values(next_state))
+                fixed_advantages = fixed_advantages.reshape(-1)
+                fixed_advantages = (fixed_advantages - fixed_advantages.mean()) / (fixed_advantages.std() + 1e-7)
+                fixed_advantages = fixed_advantages.to(device)
+                rewards = rewards.reshape(-1).to(device)
 
-            # Finding Surrogate Loss
-            advantages = rewards - state_values.detach()   
-            surr1 = ratios * advantages
-            surr2 = torch.clamp(ratios, 1-self.eps_clip, 1+self.eps_clip) * advantages
+        
+        # loss / entropy / clipped ratio sums for the 'update' metrics event,
+        # kept as tensors, read once after the last epoch
+        update_start = time.perf_counter()
+        stats = torch.zeros(3, device = device)
+        num_minibatches = 0
 
-            # final loss of clipped objective PPO
-            loss = -torch.min(surr1, surr2) + 0.5*self.MseLoss(state_values, rewards) - 0.01*dist_entropy
-            
-            # take gradient step
-            self.optimizer.zero_grad()
-            loss.mean().backward()
-            self.optimizer.step()
+        # Optimize policy for K epochs
+        for _ in range(self.K_epochs):
+            for mb_node_ids, mb_canvases, mb_actions, mb_logprobs, mb_rewards, mb_advantages in self.minibatches(
+                    old_node_ids, old_canvases, old_actions, old_logprobs, rewards, fixed_advantages):
+
+                # Evaluating old actions and values
+                with profiler.phase('evaluate'):
+                    logprobs, state_values, dist_entropy = self.policy.evaluate(mb_node_ids, mb_canvases, mb_actions)
+
+                # match state_values tensor dimensions with rewards tensor
+                state_values = state_values.reshape(-1)
+                
+                # Finding the ratio (pi_theta / pi_theta__old)
+                ratios = torch.exp(logprobs - mb_logprobs.detach())
+
+                # Finding Surrogate Loss
+                if mb_advantages is None:
+                    advantages = mb_rewards - state_values.detach()   
+                else:
+                    advantages = mb_advantages
+                surr1 = ratios * advantages
+                surr2 = torch.clamp(ratios, 1-self.eps_clip, 1+self.eps_clip) * advantages
+
+                # final loss of clipped objective PPO
+                loss = -torch.min(surr1, surr2) + 0.5*self.MseLoss(state_values, mb_rewards) - 0.01*dist_entropy
+                
+                # take gradient step
+                with profiler.phase('backward'):
+                    self.optimizer.zero_grad()
+                    loss.mean().backward()
+                if self.distributed:
+                    with profiler.phase('allreduce'):
+                        allreduce_gradients([p for group in self.optimizer.param_groups for p in group['params']])
+                with profiler.phase('optimizer step'):
+                    self.optimizer.step()
+
+                if metrics.enabled:
+                    stats += torch.stack([loss.detach().mean(), dist_entropy.detach().mean(),
+                                          ((ratios.detach() - 1).abs() > self.eps_clip).float().mean()])
+                    num_minibatches += 1
             
         # Copy new weights into old policy
-        self.policy_old.load_state_dict(self.policy.state_dict())
+        with profiler.phase('weight copy'):
+            if self.single_network:
+                self.policy.clear_node_embeddings()
+            else:
+                self.policy_old.load_state_dict(self.policy.state_dict())
+        self.rollout_stale = True
+
+        if metrics.enabled:
+            loss_mean, entropy_mean, clip_fraction = (stats / max(num_minibatches, 1)).tolist()
+            metrics.emit('update', rows = old_actions.shape[0], loss = loss_mean, entropy = entropy_mean,
+                         clip_fraction = clip_fraction, seconds = time.perf_counter() - update_start)
 
         # clear buffer
         self.buffer.clear()
@@ -298,8 +629,46 @@ class PPO:
    
 
     def load(self, checkpoint_path):
-        self.policy_old.load_state_dict(torch.load(checkpoint_path, map_location=lambda storage, loc: storage))
-        self.policy.load_state_dict(torch.load(checkpoint_path, map_location=lambda storage, loc: storage))
+        state_dict = torch.load(checkpoint_path, map_location=lambda storage, loc: storage)
+        self.policy.load_state_dict(state_dict)
+        if not self.single_network:
+            self.policy_old.load_state_dict(state_dict)
+        self.rollout_stale = True
+
+
+    def checkpoint_state(self):
+        # everything needed to continue training: weights, optimizer moments
+        # and the rollout collected so far. policy_old is stored on its own,
+        # its batch norm statistics come from the rollouts, not from update()
+        state = {
+            'policy' : self.policy.state_dict(),
+            'optimizer' : self.optimizer.state_dict(),
+            'buffer' : self.buffer.state_dict(),
+        }
+        if not self.single_network:
+            state['policy_old'] = self.policy_old.state_dict()
+        if self.has_continuous_action_space:
+            state['action_std'] = self.action_std
+        return state
+
+
+    def load_checkpoint_state(self, state):
+        self.policy.load_state_dict(state['policy'])
+        if not self.single_network:
+            self.policy_old.load_state_dict(state.get('policy_old', state['policy']))
+        self.optimizer.load_state_dict(state['optimizer'])
+        self.buffer.load_state_dict(state['buffer'])
+        if 'action_std' in state:
+            self.set_action_std(state['action_std'])
+        self.rollout_stale = True
+
+
+    def inference_copy(self):
+        # frozen copy of the current policy for actors that keep sampling
+        # while update() runs; shares the (read only) graph
+        policy = copy.deepcopy(self.policy, {id(self.policy.graph): self.policy.graph})
+        policy.requires_grad_(False)
+        return policy
         
         
        
@@ -0,0 +1,194 @@
+import queue
+import time
+
+import numpy as np
+import torch
+import torch.multiprocessing as mp
+
+from env.place_env import PlaceEnv
+from metrics import metrics
+from profiler import profiler
+
+# Actor / learner training: num_actors processes run PlaceEnv episodes with
+# their own copy of the rollout policy and stream finished episodes through
+# a queue; the learner (the training process) fills the PPO buffer with
+# them, runs update() and publishes the new weights.
+#
+# Weights are published into shared memory tensors together with a version
+# number, bumped on every update. Actors pick the latest weights up at the
+# start of an episode and tag the episode with their version. The learner
+# drops episodes that are more than max_staleness versions behind; the
+# clipped PPO ratio uses the log-probs of the policy that actually acted, so
+# the remaining off-policyness is bounded by max_staleness updates.
+
+
+def _actor(index, policy, shared_weights, version, lock, episode_queue, stop, placedb, grid, seed):
+    torch.set_num_threads(1)
+    torch.manual_seed(seed + index)
+    np.random.seed(seed + index)
+    place_env = PlaceEnv(placedb, grid, with_graph = False)
+    policy_version = -1
+    # cumulative seconds, sent with every episode
+    timings = {"env" : 0.0, "act" : 0.0, "sync" : 0.0, "blocked" : 0.0}
+    start_time = time.perf_counter()
+    while not stop.is_set():
+        sync_start = time.perf_counter()
+        if version.value != policy_version:
+            with lock:
+                policy.load_state_dict(shared_weights)
+                policy_version = version.value
+        timings["sync"] += time.perf_counter() - sync_start
+
+        state = place_env.reset()
+        node_ids, canvases, actions, logprobs, rewards, dones = [], [], [], [], [], []
+        done = False
+        while not done:
+            act_start = time.perf_counter()
+            node_id = torch.tensor([state[1]], dtype = torch.int32)
+            canvas = torch.from_numpy(state[0]).reshape(1, -1)
+            with torch.no_grad():
+                action, logprob = policy.act_batch(node_id, canvas)
+            # the env updates its canvas in place, keep a packed copy
+            canvases.append(np.packbits(state[0].reshape(-1)))
+            node_ids.append(state[1])
+            actions.append(int(action[0]))
+            logprobs.append(float(logprob[0]))
+            env_start = time.perf_counter()
+            timings["act"] += env_start - act_start
+            state, reward, done, info = place_env.step(actions[-1])
+            timings["env"] += time.perf_counter() - env_start
+            rewards.append(reward)
+            dones.append(done)
+
+        episode = {
+            "actor" : index,
+            "version" : policy_version,
+            "node_ids" : np.array(node_ids, dtype = np.int32),
+            "canvases" : np.stack(canvases),
+            "actions" : np.array(actions, dtype = np.int32),
+            "logprobs" : np.array(logprobs, dtype = np.float32),
+            "rewards" : np.array(rewards, dtype = np.float32),
+            "dones" : np.array(dones, dtype = bool),
+            "hpwl" : info["hpwl"],
+            "macros" : info["macros"],
+            "timings" : dict(timings, wall = time.perf_counter() - start_time),
+        }
+        blocked_start = time.perf_counter()
+        while not stop.is_set():
+            try:
+                episode_queue.put(episode, timeout = 0.1)
+                break
+            except queue.Full:
+                continue
+        timings["blocked"] += time.perf_counter() - blocked_start
+    place_env.close()
+
+
+class ActorLearner():
+    def __init__(self, ppo_agent, placedb, grid, num_actors, update_timestep, max_staleness = 2,
+                 queue_size = None, seed = 0, start_method = None):
+        assert ppo_agent.buffer.num_envs == 1
+        assert ppo_agent.buffer.capacity >= update_timestep + placedb.node_cnt, \
+            "the buffer needs room for update_timestep steps plus one full episode"
+        self.ppo_agent = ppo_agent
+        self.num_macro = placedb.node_cnt
+        self.update_timestep = update_timestep
+        self.max_staleness = max_staleness
+        self.version = 0
+        self.num_updates = 0
+        self.num_dropped = 0
+        self.staleness = []     # of the episodes consumed since the last report
+
+        ctx = mp.get_context(start_method)
+        self.lock = ctx.Lock()
+        self.shared_version = ctx.Value('q', 0, lock = False)
+        self.shared_weights = {name: tensor.detach().cpu().clone().share_memory_()
+                               for name, tensor in ppo_agent.policy_old.state_dict().items()}
+        self.queue = ctx.Queue(maxsize = queue_size or 2 * num_actors)
+        self.stop = ctx.Event()
+
+        # learner accounting, see utilization()
+        self.start_time = time.perf_counter()
+        self.wait_time = 0.0
+        self.actor_timings = {}
+
+        policy = ppo_agent.inference_copy().cpu()
+        self.processes = []
+        for index in range(num_actors):
+            args = (index, policy, self.shared_weights, self.shared_version, self.lock, self.queue, self.stop,
+                    placedb, grid, seed)
+            process = ctx.Process(target = _actor, args = args, daemon = True)
+            process.start()
+            self.processes.append(process)
+
+
+    def publish(self):
+        with profiler.phase('publish'), self.lock:
+            for name, tensor in self.ppo_agent.policy_old.state_dict().items():
+                self.shared_weights[name].copy_(tensor)
+            self.version += 1
+            self.shared_version.value = self.version
+
+
+    def episodes(self):
+        # yields (episode reward, episode length, hpwl) for every episode added to
+        # the buffer; update() runs once update_timestep steps are buffered
+        buffer = self.ppo_agent.buffer
+        while True:
+            if buffer.size >= self.update_timestep:
+                with profiler.phase('update'):
+                    self.ppo_agent.update()
+                self.num_updates += 1
+                self.publish()
+
+            wait_start = time.perf_counter()
+            with profiler.phase('queue wait'):
+                episode = self.queue.get()
+            self.wait_time += time.perf_counter() - wait_start
+            self.actor_timings[episode["actor"]] = episode["timings"]
+            if episode["macros"] == self.num_macro:
+                # PlaceEnv's event, metrics are closed in the actors
+                metrics.emit('placement', reward = float(episode["rewards"][-1]), hpwl = episode["hpwl"],
+                             macros = episode["macros"])
+
+            staleness = self.version - episode["version"]
+            if staleness > self.max_staleness:
+                self.num_dropped += 1
+                continue
+            self.staleness.append(staleness)
+
+            with profiler.phase('buffer'):
+                buffer.add_rows(torch.from_numpy(episode["node_ids"]), torch.from_numpy(episode["canvases"]),
+                                torch.from_numpy(episode["actions"]), torch.from_numpy(episode["logprobs"]),
+                                torch.from_numpy(episode["rewards"]), torch.from_numpy(episode["dones"]))
+            yield float(episode["rewards"].sum()), len(episode["rewards"]), episode["hpwl"]
+
+
+    def utilization(self):
+        # busy share of the wall time: learner outside queue.get(), actors in
+        # env.step() and act(); mean staleness of the recent episodes
+        wall = time.perf_counter() - self.start_time
+        actors = [(t["env"] + t["act"]) / max(t["wall"], 1e-9) for t in self.actor_timings.values()]
+        report = {
+            "learner" : 1.0 - self.wait_time / max(wall, 1e-9),
+            "actors" : float(np.mean(actors)) if actors else 0.0,
+            "actor_env" : float(np.mean([t["env"] / max(t["wall"], 1e-9) for t in self.actor_timings.values()] or [0.0])),
+            "actor_blocked" : float(np.mean([t["blocked"] / max(t["wall"], 1e-9) for t in self.actor_timings.values()] or [0.0])),
+            "staleness" : float(np.mean(self.staleness)) if self.staleness else 0.0,
+            "dropped" : self.num_dropped,
+            "version" : self.version,
+        }
+        self.staleness = []
+        return report
+
+
+    def close(self):
+        self.stop.set()
+        # unblock actors waiting on a full queue
+        while any(process.is_alive() for process in self.processes):
+            try:
+                self.queue.get(timeout = 0.1)
+            except queue.Empty:
+                pass
+        for process in self.processes:
+            process.join()
@@ -0,0 +1,44 @@
+# rollout steps/sec of ActorCritic.act() with and without the GCN embedding cache
+#   python -m benchmarks.bench_act
+import argparse
+
+import torch
+
+from PPO_place import ActorCritic
+from benchmarks.common import random_state, synthetic_graph, timeit
+
+
+def bench_act(num_nodes, grid, steps):
+    graph = synthetic_graph(num_nodes)
+    policy = ActorCritic(None, grid * grid, num_nodes, graph, False, 0.6)
+    state = random_state(num_nodes, grid)
+
+    def cached():
+        with torch.no_grad():
+            policy.act(state)
+
+    def uncached():
+        # previous behaviour: full GCN pass on every step
+        policy.clear_node_embeddings()
+        with torch.no_grad():
+            policy.act(state)
+
+    return {
+        "uncached": 1.0 / timeit(uncached, steps),
+        "cached": 1.0 / timeit(cached, steps),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--grid", type = int, default = 32)
+    parser.add_argument("--steps", type = int, default = 200)
+    parser.add_argument("--nodes", type = int, nargs = "+", default = [543, 2000, 5000])
+    args = parser.parse_args()
+
+    print("============================================================================================")
+    for num_nodes in args.nodes:
+        res = bench_act(num_nodes, args.grid, args.steps)
+        print("nodes = {} \t uncached : {:.1f} steps/s \t cached : {:.1f} steps/s \t speedup : {:.1f}x".format(
+            num_nodes, res["uncached"], res["cached"], res["cached"] / res["uncached"]))
+    print("============================================================================================")
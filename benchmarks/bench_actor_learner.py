@@ -0,0 +1,83 @@
+# training throughput (env steps per second, updates included) of the serial
+# collect / update loop of train_place.train() vs actor / learner training
+# with several actor process counts, on a synthetic design
+#   python -m benchmarks.bench_actor_learner --actors 1 2 4 --timesteps 8000
+import argparse
+import time
+
+import torch
+
+from actor_learner import ActorLearner
+from env.place_env import PlaceEnv
+from PPO_place import PPO
+from synthetic_design import generate_design, placedb_from_design
+from train_place import make_state_input
+
+
+def make_agent(placedb, graph, grid, update_timestep, encoder, extra_rows = 0):
+    torch.manual_seed(0)
+    return PPO(None, grid * grid, placedb.node_cnt, graph, 0.0003, 0.001, 0.99, 4, 0.2, False,
+               minibatch_size = 256, buffer_size = update_timestep + extra_rows, canvas_encoder = encoder,
+               rollout_compile = None)
+
+
+def serial(placedb, graph, grid, update_timestep, timesteps, encoder):
+    place_env = PlaceEnv(placedb, grid, graph = graph)
+    ppo_agent = make_agent(placedb, graph, grid, update_timestep, encoder)
+    time_step = 0
+    start = time.perf_counter()
+    while time_step < timesteps:
+        state = place_env.reset()
+        done = False
+        while not done:
+            action = ppo_agent.select_action(make_state_input(state))
+            state, reward, done, _ = place_env.step(action)
+            ppo_agent.buffer.add_reward(reward, done)
+            time_step += 1
+            if time_step % update_timestep == 0:
+                ppo_agent.update()
+    return time_step / (time.perf_counter() - start), None
+
+
+def actor_learner(placedb, graph, grid, update_timestep, timesteps, encoder, num_actors, max_staleness):
+    ppo_agent = make_agent(placedb, graph, grid, update_timestep, encoder, extra_rows = placedb.node_cnt)
+    learner = ActorLearner(ppo_agent, placedb, grid, num_actors, update_timestep, max_staleness)
+    time_step = 0
+    start = time.perf_counter()
+    for _, episode_len, _ in learner.episodes():
+        time_step += episode_len
+        if time_step >= timesteps:
+            break
+    steps_per_second = time_step / (time.perf_counter() - start)
+    utilization = learner.utilization()
+    learner.close()
+    return steps_per_second, utilization
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--macros", type = int, default = 120)
+    parser.add_argument("--nets", type = int, default = 600)
+    parser.add_argument("--grid", type = int, default = 32)
+    parser.add_argument("--actors", type = int, nargs = "+", default = [1, 2, 4])
+    parser.add_argument("--timesteps", type = int, default = 8000)
+    parser.add_argument("--update-timestep", type = int, default = 2000)
+    parser.add_argument("--max-staleness", type = int, default = 2)
+    parser.add_argument("--encoder", default = "cnn")
+    args = parser.parse_args()
+
+    from build_graph import build_graph_from_placedb
+    placedb = placedb_from_design(generate_design(args.macros, args.nets))
+    graph = build_graph_from_placedb(placedb)
+
+    print("============================================================================================")
+    print("mode \t\t\t steps/s \t learner busy \t actors busy \t mean staleness \t dropped")
+    steps_per_second, _ = serial(placedb, graph, args.grid, args.update_timestep, args.timesteps, args.encoder)
+    print("serial \t\t\t {:.0f}".format(steps_per_second))
+    for num_actors in args.actors:
+        steps_per_second, utilization = actor_learner(placedb, graph, args.grid, args.update_timestep, args.timesteps,
+                                                      args.encoder, num_actors, args.max_staleness)
+        print("{} actor(s) \t\t {:.0f} \t\t {:.0%} \t\t {:.0%} \t\t {:.2f} \t\t\t {}".format(
+            num_actors, steps_per_second, utilization["learner"], utilization["actors"],
+            utilization["staleness"], utilization["dropped"]))
+    print("============================================================================================")
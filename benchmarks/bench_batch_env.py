@@ -0,0 +1,106 @@
+# collection throughput of PlaceEnv vs BatchPlaceEnv, env only and with the policy in the loop
+#   python -m benchmarks.bench_batch_env --batch-sizes 1 8 64 256
+import argparse
+import time
+
+import numpy as np
+import torch
+
+from env.place_env import PlaceEnv
+from env.batch_place_env import BatchPlaceEnv
+from PPO_place import PPO
+from train_place import collect_batch_rollout, make_state_input
+from benchmarks.common import synthetic_placedb
+
+
+def random_free_cells(canvases):
+    # one random unoccupied cell per row of (B, grid * grid) canvases
+    return torch.rand(canvases.shape).masked_fill(canvases.bool(), -1.0).argmax(dim = 1).numpy()
+
+
+def bench_single_env(placedb, grid, steps):
+    place_env = PlaceEnv(placedb, grid)
+    state = place_env.reset()
+    start = time.perf_counter()
+    for _ in range(steps):
+        action = int(random_free_cells(torch.from_numpy(state[0]).reshape(1, -1))[0])
+        state, reward, done, _ = place_env.step(action)
+        if done:
+            state = place_env.reset()
+    return steps / (time.perf_counter() - start)
+
+
+def bench_batch_env(placedb, grid, batch_size, rows):
+    batch_env = BatchPlaceEnv(placedb, batch_size, grid)
+    node_ids, canvases = batch_env.reset()
+    start = time.perf_counter()
+    for _ in range(rows):
+        (node_ids, canvases), _, _, _ = batch_env.step(random_free_cells(canvases))
+    return rows * batch_size / (time.perf_counter() - start)
+
+
+def bench_policy_single(placedb, grid, steps):
+    place_env = PlaceEnv(placedb, grid)
+    ppo_agent = PPO(None, grid * grid, placedb.node_cnt, place_env.graph, 0.0003, 0.001, 0.99, 1, 0.2, False,
+                    buffer_size = steps)
+    state = place_env.reset()
+    start = time.perf_counter()
+    for _ in range(steps):
+        action = ppo_agent.select_action(make_state_input(state))
+        state, reward, done, _ = place_env.step(action)
+        ppo_agent.buffer.add_reward(reward, done)
+        if done:
+            state = place_env.reset()
+    return steps / (time.perf_counter() - start)
+
+
+def bench_policy_batch(placedb, grid, batch_size, rows):
+    batch_env = BatchPlaceEnv(placedb, batch_size, grid)
+    ppo_agent = PPO(None, grid * grid, placedb.node_cnt, batch_env.graph, 0.0003, 0.001, 0.99, 1, 0.2, False,
+                    buffer_size = rows * batch_size, num_envs = batch_size)
+    batch_env.reset()
+    start = time.perf_counter()
+    collect_batch_rollout(batch_env, ppo_agent, rows)
+    return rows * batch_size / (time.perf_counter() - start)
+
+
+def check_hpwl(placedb, grid, batch_size = 4):
+    # batched hpwl must match PlaceEnv.comp_simple_hpwl()
+    place_env = PlaceEnv(placedb, grid)
+    batch_env = BatchPlaceEnv(placedb, batch_size, grid)
+    rng = np.random.RandomState(0)
+    node_pos = rng.randint(0, grid, (batch_size, placedb.node_cnt, 2)).astype(np.int32)
+    batched = batch_env.comp_simple_hpwl(node_pos)
+    names = list(placedb.node_info.keys())
+    for b in range(batch_size):
+        ref = place_env.comp_simple_hpwl({name: tuple(node_pos[b, i]) for i, name in enumerate(names)})
+        assert ref == batched[b], (ref, batched[b])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--nodes", type = int, default = 543)
+    parser.add_argument("--nets", type = int, default = 2000)
+    parser.add_argument("--grid", type = int, default = 32)
+    parser.add_argument("--steps", type = int, default = 2000)
+    parser.add_argument("--batch-sizes", type = int, nargs = "+", default = [1, 8, 64, 256])
+    parser.add_argument("--policy", action = "store_true", help = "also time collection with the policy in the loop")
+    args = parser.parse_args()
+
+    placedb = synthetic_placedb(args.nodes, args.nets)
+    check_hpwl(placedb, args.grid)
+
+    print("============================================================================================")
+    print("PlaceEnv \t\t\t env steps/s : {:.0f}".format(bench_single_env(placedb, args.grid, args.steps)))
+    for batch_size in args.batch_sizes:
+        rows = max(1, args.steps // batch_size)
+        print("BatchPlaceEnv B = {} \t\t env steps/s : {:.0f}".format(
+            batch_size, bench_batch_env(placedb, args.grid, batch_size, rows)))
+    if args.policy:
+        print("--------------------------------------------------------------------------------------------")
+        print("PlaceEnv + policy \t\t steps/s : {:.0f}".format(bench_policy_single(placedb, args.grid, args.steps // 10)))
+        for batch_size in args.batch_sizes:
+            rows = max(1, args.steps // 10 // batch_size)
+            print("BatchPlaceEnv B = {} + policy \t steps/s : {:.0f}".format(
+                batch_size, bench_policy_batch(placedb, args.grid, batch_size, rows)))
+    print("============================================================================================")
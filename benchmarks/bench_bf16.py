@@ -0,0 +1,98 @@
+# float32 vs bfloat16 autocast rollout policy: action distribution agreement
+# and act() steps/sec. bfloat16 is only fast with AVX512-BF16 / AMX, compare
+# against plain AVX2 by limiting oneDNN:
+#   python -m benchmarks.bench_bf16
+#   ONEDNN_MAX_CPU_ISA=AVX2 python -m benchmarks.bench_bf16
+import argparse
+import os
+
+import numpy as np
+import torch
+
+from PPO_place import ActorCritic
+from benchmarks.common import synthetic_graph, timeit
+
+
+def cpu_flags():
+    flags = set()
+    if os.path.exists("/proc/cpuinfo"):
+        with open("/proc/cpuinfo") as f:
+            for line in f:
+                if line.startswith("flags"):
+                    flags = set(line.split(":", 1)[1].split())
+                    break
+    return [flag for flag in ("avx2", "avx512f", "avx512_bf16", "amx_bf16") if flag in flags]
+
+
+def random_states(num_nodes, grid, num_states, seed = 0):
+    # (node_ids, canvases) with fill fractions between empty and almost full
+    rng = np.random.RandomState(seed)
+    node_ids = torch.from_numpy(rng.randint(num_nodes, size = num_states))
+    fill = rng.uniform(0.0, 0.95, size = (num_states, 1))
+    canvases = torch.from_numpy((rng.rand(num_states, grid * grid) < fill).astype(np.uint8))
+    return node_ids, canvases
+
+
+def compare_distributions(policy, policy_bf16, node_ids, canvases, samples):
+    with torch.no_grad():
+        probs = policy.action_probs(node_ids, canvases)
+        probs_bf16 = policy_bf16.action_probs(node_ids, canvases)
+    gen = torch.Generator().manual_seed(0)
+    actions = torch.multinomial(probs, samples, replacement = True, generator = gen)
+    actions_bf16 = torch.multinomial(probs_bf16, samples, replacement = True, generator = gen)
+    occupied = canvases.bool()
+    return {
+        "tv mean": 0.5 * (probs - probs_bf16).abs().sum(-1).mean().item(),
+        "tv max": 0.5 * (probs - probs_bf16).abs().sum(-1).max().item(),
+        "argmax agree": (probs.argmax(-1) == probs_bf16.argmax(-1)).float().mean().item(),
+        # sampled actions must never hit an occupied cell
+        "masked fp32": occupied.gather(1, actions).float().mean().item(),
+        "masked bf16": occupied.gather(1, actions_bf16).float().mean().item(),
+        # entropy of both distributions, a cheap check of the sampled spread
+        "entropy fp32": torch.distributions.Categorical(probs).entropy().mean().item(),
+        "entropy bf16": torch.distributions.Categorical(probs_bf16).entropy().mean().item(),
+    }
+
+
+def steps_per_sec(policy, node_ids, canvases, batch_size, steps):
+    node_ids = node_ids[:batch_size]
+    canvases = canvases[:batch_size]
+
+    def act():
+        with torch.no_grad():
+            policy.act_batch(node_ids, canvases)
+
+    return batch_size / timeit(act, steps, warmup = 3)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--nodes", type = int, default = 543)
+    parser.add_argument("--grid", type = int, default = 32)
+    parser.add_argument("--states", type = int, default = 256)
+    parser.add_argument("--samples", type = int, default = 1000)
+    parser.add_argument("--batch-sizes", type = int, nargs = "+", default = [1, 16, 64])
+    parser.add_argument("--steps", type = int, default = 100)
+    args = parser.parse_args()
+
+    graph = synthetic_graph(args.nodes)
+    torch.manual_seed(0)
+    policy = ActorCritic(None, args.grid * args.grid, args.nodes, graph, False, 0.6).eval()
+    policy_bf16 = ActorCritic(None, args.grid * args.grid, args.nodes, graph, False, 0.6).eval()
+    policy_bf16.load_state_dict(policy.state_dict())
+    policy_bf16.autocast_dtype = torch.bfloat16
+    node_ids, canvases = random_states(args.nodes, args.grid, args.states)
+
+    print("============================================================================================")
+    print("cpu flags : {} \t ONEDNN_MAX_CPU_ISA : {}".format(" ".join(cpu_flags()),
+                                                            os.environ.get("ONEDNN_MAX_CPU_ISA", "-")))
+    stats = compare_distributions(policy, policy_bf16, node_ids, canvases, args.samples)
+    for name, value in stats.items():
+        print("{} : {:.4f}".format(name, value))
+    print("--------------------------------------------------------------------------------------------")
+    print("batch \t fp32 steps/s \t bf16 steps/s \t speedup")
+    for batch_size in args.batch_sizes:
+        fp32 = steps_per_sec(policy, node_ids, canvases, batch_size, args.steps)
+        bf16 = steps_per_sec(policy_bf16, node_ids, canvases, batch_size, args.steps)
+        print("{} \t {:.1f} \t\t {:.1f} \t\t {:.2f}x".format(batch_size, fp32, bf16, bf16 / fp32))
+    print("============================================================================================")
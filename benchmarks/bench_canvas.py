@@ -0,0 +1,40 @@
+# bytes per stored rollout step for the canvas representations, and the cost
+# of packing / unpacking a batch
+#   python -m benchmarks.bench_canvas --grids 32 64 128
+import argparse
+
+import torch
+
+from canvas import pack_canvases, packed_size, unpack_canvases
+from PPO_place import RolloutBuffer
+from benchmarks.common import timeit
+
+
+def buffer_bytes_per_step(grid, capacity = 1024):
+    buffer = RolloutBuffer(capacity, grid * grid)
+    tensors = (buffer.node_ids, buffer.canvases, buffer.actions, buffer.logprobs, buffer.rewards, buffer.is_terminals)
+    return sum(t.numel() * t.element_size() for t in tensors) / capacity
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--grids", type = int, nargs = "+", default = [32, 64, 128])
+    parser.add_argument("--batch-size", type = int, default = 256)
+    parser.add_argument("--repeat", type = int, default = 20)
+    args = parser.parse_args()
+
+    print("============================================================================================")
+    print("canvas bytes per step : float64 env canvas / float32 state vector (node id + canvas) / uint8 / packed bits")
+    print("grid \t float64 \t float32 \t uint8 \t\t packed \t buffer step (B) \t pack (ms) \t unpack (ms)")
+    for grid in args.grids:
+        num_cells = grid * grid
+        canvases = (torch.rand(args.batch_size, num_cells) < 0.5).to(torch.uint8)
+        packed = pack_canvases(canvases)
+        assert torch.equal(unpack_canvases(packed, num_cells, torch.uint8), canvases)
+        pack_time = timeit(lambda: pack_canvases(canvases), args.repeat)
+        unpack_time = timeit(lambda: unpack_canvases(packed, num_cells), args.repeat)
+        print("{} \t {} \t\t {} \t\t {} \t\t {} \t\t {:.0f} \t\t\t {:.3f} \t\t {:.3f}".format(
+            grid, 8 * num_cells, 4 * (num_cells + 1), num_cells, packed_size(num_cells),
+            buffer_bytes_per_step(grid), pack_time * 1000, unpack_time * 1000))
+    print("(pack / unpack times are per batch of {} canvases)".format(args.batch_size))
+    print("============================================================================================")
@@ -0,0 +1,47 @@
+# rollout act() latency of the eager policy vs the compiled rollout policy
+# (TorchScript trace and torch.compile) at several batch sizes
+#   python -m benchmarks.bench_compile --batch-sizes 1 8 64
+import argparse
+
+import torch
+
+from PPO_place import PPO
+from benchmarks.bench_bf16 import random_states
+from benchmarks.common import synthetic_graph, timeit
+
+
+def bench_compile(num_nodes, grid, mode, batch_sizes, steps):
+    graph = synthetic_graph(num_nodes)
+    torch.manual_seed(0)
+    ppo_agent = PPO(None, grid * grid, num_nodes, graph, 3e-4, 1e-3, 0.99, 1, 0.2, False, rollout_compile = mode)
+    ppo_agent.refresh_rollout_policy()
+    compiled = ppo_agent.rollout_policy is not None
+    node_ids, canvases = random_states(num_nodes, grid, max(batch_sizes))
+    latency = {}
+    for batch_size in batch_sizes:
+        def act():
+            with torch.no_grad():
+                ppo_agent.rollout_act(node_ids[:batch_size], canvases[:batch_size])
+        latency[batch_size] = timeit(act, steps, warmup = 5)
+    return compiled, latency
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--nodes", type = int, default = 543)
+    parser.add_argument("--grid", type = int, default = 32)
+    parser.add_argument("--batch-sizes", type = int, nargs = "+", default = [1, 8, 64])
+    parser.add_argument("--steps", type = int, default = 200)
+    args = parser.parse_args()
+
+    print("============================================================================================")
+    print("mode \t\t " + " \t ".join("B = {} (ms)".format(b) for b in args.batch_sizes))
+    eager = None
+    for mode in (None, "trace", "compile"):
+        compiled, latency = bench_compile(args.nodes, args.grid, mode, args.batch_sizes, args.steps)
+        if mode is None:
+            eager = latency
+        name = "eager" if mode is None else mode if compiled else mode + " (fell back)"
+        print("{} \t\t ".format(name) + " \t ".join(
+            "{:.3f} ({:.2f}x)".format(latency[b] * 1000, eager[b] / latency[b]) for b in args.batch_sizes))
+    print("============================================================================================")
@@ -0,0 +1,71 @@
+# data parallel scaling of PPO.update() (ddp.py): a global rollout of
+# --rollout steps is split over 1 / 2 / 4 / 8 gloo ranks, every rank updates
+# on its shard with gradients all-reduced before optimizer.step().
+# Efficiency is T1 / (N * TN) of the update wall time; the ranks share the
+# machine's cores, so it only approaches 1 with at least N idle cores.
+#   python -m benchmarks.bench_ddp --ranks 1 2 4 8 --rollout 4000 --minibatch 256
+import argparse
+import time
+
+import torch
+import torch.distributed as dist
+import torch.multiprocessing as mp
+
+from ddp import init_distributed, launch, max_replica_difference
+from PPO_place import PPO
+from benchmarks.common import random_state, synthetic_graph
+
+
+def _run(rollout, minibatch_size, num_nodes, grid, K_epochs, results):
+    rank, world_size = init_distributed()
+    # identical initial weights are broadcast from rank 0 anyway, seeding
+    # per rank checks that
+    torch.manual_seed(rank)
+    graph = synthetic_graph(num_nodes)
+    ppo_agent = PPO(None, grid * grid, num_nodes, graph, 0.0003, 0.001, 0.99, K_epochs, 0.2, False,
+                    minibatch_size = minibatch_size and minibatch_size // world_size,
+                    buffer_size = rollout // world_size, distributed = world_size > 1,
+                    rollout_compile = None)
+    for i in range(rollout // world_size):
+        step = rank * (rollout // world_size) + i
+        ppo_agent.select_action(random_state(num_nodes, grid, seed = step))
+        ppo_agent.buffer.add_reward(float(step % 7), step % num_nodes == num_nodes - 1)
+
+    if world_size > 1:
+        dist.barrier()
+    start = time.perf_counter()
+    ppo_agent.update()
+    if world_size > 1:
+        dist.barrier()
+    update_time = time.perf_counter() - start
+
+    # largest weight difference to rank 0 after the update
+    max_diff = max_replica_difference(ppo_agent.policy) if world_size > 1 else 0.0
+    if rank == 0:
+        results.put((update_time, max_diff))
+
+
+def bench_ddp(world_size, rollout, minibatch_size, num_nodes = 543, grid = 32, K_epochs = 4):
+    results = mp.get_context('spawn').SimpleQueue()
+    launch(_run, world_size, rollout, minibatch_size, num_nodes, grid, K_epochs, results)
+    return results.get()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--ranks", type = int, nargs = "+", default = [1, 2, 4, 8])
+    parser.add_argument("--rollout", type = int, default = 4000)
+    parser.add_argument("--minibatch", type = int, default = 256)
+    parser.add_argument("--epochs", type = int, default = 4)
+    args = parser.parse_args()
+
+    print("============================================================================================")
+    print("ranks \t update time (s) \t speedup \t efficiency \t max weight diff")
+    base_time = None
+    for world_size in args.ranks:
+        update_time, max_diff = bench_ddp(world_size, args.rollout, args.minibatch, K_epochs = args.epochs)
+        base_time = base_time or update_time * world_size / args.ranks[0]
+        speedup = base_time / update_time
+        print("{} \t {:.2f} \t\t\t {:.2f} \t\t {:.0%} \t\t {:.1e}".format(
+            world_size, update_time, speedup, speedup / world_size, max_diff))
+    print("============================================================================================")
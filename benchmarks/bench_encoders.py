@@ -0,0 +1,96 @@
+# canvas encoder comparison: params, FLOPs, single / batched latency and the
+# episode reward reached after a fixed training step budget on a synthetic design
+#   python -m benchmarks.bench_encoders --encoders resnet20 cnn strided pooled_mlp --train-steps 32768
+import argparse
+import time
+
+import numpy as np
+import torch
+import torch.nn as nn
+
+from encoders import CANVAS_ENCODERS, make_canvas_encoder
+from env.batch_place_env import BatchPlaceEnv
+from PPO_place import PPO
+from train_place import collect_batch_rollout
+from benchmarks.common import synthetic_placedb, timeit
+
+
+def count_flops(encoder, grid):
+    # multiply-adds of the Conv2d / Linear layers for one canvas, x2
+    macs = []
+
+    def hook(module, inputs, output):
+        if isinstance(module, nn.Conv2d):
+            kernel = module.kernel_size[0] * module.kernel_size[1] * module.in_channels // module.groups
+            macs.append(output.numel() * kernel)
+        else:
+            macs.append(output.numel() * module.in_features)
+
+    handles = [m.register_forward_hook(hook) for m in encoder.modules() if isinstance(m, (nn.Conv2d, nn.Linear))]
+    with torch.no_grad():
+        encoder(torch.zeros(1, 1, grid, grid))
+    for handle in handles:
+        handle.remove()
+    return 2 * sum(macs)
+
+
+def encoder_latency(encoder, grid, batch_size, repeat):
+    canvases = (torch.rand(batch_size, 1, grid, grid) < 0.5).float()
+
+    def run():
+        with torch.no_grad():
+            encoder(canvases)
+
+    return timeit(run, repeat, warmup = 3)
+
+
+def train_reward(name, placedb, grid, num_envs, rows, train_steps, seed = 0):
+    # mean terminal reward of the episodes finished in the first and in the
+    # last rollout, plus the wall time of the whole run
+    torch.manual_seed(seed)
+    np.random.seed(seed)
+    batch_env = BatchPlaceEnv(placedb, num_envs, grid)
+    ppo_agent = PPO(None, grid * grid, placedb.node_cnt, batch_env.graph, 0.0003, 0.001, 0.99, 4, 0.2, False,
+                    minibatch_size = 256, buffer_size = rows * num_envs, num_envs = num_envs, canvas_encoder = name)
+    batch_env.reset()
+    rewards = []
+    start = time.perf_counter()
+    for _ in range(max(1, train_steps // (rows * num_envs))):
+        rewards.append(np.mean(collect_batch_rollout(batch_env, ppo_agent, rows) or [np.nan]))
+        ppo_agent.update()
+    return rewards[0], rewards[-1], time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--encoders", nargs = "+", default = ["resnet20", "resnet32", "cnn", "strided", "pooled_mlp"],
+                        choices = sorted(CANVAS_ENCODERS))
+    parser.add_argument("--grid", type = int, default = 32)
+    parser.add_argument("--batch-size", type = int, default = 64)
+    parser.add_argument("--repeat", type = int, default = 50)
+    parser.add_argument("--nodes", type = int, default = 64)
+    parser.add_argument("--nets", type = int, default = 256)
+    parser.add_argument("--num-envs", type = int, default = 16)
+    parser.add_argument("--rows", type = int, default = 128, help = "rollout rows per PPO update")
+    parser.add_argument("--train-steps", type = int, default = 16384, help = "0 skips the training run")
+    args = parser.parse_args()
+
+    placedb = synthetic_placedb(args.nodes, args.nets)
+
+    print("============================================================================================")
+    print("encoder \t params \t MFLOPs \t B = 1 (ms) \t B = {} (ms) \t first reward \t last reward \t train (s)".format(
+        args.batch_size))
+    for name in args.encoders:
+        torch.manual_seed(0)
+        encoder = make_canvas_encoder(name)
+        params = sum(p.numel() for p in encoder.parameters())
+        mflops = count_flops(encoder, args.grid) / 1e6
+        single = encoder_latency(encoder, args.grid, 1, args.repeat)
+        batched = encoder_latency(encoder, args.grid, args.batch_size, args.repeat)
+        if args.train_steps > 0:
+            first, last, train_time = train_reward(name, placedb, args.grid, args.num_envs, args.rows, args.train_steps)
+        else:
+            first, last, train_time = np.nan, np.nan, 0.0
+        print("{} \t {} \t\t {:.2f} \t\t {:.3f} \t\t {:.3f} \t\t {:.1f} \t\t {:.1f} \t\t {:.1f}".format(
+            name, params, mflops, single * 1000, batched * 1000, first, last, train_time))
+    print("============================================================================================")
@@ -0,0 +1,116 @@
+# PlaceGCN latency with the DGL message passing backend vs the torch.sparse_csr
+# SpMM backend on CPU, forward only (rollout / embedding cache refresh) and
+# forward + backward; without DGL only the spmm backend is timed
+#   python -m benchmarks.bench_gcn_backend --nodes 1000 10000 100000
+# --check compares the two backends in float64 instead: the graphs built by
+# build_graph_from_placedb() for a synthetic design, the GCN outputs and the
+# parameter gradients, for both input modes; exits 1 when the largest
+# difference relative to the largest DGL value is above --tolerance
+#   python -m benchmarks.bench_gcn_backend --check --nodes 543 2048
+import argparse
+import sys
+
+import torch
+
+from gcn import PlaceGCN, SparseGraph, dgl
+from benchmarks.common import synthetic_graph, synthetic_placedb, timeit
+
+
+def bench_gcn_backend(num_nodes, input_mode, repeat):
+    graph = synthetic_graph(num_nodes)
+    sparse_graph = graph if isinstance(graph, SparseGraph) else SparseGraph.from_dgl(graph)
+    torch.manual_seed(0)
+    gcn = PlaceGCN(num_nodes, input_mode = input_mode, backend = 'spmm')
+    features = gcn.node_features(num_nodes)
+
+    def forward(g):
+        with torch.no_grad():
+            gcn(g, features)
+
+    def backward(g):
+        gcn.zero_grad()
+        gcn(g, features).sum().backward()
+
+    res = {
+        "spmm forward": timeit(lambda: forward(sparse_graph), repeat),
+        "spmm backward": timeit(lambda: backward(sparse_graph), repeat),
+    }
+    if dgl is not None:
+        gcn.backend = 'dgl'
+        res["dgl forward"] = timeit(lambda: forward(graph), repeat)
+        res["dgl backward"] = timeit(lambda: backward(graph), repeat)
+        with torch.no_grad():
+            res["max abs err"] = (gcn(graph, features) - gcn(sparse_graph, features)).abs().max().item()
+    return res
+
+
+def check_gcn_backend(num_nodes, num_nets, input_mode):
+    # largest difference of the outputs and of every parameter gradient
+    # (loss: sum of squared outputs) between the backends, relative to the
+    # largest abs DGL value, float64 throughout
+    from build_graph import build_graph_from_placedb
+    placedb = synthetic_placedb(num_nodes, num_nets)
+    dgl_graph = build_graph_from_placedb(placedb, backend = 'dgl')
+    if 'w' in dgl_graph.edata:
+        dgl_graph.edata['w'] = dgl_graph.edata['w'].double()
+    sparse_graph = build_graph_from_placedb(placedb, backend = 'spmm')
+    torch.manual_seed(0)
+    gcn = PlaceGCN(num_nodes, input_mode = input_mode).double()
+    features = gcn.node_features(num_nodes)
+    if input_mode == 'one_hot':
+        features = features.double()
+
+    outputs, grads = [], []
+    for backend, graph in (('dgl', dgl_graph), ('spmm', sparse_graph)):
+        gcn.backend = backend
+        gcn.zero_grad()
+        out = gcn(graph, features)
+        (out ** 2).sum().backward()
+        outputs.append(out.detach())
+        grads.append([p.grad.clone() for p in gcn.parameters()])
+    rel_err = lambda a, b: ((a - b).abs().max() / a.abs().max().clamp_min(1e-300)).item()
+    out_err = rel_err(*outputs)
+    grad_err = max(rel_err(a, b) for a, b in zip(*grads))
+    return out_err, grad_err
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--nodes", type = int, nargs = "+", default = [1000, 10000, 100000])
+    parser.add_argument("--input-mode", default = "embedding", choices = ["one_hot", "embedding"])
+    parser.add_argument("--repeat", type = int, default = 10)
+    parser.add_argument("--threads", type = int, default = None)
+    parser.add_argument("--check", action = "store_true")
+    parser.add_argument("--nets-per-node", type = int, default = 8, help = "--check design size")
+    parser.add_argument("--tolerance", type = float, default = 1e-9)
+    args = parser.parse_args()
+    if args.threads is not None:
+        torch.set_num_threads(args.threads)
+
+    if args.check:
+        if dgl is None:
+            print("DGL is not available, nothing to compare")
+            sys.exit(0)
+        print("============================================================================================")
+        print("nodes \t nets \t input mode \t output rel diff \t gradient rel diff")
+        failed = False
+        for num_nodes in args.nodes:
+            for input_mode in ("one_hot", "embedding"):
+                out_err, grad_err = check_gcn_backend(num_nodes, num_nodes * args.nets_per_node, input_mode)
+                failed = failed or max(out_err, grad_err) > args.tolerance
+                print("{} \t {} \t {:<10} \t {:.2e} \t\t {:.2e}".format(
+                    num_nodes, num_nodes * args.nets_per_node, input_mode, out_err, grad_err))
+        print("============================================================================================")
+        if failed:
+            print("backends differ by more than {:.0e}".format(args.tolerance))
+        sys.exit(1 if failed else 0)
+
+    print("============================================================================================")
+    print("nodes \t dgl fwd (ms) \t spmm fwd (ms) \t dgl fwd+bwd (ms) \t spmm fwd+bwd (ms) \t max abs err")
+    for num_nodes in args.nodes:
+        res = bench_gcn_backend(num_nodes, args.input_mode, args.repeat)
+        ms = lambda key: "{:.2f}".format(res[key] * 1000) if key in res else "-"
+        print("{} \t {} \t\t {} \t\t {} \t\t\t {} \t\t\t {}".format(
+            num_nodes, ms("dgl forward"), ms("spmm forward"), ms("dgl backward"), ms("spmm backward"),
+            "{:.2e}".format(res["max abs err"]) if "max abs err" in res else "-"))
+    print("============================================================================================")
@@ -0,0 +1,46 @@
+# memory / latency of PlaceGCN with the dense one-hot input vs the embedding input
+#   python -m benchmarks.bench_gcn_input --nodes 1000 10000 100000
+import argparse
+
+import torch
+
+from gcn import PlaceGCN
+from benchmarks.common import peak_rss_mb, run_isolated, synthetic_graph, timeit
+
+
+def _run(input_mode, num_nodes, repeat):
+    graph = synthetic_graph(num_nodes)
+    base_rss = peak_rss_mb()
+    gcn = PlaceGCN(num_nodes, input_mode = input_mode)
+    features = gcn.node_features(num_nodes)
+    with torch.no_grad():
+        latency = timeit(lambda: gcn(graph, features), repeat)
+    param_mb = sum(p.numel() * p.element_size() for p in gcn.parameters()) / 2 ** 20
+    input_mb = features.numel() * features.element_size() / 2 ** 20
+    return latency, param_mb, input_mb, peak_rss_mb() - base_rss
+
+
+def bench_gcn_input(input_mode, num_nodes, repeat):
+    return run_isolated(_run, input_mode, num_nodes, repeat)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--nodes", type = int, nargs = "+", default = [1000, 10000, 100000])
+    parser.add_argument("--repeat", type = int, default = 5)
+    parser.add_argument("--dense-limit", type = int, default = 20000,
+                        help = "skip the one-hot input above this many nodes")
+    args = parser.parse_args()
+
+    print("============================================================================================")
+    print("mode \t\t nodes \t latency (ms) \t params (MB) \t input (MB) \t peak RSS delta (MB)")
+    for num_nodes in args.nodes:
+        for input_mode in ("one_hot", "embedding"):
+            if input_mode == "one_hot" and num_nodes > args.dense_limit:
+                est_gb = 2 * num_nodes * num_nodes * 4 / 2 ** 30
+                print("{} \t {} \t skipped (needs ~{:.1f} GB)".format(input_mode, num_nodes, est_gb))
+                continue
+            latency, param_mb, input_mb, rss_mb = bench_gcn_input(input_mode, num_nodes, args.repeat)
+            print("{} \t {} \t {:.2f} \t\t {:.2f} \t\t {:.2f} \t\t {:.1f}".format(
+                input_mode, num_nodes, latency * 1000, param_mb, input_mb, rss_mb))
+    print("============================================================================================")
@@ -0,0 +1,97 @@
+# Graph build time and edge counts per net model, against the previous
+# per-net Python double loop
+#   python -m benchmarks.bench_graph adaptec1 bigblue1 --synthetic 2000:10000:16 5000:50000:64
+import argparse
+import time
+import warnings
+from collections import Counter
+
+import numpy as np
+
+from build_graph import build_edges_from_placedb, budget_threshold, net_edge_count
+from benchmarks.common import synthetic_placedb
+
+
+def loop_clique_edges(placedb):
+    # previous build_edges_from_placedb(): one (i < j) pair per net and pin pair
+    src_node_list = []
+    dst_node_list = []
+    for net_name in placedb.net_info:
+        net_node_list = list(placedb.net_info[net_name].keys())
+        for i in range(len(net_node_list)-1):
+            for j in range(i+1, len(net_node_list)):
+                src_node_list.append(placedb.node_info[net_node_list[i]]['id'])
+                dst_node_list.append(placedb.node_info[net_node_list[j]]['id'])
+    return src_node_list, dst_node_list
+
+
+def check_clique(placedb, loop_edges, merged_edges):
+    # merged edge weights equal the multiplicity of the undirected pairs
+    expected = Counter((min(s, d), max(s, d)) for s, d in zip(*loop_edges))
+    src, dst, weight = merged_edges
+    got = dict(zip(zip(src.tolist(), dst.tolist()), weight.tolist()))
+    return got == expected
+
+
+def load_design(design):
+    if ":" in design:
+        num_nodes, num_nets, max_degree = (int(v) for v in design.split(":"))
+        return synthetic_placedb(num_nodes, num_nets, max_degree = max_degree)
+    from design_cache import load_placedb
+    return load_placedb(design)
+
+
+def timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    res = fn(*args, **kwargs)
+    return time.perf_counter() - start, res
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("benchmarks", nargs = "*", help = "Bookshelf design directories")
+    parser.add_argument("--synthetic", nargs = "*", default = ["2000:10000:16", "5000:50000:64"],
+                        help = "synthetic designs as nodes:nets:max_degree")
+    parser.add_argument("--degree-threshold", type = int, default = 16)
+    parser.add_argument("--max-edges", type = int, default = 10 ** 6)
+    parser.add_argument("--loop-limit", type = int, default = 2 * 10 ** 6,
+                        help = "skip the Python loop above this many clique edges")
+    args = parser.parse_args()
+
+    print("============================================================================================")
+    print("design \t\t\t model \t\t build (s) \t raw edges \t merged edges \t max weight")
+    for design in args.benchmarks + args.synthetic:
+        placedb = load_design(design)
+        degrees = np.diff(placedb.net_offsets)
+        print("{} : {} macros, {} nets, {} pins, max degree {}".format(
+            design, placedb.node_cnt, placedb.net_cnt, len(placedb.net_pin_nodes), degrees.max()))
+
+        clique_raw = net_edge_count(degrees, degrees.max())
+        if clique_raw <= args.loop_limit:
+            loop_time, loop_edges = timed(loop_clique_edges, placedb)
+            print("{} \t\t loop \t\t {:.3f} \t\t {} \t -".format(design, loop_time, len(loop_edges[0])))
+        else:
+            loop_edges = None
+
+        configs = [
+            ("clique", {"net_model": "clique"}, degrees.max()),
+            ("star", {"net_model": "star"}, 1),
+            ("hybrid", {"net_model": "hybrid", "degree_threshold": args.degree_threshold}, args.degree_threshold),
+            ("budget", {"net_model": "clique", "max_edges": args.max_edges},
+                budget_threshold(degrees, args.max_edges)),
+        ]
+        for name, options, threshold in configs:
+            with warnings.catch_warnings(record = True) as caught:
+                warnings.simplefilter("always")
+                build_time, edges = timed(build_edges_from_placedb, placedb, **options)
+            print("{} \t\t {} \t\t {:.3f} \t\t {} \t {} \t\t {:.0f}".format(
+                design, name, build_time, net_edge_count(degrees, threshold), len(edges[0]),
+                edges[2].max() if len(edges[2]) else 0))
+            if name == "clique" and loop_edges is not None:
+                print("clique matches loop : ", check_clique(placedb, loop_edges, edges))
+            if name == "budget":
+                print("budget of {} edges met : ".format(args.max_edges), len(edges[0]) <= args.max_edges)
+            for warning in caught:
+                print("warning : ", warning.message)
+        print("--------------------------------------------------------------------------------------------")
+    print("============================================================================================")
@@ -0,0 +1,42 @@
+# dict-walk PlaceEnv.comp_simple_hpwl() vs the CSR reduceat kernel in hpwl.py
+#   python -m benchmarks.bench_hpwl --sizes 543:5000 10000:100000 100000:500000
+import argparse
+
+import numpy as np
+
+from env.place_env import PlaceEnv
+from hpwl import comp_simple_hpwl
+from benchmarks.common import synthetic_placedb, timeit
+
+
+def bench_hpwl(num_nodes, num_nets, grid = 32, repeat = 3):
+    placedb = synthetic_placedb(num_nodes, num_nets)
+    place_env = PlaceEnv(placedb, max(grid, int(np.ceil((1.5 * num_nodes) ** 0.5))), with_graph = False)
+    rng = np.random.RandomState(0)
+    node_pos = rng.randint(0, place_env.grid, (num_nodes, 2))
+    node_pos_dict = {name: tuple(node_pos[i]) for i, name in enumerate(placedb.node_info)}
+
+    ref = place_env.comp_simple_hpwl(node_pos_dict)
+    total, net_hpwl = comp_simple_hpwl(node_pos, placedb)
+    assert ref == total, (ref, total)
+    assert len(net_hpwl) == num_nets
+
+    dict_time = timeit(lambda: place_env.comp_simple_hpwl(node_pos_dict), repeat)
+    csr_time = timeit(lambda: comp_simple_hpwl(node_pos, placedb), repeat)
+    return dict_time, csr_time, len(placedb.net_pin_nodes)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", nargs = "+", default = ["543:5000", "10000:100000", "100000:500000"],
+                        help = "num_nodes:num_nets pairs")
+    args = parser.parse_args()
+
+    print("============================================================================================")
+    print("nodes \t nets \t pins \t\t dict walk (ms) \t csr kernel (ms) \t speedup")
+    for size in args.sizes:
+        num_nodes, num_nets = map(int, size.split(":"))
+        dict_time, csr_time, num_pins = bench_hpwl(num_nodes, num_nets)
+        print("{} \t {} \t {} \t {:.2f} \t\t {:.2f} \t\t\t {:.0f}x".format(
+            num_nodes, num_nets, num_pins, dict_time * 1000, csr_time * 1000, dict_time / csr_time))
+    print("============================================================================================")
@@ -0,0 +1,157 @@
+# per event cost on the training thread: print + CSV write + flush (the old
+# logging) vs metrics.emit() with the background writer and every sink,
+# and the time until the writer has everything on disk
+#   python -m benchmarks.bench_metrics --events 100000
+# --check instead counts the 'placement' records written for episodes run
+# by PlaceEnv, BatchPlaceEnv, SubprocPlaceVecEnv workers (vec_env =
+# 'subproc') and ActorLearner actors (num_actors > 0) against the complete
+# placements the training process saw; exits 1 on a mismatch
+#   python -m benchmarks.bench_metrics --check
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+
+from metrics import metrics as global_metrics, Metrics, BinarySink, ConsoleSink, CsvSink, JsonLinesSink
+
+
+def direct(directory, events):
+    fields = {'episode' : 1, 'timestep' : 1000, 'reward' : 19342.5}
+    with open(os.path.join(directory, "direct.csv"), "w") as f, contextlib.redirect_stdout(io.StringIO()):
+        f.write('episode,timestep,reward\n')
+        start = time.perf_counter()
+        for i in range(events):
+            print("reward = {}".format(fields['reward']))
+            f.write('{},{},{}\n'.format(i, fields['timestep'], fields['reward']))
+            f.flush()
+        return time.perf_counter() - start, time.perf_counter() - start
+
+
+def buffered(directory, events, kinds):
+    sinks = {
+        'console' : lambda: ConsoleSink({'log' : "reward = {reward}"}),
+        'csv' : lambda: CsvSink(os.path.join(directory, "metrics.csv")),
+        'jsonl' : lambda: JsonLinesSink(os.path.join(directory, "metrics.jsonl")),
+        'bin' : lambda: BinarySink(os.path.join(directory, "metrics.bin")),
+    }
+    metrics = Metrics()
+    with contextlib.redirect_stdout(io.StringIO()):
+        metrics.open([sinks[kind]() for kind in kinds])
+        start = time.perf_counter()
+        for i in range(events):
+            metrics.emit('log', episode = i, timestep = 1000, reward = 19342.5)
+        emit_time = time.perf_counter() - start
+        metrics.close()
+        return emit_time, time.perf_counter() - start
+
+
+def count_placements(directory, name, run):
+    # run() -> complete placements it saw, with the global metrics writing
+    # to a JSON lines file; -> (expected, written)
+    path = os.path.join(directory, name + ".jsonl")
+    global_metrics.open([JsonLinesSink(path)])
+    try:
+        expected = run()
+    finally:
+        global_metrics.close()
+    with open(path) as f:
+        written = sum(json.loads(line)["event"] == "placement" for line in f)
+    return expected, written
+
+
+def check_placement_events(directory, episodes, num_workers, num_macros = 32, grid = 8):
+    import torch
+    from actor_learner import ActorLearner
+    from build_graph import build_graph_from_placedb
+    from env.batch_place_env import BatchPlaceEnv
+    from env.place_env import PlaceEnv
+    from env.subproc_vec_env import SubprocPlaceVecEnv
+    from PPO_place import PPO
+    from benchmarks.bench_batch_env import random_free_cells
+    from benchmarks.common import synthetic_placedb
+    placedb = synthetic_placedb(num_macros, 4 * num_macros)
+
+    # random free cells, every episode is a complete placement
+    def serial():
+        place_env = PlaceEnv(placedb, grid, with_graph = False)
+        for _ in range(episodes):
+            state, done = place_env.reset(), False
+            while not done:
+                state, _, done, _ = place_env.step(int(random_free_cells(torch.from_numpy(state[0]).reshape(1, -1))[0]))
+        return episodes
+
+    def vectorized(vec_env):
+        finished = 0
+        try:
+            node_ids, canvases = vec_env.reset()
+            while finished < episodes:
+                (node_ids, canvases), _, dones, _ = vec_env.step(random_free_cells(canvases))
+                finished += int(dones.sum())
+        finally:
+            vec_env.close()
+        return finished
+
+    # policy actions, episodes that hit an occupied cell end with reward 0
+    def actors():
+        torch.manual_seed(0)
+        update_timestep = 100 * episodes * num_macros
+        ppo_agent = PPO(None, grid * grid, num_macros, build_graph_from_placedb(placedb), 0.0003, 0.001, 0.99, 1, 0.2, False,
+                        buffer_size = update_timestep + num_macros, canvas_encoder = 'cnn', rollout_compile = None)
+        learner = ActorLearner(ppo_agent, placedb, grid, num_workers, update_timestep)
+        complete = 0
+        try:
+            for i, (episode_reward, episode_len, _) in enumerate(learner.episodes()):
+                complete += episode_len == num_macros and episode_reward > 0
+                if i + 1 == episodes:
+                    break
+        finally:
+            learner.close()
+        return complete
+
+    return [
+        ("PlaceEnv", count_placements(directory, "serial", serial)),
+        ("BatchPlaceEnv", count_placements(directory, "batch",
+                                           lambda: vectorized(BatchPlaceEnv(placedb, num_workers, grid)))),
+        ("SubprocPlaceVecEnv", count_placements(directory, "subproc",
+                                                lambda: vectorized(SubprocPlaceVecEnv(placedb, num_workers, grid)))),
+        ("ActorLearner", count_placements(directory, "actors", actors)),
+    ]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--events", type = int, default = 100000)
+    parser.add_argument("--check", action = "store_true")
+    parser.add_argument("--episodes", type = int, default = 20, help = "--check episodes per collector")
+    parser.add_argument("--workers", type = int, default = 4, help = "--check env workers / actors")
+    args = parser.parse_args()
+
+    if args.check:
+        with tempfile.TemporaryDirectory() as directory:
+            results = check_placement_events(directory, args.episodes, args.workers)
+        print("============================================================================================")
+        print("collector \t\t complete placements \t placement records")
+        failed = False
+        for name, (expected, written) in results:
+            failed = failed or expected != written
+            print("{:<20} \t {} \t\t\t {}".format(name, expected, written))
+        print("============================================================================================")
+        if failed:
+            print("placement records missing or duplicated")
+        sys.exit(1 if failed else 0)
+
+    print("============================================================================================")
+    print("logging \t\t\t\t training thread (us / event) \t until on disk (us / event)")
+    with tempfile.TemporaryDirectory() as directory:
+        cases = [("print + csv flush", lambda: direct(directory, args.events))]
+        for kinds in (['csv'], ['console', 'csv'], ['jsonl'], ['bin'], ['console', 'csv', 'jsonl', 'bin']):
+            cases.append(("emit " + " + ".join(kinds), lambda kinds = kinds: buffered(directory, args.events, kinds)))
+        for name, run in cases:
+            thread_time, total_time = run()
+            print("{:<32} \t {:.2f} \t\t\t\t\t {:.2f}".format(
+                name, thread_time / args.events * 1e6, total_time / args.events * 1e6))
+    print("============================================================================================")
@@ -0,0 +1,56 @@
+# Bookshelf parse time and peak memory per design, real designs or
+# synthetic ones written by synthetic_design.write_bookshelf()
+#   python -m benchmarks.bench_parse adaptec1 bigblue4 --net-workers 1 8
+#   python -m benchmarks.bench_parse --synthetic 543:5000:0 2048:20000:200000
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+
+from place_db import PlaceDB
+from synthetic_design import generate_design, write_bookshelf
+from benchmarks.common import peak_rss_mb, run_isolated
+
+
+def _parse(benchmark, net_workers):
+    base_rss = peak_rss_mb()
+    tracemalloc.start()
+    start = time.perf_counter()
+    placedb = PlaceDB(benchmark, net_workers = net_workers)
+    parse_time = time.perf_counter() - start
+    traced_peak_mb = tracemalloc.get_traced_memory()[1] / 2 ** 20
+    tracemalloc.stop()
+    return (parse_time, traced_peak_mb, peak_rss_mb() - base_rss,
+            placedb.node_cnt, placedb.net_cnt, len(placedb.net_pin_nodes))
+
+
+def bench_parse(benchmark, net_workers = 1):
+    return run_isolated(_parse, benchmark, net_workers)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("benchmarks", nargs = "*", help = "Bookshelf design directories")
+    parser.add_argument("--synthetic", nargs = "*", default = [],
+                        help = "synthetic designs as macros:nets:cells")
+    parser.add_argument("--net-workers", type = int, nargs = "+", default = [1])
+    args = parser.parse_args()
+    if not args.benchmarks and not args.synthetic:
+        parser.error("no design given")
+    tmp_dir = tempfile.TemporaryDirectory()
+    for design in args.synthetic:
+        num_macros, num_nets, num_cells = (int(v) for v in design.split(":"))
+        bookshelf = os.path.join(tmp_dir.name, "synthetic_{}_{}_{}".format(num_macros, num_nets, num_cells))
+        write_bookshelf(generate_design(num_macros, num_nets, num_cells), bookshelf)
+        args.benchmarks.append(bookshelf)
+
+    print("============================================================================================")
+    print("design \t\t workers \t parse (s) \t traced peak (MB) \t RSS delta (MB) \t macros \t nets \t pins")
+    for benchmark in args.benchmarks:
+        for net_workers in args.net_workers:
+            parse_time, traced_mb, rss_mb, node_cnt, net_cnt, pin_cnt = bench_parse(benchmark, net_workers)
+            print("{} \t {} \t\t {:.2f} \t\t {:.1f} \t\t\t {:.1f} \t\t\t {} \t\t {} \t {}".format(
+                os.path.basename(os.path.normpath(benchmark)), net_workers, parse_time, traced_mb, rss_mb, node_cnt, net_cnt, pin_cnt))
+    print("============================================================================================")
+    tmp_dir.cleanup()
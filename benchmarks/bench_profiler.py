@@ -0,0 +1,51 @@
+# cost of profiler.phase() disabled / enabled / tracing, per empty phase and
+# on the eager rollout act() it instruments
+#   python -m benchmarks.bench_profiler
+import argparse
+
+import torch
+
+from PPO_place import PPO
+from profiler import PhaseProfiler, profiler
+from benchmarks.bench_bf16 import random_states
+from benchmarks.common import synthetic_graph, timeit
+
+
+def empty_phase_ns(phase_profiler, calls):
+    def run():
+        for _ in range(calls):
+            with phase_profiler.phase('empty'):
+                pass
+    return timeit(run, 5) / calls * 1e9
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type = int, default = 100000)
+    parser.add_argument("--nodes", type = int, default = 543)
+    parser.add_argument("--grid", type = int, default = 32)
+    parser.add_argument("--steps", type = int, default = 200)
+    args = parser.parse_args()
+
+    graph = synthetic_graph(args.nodes)
+    torch.manual_seed(0)
+    ppo_agent = PPO(None, args.grid * args.grid, args.nodes, graph, 3e-4, 1e-3, 0.99, 1, 0.2, False)
+    node_ids, canvases = random_states(args.nodes, args.grid, 1)
+
+    def act():
+        ppo_agent.select_action((node_ids, canvases))
+        ppo_agent.buffer.clear()
+
+    print("============================================================================================")
+    print("mode \t\t empty phase (ns) \t act() (ms)")
+    for mode in ("disabled", "enabled", "tracing"):
+        phase_profiler = PhaseProfiler(enabled = mode != "disabled")
+        profiler.enabled = mode != "disabled"
+        if mode == "tracing":
+            phase_profiler.start_trace()
+            profiler.start_trace()
+        phase_ns = empty_phase_ns(phase_profiler, args.calls)
+        act_time = timeit(act, args.steps, warmup = 5)
+        profiler.events = None
+        print("{} \t {:.0f} \t\t\t {:.3f}".format(mode, phase_ns, act_time * 1000))
+    print("============================================================================================")
@@ -0,0 +1,52 @@
+# Python-loop returns (previous PPO.update()) vs returns.discounted_returns / returns.gae
+#   python -m benchmarks.bench_returns --sizes 10000 100000 1000000 10000000
+import argparse
+
+import torch
+
+from returns import discounted_returns, gae
+from benchmarks.common import timeit
+
+
+def loop_returns(rewards, is_terminals, gamma):
+    rewards_out = []
+    discounted_reward = 0
+    for reward, is_terminal in zip(reversed(rewards), reversed(is_terminals)):
+        if is_terminal:
+            discounted_reward = 0
+        discounted_reward = reward + (gamma * discounted_reward)
+        rewards_out.insert(0, discounted_reward)
+    return torch.tensor(rewards_out, dtype=torch.float32)
+
+
+def make_rollout(size, episode_len, seed = 0):
+    gen = torch.Generator().manual_seed(seed)
+    rewards = torch.rand(size, generator = gen)
+    is_terminals = torch.arange(size) % episode_len == episode_len - 1
+    values = torch.rand(size, generator = gen)
+    return rewards, is_terminals, values
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type = int, nargs = "+", default = [10 ** 4, 10 ** 5, 10 ** 6, 10 ** 7])
+    parser.add_argument("--episode-len", type = int, default = 543)
+    parser.add_argument("--loop-limit", type = int, default = 10 ** 5,
+                        help = "skip the O(n^2) loop above this buffer size")
+    args = parser.parse_args()
+
+    print("============================================================================================")
+    print("size \t\t loop (s) \t returns (s) \t gae (s) \t max abs err")
+    for size in args.sizes:
+        rewards, is_terminals, values = make_rollout(size, args.episode_len)
+        vec_time = timeit(lambda: discounted_returns(rewards, is_terminals, 0.99), 3)
+        gae_time = timeit(lambda: gae(rewards, values, is_terminals, 0.99, 0.95), 3)
+        if size <= args.loop_limit:
+            rewards_list, is_terminals_list = rewards.tolist(), is_terminals.tolist()
+            loop_time = timeit(lambda: loop_returns(rewards_list, is_terminals_list, 0.99), 1, warmup = 0)
+            err = (loop_returns(rewards_list, is_terminals_list, 0.99)
+                    - discounted_returns(rewards, is_terminals, 0.99)).abs().max().item()
+            print("{} \t {:.4f} \t {:.4f} \t {:.4f} \t {:.2e}".format(size, loop_time, vec_time, gae_time, err))
+        else:
+            print("{} \t skipped \t {:.4f} \t {:.4f}".format(size, vec_time, gae_time))
+    print("============================================================================================")
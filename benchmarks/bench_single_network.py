@@ -0,0 +1,74 @@
+# PPO with the policy_old replica vs single_network = True: same seeded
+# training run in both modes, per update rewards, final weight difference,
+# model memory and time per update()
+#   python -m benchmarks.bench_single_network --updates 8
+import argparse
+import time
+
+import numpy as np
+import torch
+
+from env.batch_place_env import BatchPlaceEnv
+from PPO_place import PPO
+from train_place import collect_batch_rollout
+from benchmarks.common import synthetic_placedb
+
+
+def model_bytes(ppo_agent):
+    # parameters and buffers of every distinct network the agent holds
+    tensors = {}
+    for policy in (ppo_agent.policy, ppo_agent.policy_old):
+        for t in list(policy.parameters()) + list(policy.buffers()):
+            tensors[t.data_ptr()] = t.numel() * t.element_size()
+    return sum(tensors.values())
+
+
+def train_run(placedb, grid, num_envs, rows, updates, encoder, single_network, seed = 0):
+    torch.manual_seed(seed)
+    np.random.seed(seed)
+    batch_env = BatchPlaceEnv(placedb, num_envs, grid)
+    ppo_agent = PPO(None, grid * grid, placedb.node_cnt, batch_env.graph, 0.0003, 0.001, 0.99, 4, 0.2, False,
+                    minibatch_size = 256, buffer_size = rows * num_envs, num_envs = num_envs,
+                    canvas_encoder = encoder, single_network = single_network)
+    # the replica consumes random numbers when it is built, reseed so both
+    # modes sample the same rollouts
+    torch.manual_seed(seed)
+    np.random.seed(seed)
+    batch_env.reset()
+    rewards = []
+    update_time = 0.0
+    for _ in range(updates):
+        rewards.append(np.mean(collect_batch_rollout(batch_env, ppo_agent, rows) or [np.nan]))
+        start = time.perf_counter()
+        ppo_agent.update()
+        update_time += time.perf_counter() - start
+    return ppo_agent, rewards, model_bytes(ppo_agent), update_time / updates
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--grid", type = int, default = 32)
+    parser.add_argument("--nodes", type = int, default = 64)
+    parser.add_argument("--nets", type = int, default = 256)
+    parser.add_argument("--num-envs", type = int, default = 16)
+    parser.add_argument("--rows", type = int, default = 64, help = "rollout rows per PPO update")
+    parser.add_argument("--updates", type = int, default = 8)
+    parser.add_argument("--encoder", default = "resnet20")
+    args = parser.parse_args()
+
+    placedb = synthetic_placedb(args.nodes, args.nets)
+    runs = {}
+    for single_network in (False, True):
+        runs[single_network] = train_run(placedb, args.grid, args.num_envs, args.rows, args.updates,
+                                         args.encoder, single_network)
+
+    print("============================================================================================")
+    print("mode \t\t model (MB) \t update (s) \t rewards per update")
+    for single_network, (_, rewards, nbytes, update_time) in runs.items():
+        print("{} \t {:.2f} \t\t {:.3f} \t\t {}".format("single network" if single_network else "policy_old   ",
+              nbytes / 2 ** 20, update_time, " ".join("{:.1f}".format(r) for r in rewards)))
+    two, one = runs[False][0], runs[True][0]
+    max_diff = max((a - b).abs().max().item() for a, b in zip(two.policy.parameters(), one.policy.parameters()))
+    same = np.allclose(runs[False][1], runs[True][1], equal_nan = True)
+    print("identical reward curves : {}, max final weight difference : {:.3g}".format(same, max_diff))
+    print("============================================================================================")
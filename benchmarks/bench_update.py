@@ -0,0 +1,48 @@
+# wall-clock and peak RSS of PPO.update() vs rollout buffer size, full batch vs minibatches
+#   python -m benchmarks.bench_update --sizes 1000 4000 16000 --minibatch 256
+import argparse
+import time
+
+import torch
+
+from PPO_place import PPO
+from benchmarks.common import peak_rss_mb, random_state, run_isolated, synthetic_graph
+
+
+def fill_buffer(ppo_agent, num_nodes, grid, size):
+    for i in range(size):
+        ppo_agent.select_action(random_state(num_nodes, grid, seed = i))
+        ppo_agent.buffer.add_reward(float(i % 7), i % num_nodes == num_nodes - 1)
+
+
+def _run(buffer_size, minibatch_size, num_nodes, grid, K_epochs):
+    torch.manual_seed(0)
+    graph = synthetic_graph(num_nodes)
+    ppo_agent = PPO(None, grid * grid, num_nodes, graph, 0.0003, 0.001, 0.99, K_epochs, 0.2, False,
+                    minibatch_size = minibatch_size, buffer_size = buffer_size)
+    fill_buffer(ppo_agent, num_nodes, grid, buffer_size)
+    base_rss = peak_rss_mb()
+    start = time.perf_counter()
+    ppo_agent.update()
+    return time.perf_counter() - start, peak_rss_mb() - base_rss
+
+
+def bench_update(buffer_size, minibatch_size, num_nodes = 543, grid = 32, K_epochs = 4):
+    return run_isolated(_run, buffer_size, minibatch_size, num_nodes, grid, K_epochs)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type = int, nargs = "+", default = [1000, 4000, 16000])
+    parser.add_argument("--minibatch", type = int, default = 256)
+    parser.add_argument("--epochs", type = int, default = 4)
+    args = parser.parse_args()
+
+    print("============================================================================================")
+    print("buffer size \t minibatch \t update time (s) \t peak RSS delta (MB)")
+    for buffer_size in args.sizes:
+        for minibatch_size in (None, args.minibatch):
+            update_time, rss_mb = bench_update(buffer_size, minibatch_size, K_epochs = args.epochs)
+            print("{} \t\t {} \t\t {:.2f} \t\t\t {:.1f}".format(
+                buffer_size, minibatch_size or "full", update_time, rss_mb))
+    print("============================================================================================")
@@ -0,0 +1,43 @@
+# env-only throughput of SubprocPlaceVecEnv vs number of worker processes
+#   python -m benchmarks.bench_vec_env --num-envs 1 4 16 32
+import argparse
+import time
+
+from env.subproc_vec_env import SubprocPlaceVecEnv
+from benchmarks.bench_batch_env import bench_single_env, random_free_cells
+from benchmarks.common import synthetic_placedb
+
+
+def bench_vec_env(placedb, grid, num_envs, rows):
+    vec_env = SubprocPlaceVecEnv(placedb, num_envs, grid)
+    try:
+        node_ids, canvases = vec_env.reset()
+        start = time.perf_counter()
+        for _ in range(rows):
+            (node_ids, canvases), _, _, _ = vec_env.step(random_free_cells(canvases))
+        steps_per_sec = rows * num_envs / (time.perf_counter() - start)
+        return steps_per_sec, vec_env.worker_timings()
+    finally:
+        vec_env.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--nodes", type = int, default = 543)
+    parser.add_argument("--nets", type = int, default = 2000)
+    parser.add_argument("--grid", type = int, default = 32)
+    parser.add_argument("--rows", type = int, default = 500)
+    parser.add_argument("--num-envs", type = int, nargs = "+", default = [1, 4, 16, 32])
+    args = parser.parse_args()
+
+    placedb = synthetic_placedb(args.nodes, args.nets)
+
+    print("============================================================================================")
+    print("PlaceEnv (in process) \t\t env steps/s : {:.0f}".format(bench_single_env(placedb, args.grid, args.rows)))
+    for num_envs in args.num_envs:
+        steps_per_sec, timings = bench_vec_env(placedb, args.grid, num_envs, args.rows)
+        busy = [t["step_time"] / (t["step_time"] + t["idle_time"]) for t in timings]
+        mean_step_us = sum(t["mean_step_us"] for t in timings) / len(timings)
+        print("SubprocPlaceVecEnv n = {} \t env steps/s : {:.0f} \t mean step : {:.0f} us \t worker busy : {:.0%}".format(
+            num_envs, steps_per_sec, mean_step_us, sum(busy) / len(busy)))
+    print("============================================================================================")
@@ -0,0 +1,78 @@
+import time
+
+import numpy as np
+import torch
+
+
+def synthetic_placedb(num_nodes, num_nets, seed = 0, **options):
+    # macro PlaceDB of a synthetic_design.generate_design() netlist, node_cnt
+    # == num_nodes and net_cnt == num_nets; options : see generate_design()
+    from synthetic_design import generate_design, placedb_from_design
+    return placedb_from_design(generate_design(num_nodes, num_nets, seed = seed, **options))
+
+
+def synthetic_graph(num_nodes, num_nets = None, seed = 0, net_model = 'hybrid', degree_threshold = 16):
+    # build_graph_from_placedb() of a synthetic_placedb() with num_nets
+    # (default 2 * num_nodes) nets; a SparseGraph without DGL. The hybrid net
+    # model keeps the high fanout nets from turning into N^2 edge cliques.
+    from build_graph import build_graph_from_placedb
+    from gcn import DEFAULT_BACKEND
+    placedb = synthetic_placedb(num_nodes, num_nets or 2 * num_nodes, seed)
+    return build_graph_from_placedb(placedb, backend = DEFAULT_BACKEND, net_model = net_model,
+                                    degree_threshold = degree_threshold)
+
+
+def random_state(num_nodes, grid, fill = 0.5, seed = 0):
+    # (node id, flattened canvas) vector as built in train_place.train()
+    rng = np.random.RandomState(seed)
+    node_id = torch.Tensor([rng.randint(num_nodes)])
+    canvas = torch.from_numpy((rng.rand(grid * grid) < fill).astype(np.float64))
+    return torch.cat((node_id, canvas))
+
+
+def timeit(fn, repeat, warmup = 1):
+    for _ in range(warmup):
+        fn()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat
+
+
+def peak_rss_mb():
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
+def run_isolated(fn, *args, poll_interval = 1.0):
+    # run fn(*args) in a forked process and return its result, so that peak
+    # RSS measurements of different configs do not contaminate each other;
+    # raises RuntimeError when fn raises or the child dies (e.g. OOM killed)
+    import multiprocessing as mp
+    import queue as queue_module
+    import traceback
+    ctx = mp.get_context("fork")
+    queue = ctx.Queue()
+
+    def target():
+        try:
+            queue.put((True, fn(*args)))
+        except BaseException:
+            queue.put((False, traceback.format_exc()))
+
+    proc = ctx.Process(target = target)
+    proc.start()
+    while True:
+        try:
+            ok, res = queue.get(timeout = poll_interval)
+            break
+        except queue_module.Empty:
+            # the result may have arrived just before the child exited
+            if not proc.is_alive() and queue.empty():
+                proc.join()
+                raise RuntimeError("isolated run of {} died with exit code {}".format(
+                    getattr(fn, "__name__", fn), proc.exitcode))
+    proc.join()
+    if not ok:
+        raise RuntimeError("isolated run of {} failed :\n{}".format(getattr(fn, "__name__", fn), res))
+    return res
@@ -0,0 +1,280 @@
+# benchmark suite of the placement RL hot paths on synthetic netlists of
+# increasing size, CPU only and offline; results as JSON, and a compare mode
+# that flags cases slower than a stored baseline
+#   python -m benchmarks.suite --sizes small medium --out results.json
+#   python -m benchmarks.suite --compare baseline.json --threshold 0.2
+#   python -m benchmarks.suite --current results.json --compare baseline.json
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import torch
+
+from synthetic_design import generate_design, placedb_from_design, write_bookshelf
+
+# name -> (macros, nets), designs from synthetic_design.generate_design()
+SIZES = {
+    "small" : (64, 256),
+    "medium" : (543, 5000),
+    "large" : (2048, 20000),
+}
+
+
+def measure(fn, repeat, warmup = 1, setup = None):
+    # wall time of every call of fn, setup() runs untimed before each call
+    times = []
+    for i in range(warmup + repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        fn()
+        if i >= warmup:
+            times.append(time.perf_counter() - start)
+    return times
+
+
+def env_grid(num_nodes):
+    # smallest grid PlaceEnv accepts, at least the usual 32
+    return max(32, int(np.ceil((1.5 * num_nodes) ** 0.5)))
+
+
+def free_cell_actions(place_env, seed = 0):
+    # one valid action per macro, distinct random cells
+    rng = np.random.RandomState(seed)
+    return rng.permutation(place_env.grid * place_env.grid)[:place_env.num_macro]
+
+
+################################### cases ###################################
+#
+# case(design) -> [(name, params, fn, repeat, setup)], design holds the
+# synthetic PlaceDB, its Bookshelf directory and shared objects of the size
+
+
+def case_place_db(design):
+    from place_db import PlaceDB
+    return [("place_db_parse", {}, lambda: PlaceDB(design["bookshelf"]), 3, None)]
+
+
+def case_build_graph(design):
+    from build_graph import build_graph_from_placedb
+    return [("build_graph_from_placedb", {"backend" : design["backend"]},
+             lambda: build_graph_from_placedb(design["placedb"], backend = design["backend"]), 3, None)]
+
+
+def case_gcn(design):
+    policy = design["policy"]
+    gcn_input = policy.gcn.node_features(policy.graph.num_nodes())
+
+    def forward():
+        with torch.no_grad():
+            policy.gcn(policy.graph, gcn_input)
+    return [("place_gcn_forward", {}, forward, 10, None)]
+
+
+def case_resnet(design):
+    from encoders import make_canvas_encoder
+    torch.manual_seed(0)
+    encoder = make_canvas_encoder("resnet20")
+    grid = design["grid"]
+    cases = []
+    for batch_size in (1, 16, 64):
+        canvases = (torch.rand(batch_size, 1, grid, grid) < 0.5).float()
+
+        def forward(canvases = canvases):
+            with torch.no_grad():
+                encoder(canvases)
+        cases.append(("resnet20_forward", {"batch_size" : batch_size}, forward, 20 if batch_size < 64 else 5, None))
+    return cases
+
+
+def case_actor_critic(design):
+    policy = design["policy"]
+    node_ids, canvases = design["states"]
+
+    def act():
+        with torch.no_grad():
+            policy.act((node_ids[:1], canvases[:1]))
+
+    def evaluate():
+        with torch.no_grad():
+            policy.evaluate(node_ids, canvases, torch.zeros(len(node_ids), dtype = torch.int64))
+    return [("actor_critic_act", {"batch_size" : 1}, act, 50, None),
+            ("actor_critic_evaluate", {"batch_size" : len(node_ids)}, evaluate, 5, None)]
+
+
+def case_place_env(design):
+    from env.place_env import PlaceEnv
+    place_env = PlaceEnv(design["placedb"], design["grid"], graph = design["graph"])
+    actions = free_cell_actions(place_env)
+
+    def episode():
+        # per step time is reported as the episode time / macros
+        for action in actions:
+            place_env.step(int(action))
+    return [("place_env_reset", {}, place_env.reset, 20, None),
+            ("place_env_episode", {"steps" : len(actions)}, episode, 3, place_env.reset)]
+
+
+def case_hpwl(design):
+    from hpwl import comp_simple_hpwl
+    placedb = design["placedb"]
+    node_pos = np.random.RandomState(0).randint(0, design["grid"], (placedb.node_cnt, 2))
+    return [("comp_simple_hpwl", {}, lambda: comp_simple_hpwl(node_pos, placedb), 20, None)]
+
+
+def case_ppo_update(design, buffer_size = 512):
+    from PPO_place import PPO
+    torch.manual_seed(0)
+    grid = design["grid"]
+    ppo_agent = PPO(None, grid * grid, design["placedb"].node_cnt, design["graph"], 0.0003, 0.001, 0.99, 2, 0.2,
+                    False, minibatch_size = 256, buffer_size = buffer_size, gcn_backend = design["backend"])
+    node_ids, canvases = design["states"]
+    rng = np.random.RandomState(0)
+    rewards = rng.rand(buffer_size)
+
+    def fill():
+        buffer = ppo_agent.buffer
+        buffer.clear()
+        for i in range(buffer_size):
+            j = i % len(node_ids)
+            buffer.add_batch(node_ids[j:j + 1], canvases[j:j + 1], torch.tensor([i % (grid * grid)]),
+                             torch.tensor([-5.0]))
+            buffer.add_reward(rewards[i], i % 64 == 63)
+    return [("ppo_update", {"buffer_size" : buffer_size, "K_epochs" : 2, "minibatch_size" : 256},
+             ppo_agent.update, 3, fill)]
+
+
+CASES = {
+    "place_db" : case_place_db,
+    "build_graph" : case_build_graph,
+    "gcn" : case_gcn,
+    "resnet" : case_resnet,
+    "actor_critic" : case_actor_critic,
+    "place_env" : case_place_env,
+    "hpwl" : case_hpwl,
+    "ppo_update" : case_ppo_update,
+}
+
+
+def make_design(size, tmp_dir):
+    from build_graph import build_graph_from_placedb
+    from gcn import DEFAULT_BACKEND
+    from PPO_place import ActorCritic
+    num_nodes, num_nets = SIZES[size]
+    synthetic = generate_design(num_nodes, num_nets)
+    placedb = placedb_from_design(synthetic)
+    bookshelf = os.path.join(tmp_dir, "synthetic_{}".format(size))
+    write_bookshelf(synthetic, bookshelf)
+    backend = DEFAULT_BACKEND
+    graph = build_graph_from_placedb(placedb, backend = backend)
+    grid = env_grid(num_nodes)
+    torch.manual_seed(0)
+    policy = ActorCritic(None, grid * grid, num_nodes, graph, False, 0.6, gcn_backend = backend)
+    rng = np.random.RandomState(0)
+    states = (torch.from_numpy(rng.randint(0, num_nodes, 256)).int(),
+              torch.from_numpy((rng.rand(256, grid * grid) < 0.3).astype(np.uint8)))
+    return {"placedb" : placedb, "bookshelf" : bookshelf, "backend" : backend, "graph" : graph, "grid" : grid,
+            "policy" : policy, "states" : states}
+
+
+def environment():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output = True, text = True,
+                                cwd = os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        "python" : platform.python_version(),
+        "torch" : torch.__version__,
+        "numpy" : np.__version__,
+        "machine" : platform.machine(),
+        "processor" : platform.processor(),
+        "cpu_count" : os.cpu_count(),
+        "torch_threads" : torch.get_num_threads(),
+        "commit" : commit,
+        "time" : time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+
+def run_suite(sizes, cases, repeat_scale = 1.0):
+    results = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for size in sizes:
+            design = make_design(size, tmp_dir)
+            num_nodes, num_nets = SIZES[size]
+            for case in cases:
+                for name, params, fn, repeat, setup in CASES[case](design):
+                    times = measure(fn, max(1, int(round(repeat * repeat_scale))), setup = setup)
+                    results.append({
+                        "name" : name, "size" : size, "macros" : num_nodes, "nets" : num_nets,
+                        "pins" : int(len(design["placedb"].net_pin_nodes)), "params" : params,
+                        "repeat" : len(times), "min_s" : min(times), "median_s" : float(np.median(times)),
+                    })
+                    print("{:<24} {:<8} {:<40} min {:.4f} s \t median {:.4f} s".format(
+                        name, size, json.dumps(params), results[-1]["min_s"], results[-1]["median_s"]))
+    return {"environment" : environment(), "results" : results}
+
+
+def result_key(result):
+    return (result["name"], result["size"], json.dumps(result["params"], sort_keys = True))
+
+
+def compare(current, baseline, threshold):
+    # min times of the cases present in both runs; a case is a regression
+    # when it got slower than baseline * (1 + threshold)
+    baseline_results = {result_key(r) : r for r in baseline["results"]}
+    regressions = []
+    print("case \t\t\t size \t params \t\t\t\t baseline (s) \t current (s) \t ratio")
+    for result in current["results"]:
+        base = baseline_results.get(result_key(result))
+        if base is None:
+            continue
+        ratio = result["min_s"] / base["min_s"]
+        flag = ""
+        if ratio > 1.0 + threshold:
+            regressions.append(result_key(result))
+            flag = " \t REGRESSION"
+        elif ratio < 1.0 / (1.0 + threshold):
+            flag = " \t faster"
+        print("{:<24} {:<8} {:<40} {:.4f} \t {:.4f} \t {:.2f}x{}".format(
+            result["name"], result["size"], json.dumps(result["params"]), base["min_s"], result["min_s"], ratio, flag))
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", nargs = "+", default = ["small", "medium"], choices = list(SIZES))
+    parser.add_argument("--cases", nargs = "+", default = list(CASES), choices = list(CASES))
+    parser.add_argument("--repeat-scale", type = float, default = 1.0, help = "multiplies the repeat count of every case")
+    parser.add_argument("--out", help = "write the results JSON here")
+    parser.add_argument("--current", help = "results JSON to compare instead of running the suite")
+    parser.add_argument("--compare", help = "baseline results JSON, flags regressions")
+    parser.add_argument("--threshold", type = float, default = 0.2, help = "allowed slowdown before a case is flagged")
+    args = parser.parse_args()
+
+    print("============================================================================================")
+    if args.current:
+        with open(args.current) as f:
+            current = json.load(f)
+    else:
+        current = run_suite(args.sizes, args.cases, args.repeat_scale)
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(current, f, indent = 1)
+        print("results written to : " + args.out)
+
+    regressions = []
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        print("--------------------------------------------------------------------------------------------")
+        regressions = compare(current, baseline, args.threshold)
+        print("{} regression(s) over {:.0f}% against {}".format(len(regressions), 100 * args.threshold, args.compare))
+    print("============================================================================================")
+    sys.exit(1 if regressions else 0)
@@ -1,27 +1,149 @@
-import dgl
+import warnings
+
+import numpy as np
+import torch
+try:
+    import dgl
+except (ImportError, OSError):
+    # see gcn.py
+    dgl = None
+from gcn import SparseGraph
 from place_db import PlaceDB
 
-def build_graph_from_placedb(placedb):
-    src_node_list = []
-    dst_node_list = []
-    for net_name in placedb.net_info:
-        net_node_list = list(placedb.net_info[net_name].keys())
-        # print("net_node_list", net_node_list)
-        for i in range(len(net_node_list)-1):
-            for j in range(i+1, len(net_node_list)):
-                # print("i", i, "j", j)
-                src_node_list.append(placedb.node_info[net_node_list[i]]['id'])
-                dst_node_list.append(placedb.node_info[net_node_list[j]]['id'])
-    g = dgl.graph((src_node_list, dst_node_list))
-    if placedb.node_cnt > g.num_nodes():
-        g.add_nodes(placedb.node_cnt - g.num_nodes())
-    g = dgl.add_reverse_edges(g)
+# Nets are turned into edges with one of three net models:
+#   'clique' : every pair of pins of a net, d * (d - 1) / 2 edges per net
+#   'star'   : the first pin of a net connected to every other pin, d - 1 edges
+#   'hybrid' : clique for nets with <= degree_threshold pins, star above
+# Pairs shared by several nets are merged into one edge whose weight is the
+# number of nets that produced it, so sum aggregation over the weighted graph
+# gives the same result as the duplicated edges it replaces.
+
+NET_MODELS = ('clique', 'star', 'hybrid')
+
+
+def net_edge_count(degrees, threshold):
+    # edges before merging when nets with <= threshold pins are cliques and
+    # the others stars
+    degrees = np.asarray(degrees, dtype = np.int64)
+    clique = degrees <= threshold
+    return int((degrees[clique] * (degrees[clique] - 1) // 2).sum() + (degrees[~clique] - 1).sum())
+
+
+def budget_threshold(degrees, max_edges):
+    # largest clique degree threshold whose edge count (before merging, an
+    # upper bound of the merged one) fits in max_edges; 1 (star for every
+    # net) when nothing fits
+    values, counts = np.unique(np.asarray(degrees, dtype = np.int64), return_counts = True)
+    clique_edges = np.cumsum(counts * values * (values - 1) // 2)
+    star_edges = np.cumsum((counts * (values - 1))[::-1])[::-1]
+    # edges with threshold = values[i]: cliques up to values[i], stars above
+    total = clique_edges + np.append(star_edges[1:], 0)
+    fits = np.nonzero(total <= max_edges)[0]
+    return int(values[fits[-1]]) if len(fits) else 1
+
+
+def clique_edges(pin_nodes, net_offsets, nets):
+    # all pin pairs (i < j) of the given nets, nets of equal degree at once
+    degrees = net_offsets[nets + 1] - net_offsets[nets]
+    src_list = []
+    dst_list = []
+    for degree in np.unique(degrees):
+        if degree < 2:
+            continue
+        starts = net_offsets[nets[degrees == degree]]
+        pins = pin_nodes[starts[:, None] + np.arange(degree)]    # (nets, degree)
+        iu, ju = np.triu_indices(degree, 1)
+        src_list.append(pins[:, iu].ravel())
+        dst_list.append(pins[:, ju].ravel())
+    if not src_list:
+        return np.zeros(0, dtype = np.int64), np.zeros(0, dtype = np.int64)
+    return np.concatenate(src_list), np.concatenate(dst_list)
+
+
+def star_edges(pin_nodes, net_offsets, nets):
+    # first pin of each net to its other pins
+    counts = np.maximum(net_offsets[nets + 1] - net_offsets[nets] - 1, 0)
+    first = np.repeat(net_offsets[nets], counts)
+    # the k-th other pin of a net sits at first + 1 + k
+    k = np.arange(len(first)) - np.repeat(np.cumsum(counts) - counts, counts)
+    return pin_nodes[first], pin_nodes[first + 1 + k]
+
+
+def merge_edges(src, dst, num_nodes):
+    # undirected duplicate edges -> unique (src < dst) pairs with their count
+    # as weight; self pairs are dropped, graph_from_edges() adds self loops
+    lo = np.minimum(src, dst)
+    hi = np.maximum(src, dst)
+    keep = lo != hi
+    keys, counts = np.unique(lo[keep] * num_nodes + hi[keep], return_counts = True)
+    return keys // num_nodes, keys % num_nodes, counts.astype(np.float32)
+
+
+def build_edges_from_placedb(placedb, net_model = 'clique', degree_threshold = 16, max_edges = None):
+    # (src, dst, weight) arrays of the merged netlist graph; max_edges is an
+    # edge budget, the largest nets are switched from clique to star until
+    # the edge count fits (it never makes a net model denser). When even the
+    # all star graph is over budget it is returned with a warning.
+    assert net_model in NET_MODELS
+    pin_nodes = np.asarray(placedb.net_pin_nodes, dtype = np.int64)
+    net_offsets = np.asarray(placedb.net_offsets, dtype = np.int64)
+    degrees = np.diff(net_offsets)
+    if net_model == 'clique':
+        threshold = int(degrees.max()) if len(degrees) else 0
+    elif net_model == 'star':
+        threshold = 1
+    else:
+        threshold = degree_threshold
+    if max_edges is not None:
+        threshold = min(threshold, budget_threshold(degrees, max_edges))
+
+    nets = np.arange(len(degrees))
+    clique = degrees <= threshold
+    clique_src, clique_dst = clique_edges(pin_nodes, net_offsets, nets[clique])
+    star_src, star_dst = star_edges(pin_nodes, net_offsets, nets[~clique])
+    src, dst, weight = merge_edges(np.concatenate([clique_src, star_src]), np.concatenate([clique_dst, star_dst]),
+                                   placedb.node_cnt)
+    if max_edges is not None and len(src) > max_edges:
+        warnings.warn("edge budget max_edges = {} cannot be met, with every net a star the graph has {} edges".format(
+            max_edges, len(src)))
+    return src, dst, weight
+
+
+def graph_from_edges(src, dst, num_nodes, weight = None):
+    # weight is stored as an (E, 1) g.edata['w'] (1 on the self loops) and used by the
+    # GCN layers; without it every edge counts once
+    g = dgl.graph((torch.as_tensor(src), torch.as_tensor(dst)))
+    if num_nodes > g.num_nodes():
+        g.add_nodes(num_nodes - g.num_nodes())
+    if weight is not None:
+        g.edata['w'] = torch.as_tensor(weight, dtype = torch.float32).reshape(-1, 1)
+    g = dgl.add_reverse_edges(g, copy_edata = True)
     g = dgl.add_self_loop(g)
     return g
 
 
+def sparse_graph_from_edges(src, dst, num_nodes, weight = None):
+    # same graph as graph_from_edges() for the DGL-free 'spmm' GCN backend
+    src = np.asarray(src, dtype = np.int64)
+    dst = np.asarray(dst, dtype = np.int64)
+    weight = np.ones(len(src), dtype = np.float32) if weight is None else np.asarray(weight, dtype = np.float32).reshape(-1)
+    loops = np.arange(num_nodes, dtype = np.int64)
+    return SparseGraph.from_edges(np.concatenate([src, dst, loops]), np.concatenate([dst, src, loops]), num_nodes,
+                                  np.concatenate([weight, weight, np.ones(num_nodes, dtype = np.float32)]))
+
+
+def build_graph_from_placedb(placedb, backend = None, **options):
+    # backend : 'dgl' for a DGL graph, 'spmm' for a SparseGraph, None picks
+    # 'dgl' when it is installed; options : see build_edges_from_placedb()
+    src, dst, weight = build_edges_from_placedb(placedb, **options)
+    if backend == 'spmm' or (backend is None and dgl is None):
+        return sparse_graph_from_edges(src, dst, placedb.node_cnt, weight)
+    return graph_from_edges(src, dst, placedb.node_cnt, weight)
+
+
 if __name__ == "__main__":
-    placedb = PlaceDB("adaptec1")
-    g = build_graph_from_placedb(placedb)
+    from design_cache import load_graph, load_placedb
+    placedb = load_placedb("adaptec1")
+    g = load_graph(placedb)
     print("num of nodes: {}".format(g.num_nodes()))
     print("num of edges: {}".format(g.num_edges()))
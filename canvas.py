@@ -0,0 +1,45 @@
+import numpy as np
+import torch
+import torch.nn.functional as F
+
+# Occupancy canvases stored as packed bits: 8 cells per uint8, most
+# significant bit first (np.packbits order). A flattened grid * grid canvas
+# takes packed_size(grid * grid) bytes; policies unpack a whole batch at once
+# right before the canvas encoder.
+
+_SHIFTS = torch.tensor([7, 6, 5, 4, 3, 2, 1, 0], dtype=torch.uint8)
+
+
+def packed_size(num_cells):
+    return (num_cells + 7) // 8
+
+
+def pack_canvases(canvases):
+    # (..., num_cells) 0 / 1 canvases of any dtype -> (..., packed_size) uint8
+    canvases = torch.as_tensor(canvases)
+    if canvases.device.type == 'cpu':
+        return torch.from_numpy(np.packbits(canvases.numpy() != 0, axis=-1))
+    bits = (canvases != 0).to(torch.uint8)
+    pad = -bits.shape[-1] % 8
+    if pad:
+        bits = F.pad(bits, (0, pad))
+    bits = bits.reshape(bits.shape[:-1] + (-1, 8))
+    return (bits << _SHIFTS.to(bits.device)).sum(-1).to(torch.uint8)
+
+
+# bits of every byte value, unpacking is one table lookup per byte
+_UNPACK_TABLE = (torch.arange(256, dtype=torch.uint8).unsqueeze(-1) >> _SHIFTS) & 1
+
+
+def unpack_canvases(packed, num_cells, dtype=torch.float32):
+    # (..., packed_size) uint8 -> (..., num_cells) 0 / 1 canvases of dtype
+    table = _UNPACK_TABLE.to(device=packed.device, dtype=dtype)
+    bits = F.embedding(packed.long(), table)
+    return bits.reshape(packed.shape[:-1] + (-1,))[..., :num_cells]
+
+
+def canvas_input(canvases, num_cells, dtype=torch.float32):
+    # packed or plain (..., num_cells) canvases -> plain canvases of dtype
+    if canvases.shape[-1] != num_cells:
+        return unpack_canvases(canvases, num_cells, dtype)
+    return canvases.to(dtype)
@@ -0,0 +1,138 @@
+import glob
+import os
+import queue
+import random
+import threading
+
+import numpy as np
+import torch
+
+# Full training state checkpoints written in the background: save() / write()
+# snapshot the state to CPU memory in the calling thread (tensor copies only),
+# a writer thread torch.save()s the snapshot to a temporary file and renames
+# it into place, so a file on disk is always a complete checkpoint. save()
+# keeps the last `keep` numbered checkpoints of a run.
+
+
+def cpu_snapshot(obj):
+    # copy of nested dicts / lists / tuples with every tensor copied to CPU,
+    # later in place updates of the live tensors do not reach the snapshot
+    if torch.is_tensor(obj):
+        return obj.detach().to('cpu', copy = True)
+    if isinstance(obj, dict):
+        snapshot = type(obj)((k, cpu_snapshot(v)) for k, v in obj.items())
+        if hasattr(obj, '_metadata'):
+            # module state_dict versions
+            snapshot._metadata = obj._metadata
+        return snapshot
+    if isinstance(obj, (list, tuple)):
+        return type(obj)(cpu_snapshot(v) for v in obj)
+    return obj
+
+
+def rng_state():
+    state = {
+        'python' : random.getstate(),
+        'numpy' : np.random.get_state(),
+        'torch' : torch.get_rng_state(),
+    }
+    if torch.cuda.is_available():
+        state['cuda'] = torch.cuda.get_rng_state_all()
+    return state
+
+
+def set_rng_state(state):
+    random.setstate(state['python'])
+    np.random.set_state(state['numpy'])
+    torch.set_rng_state(state['torch'])
+    if 'cuda' in state and torch.cuda.is_available():
+        torch.cuda.set_rng_state_all(state['cuda'])
+
+
+def checkpoint_file(directory, prefix, step):
+    # zero padded step, name order is step order
+    return os.path.join(directory, "{}_{:012d}.ckpt".format(prefix, step))
+
+
+def list_checkpoints(directory, prefix):
+    return sorted(glob.glob(os.path.join(directory, prefix + "_" + "[0-9]" * 12 + ".ckpt")))
+
+
+def latest_checkpoint(directory, prefix):
+    checkpoints = list_checkpoints(directory, prefix)
+    return checkpoints[-1] if checkpoints else None
+
+
+def load_checkpoint(path):
+    # full checkpoints hold numpy / python RNG states, not only tensors
+    return torch.load(path, map_location = 'cpu', weights_only = False)
+
+
+class AsyncCheckpointer:
+    def __init__(self, directory, prefix, keep = 3):
+        self.directory = directory
+        self.prefix = prefix
+        self.keep = keep
+        os.makedirs(directory, exist_ok = True)
+        self.queue = queue.Queue()
+        self.error = None
+        self.thread = threading.Thread(target = self._run, daemon = True)
+        self.thread.start()
+
+
+    def save(self, state, step):
+        # numbered checkpoint of the run, rotated
+        path = checkpoint_file(self.directory, self.prefix, step)
+        self._submit(path, state, True)
+        return path
+
+
+    def write(self, path, state):
+        # any other file, e.g. the policy weights loaded by test.py
+        self._submit(path, state, False)
+
+
+    def wait(self):
+        # block until every submitted checkpoint is on disk
+        self.queue.join()
+        self._raise_error()
+
+
+    def close(self):
+        self.queue.put(None)
+        self.thread.join()
+        self._raise_error()
+
+
+    def _submit(self, path, state, rotate):
+        self._raise_error()
+        self.queue.put((path, cpu_snapshot(state), rotate))
+
+
+    def _raise_error(self):
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise RuntimeError("checkpoint writing failed") from error
+
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                self.queue.task_done()
+                return
+            path, state, rotate = item
+            try:
+                tmp_path = path + ".tmp"
+                with open(tmp_path, "wb") as f:
+                    torch.save(state, f)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp_path, path)
+                if rotate and self.keep:
+                    for old_path in list_checkpoints(self.directory, self.prefix)[:-self.keep]:
+                        os.remove(old_path)
+            except Exception as e:
+                self.error = e
+            finally:
+                self.queue.task_done()
@@ -0,0 +1,71 @@
+import math
+import warnings
+
+import torch
+
+# Compiled inference modules for the rollout policy (PPO.policy_old). The
+# rollout modules are small nn.Modules that share their weights with the
+# eager policy, so a load_state_dict() into policy_old is seen by the
+# compiled module without recompiling.
+#   mode = None      : eager, no compiled module
+#   mode = 'trace'   : torch.jit.trace (TorchScript)
+#   mode = 'compile' : torch.compile, needs a working C++ toolchain for the
+#                      default inductor backend on CPU; inductor draws its own
+#                      random numbers, samples follow the same distribution
+#                      but not the eager random stream
+
+COMPILE_MODES = (None, 'trace', 'compile')
+
+
+def compile_rollout_policy(module, example_inputs, mode = 'trace', backend = 'inductor'):
+    # compiled module, or None (run eager) when compilation or the first call
+    # on example_inputs fails
+    assert mode in COMPILE_MODES
+    if mode is None:
+        return None
+    # tracing and the test call run the module: keep the global RNG stream
+    # and buffers (BatchNorm running stats) as if they never happened
+    buffers = [buf.clone() for buf in module.buffers()]
+    try:
+        with torch.no_grad(), torch.random.fork_rng(devices = []):
+            if mode == 'trace':
+                # sampling is random, the traced graph cannot be checked
+                # against a second eager run
+                with warnings.catch_warnings():
+                    # TorchScript deprecation notice
+                    warnings.simplefilter("ignore", FutureWarning)
+                    compiled = torch.jit.trace(module, example_inputs, check_trace = False)
+            else:
+                compiled = torch.compile(module, backend = backend, dynamic = True)
+            compiled(*example_inputs)
+    except Exception as e:
+        print("--------------------------------------------------------------------------------------------")
+        print("WARNING : {} of the rollout policy failed, falling back to eager : {}".format(mode, repr(e).splitlines()[0]))
+        print("--------------------------------------------------------------------------------------------")
+        return None
+    finally:
+        with torch.no_grad():
+            for buf, saved in zip(module.buffers(), buffers):
+                buf.copy_(saved)
+    return compiled
+
+
+def categorical_sample(probs):
+    # Categorical(probs).sample() / .log_prob() in plain tensor ops, consumes
+    # the same random numbers as torch.distributions.Categorical
+    probs = probs / probs.sum(-1, keepdim = True)
+    action = torch.multinomial(probs.reshape(-1, probs.shape[-1]), 1, True).reshape(probs.shape[:-1])
+    eps = torch.finfo(probs.dtype).eps
+    logits = torch.log(probs.clamp(min = eps, max = 1 - eps))
+    action_logprob = logits.gather(-1, action.unsqueeze(-1)).squeeze(-1)
+    return action, action_logprob
+
+
+def gaussian_sample(action_mean, action_var):
+    # MultivariateNormal(action_mean, diag(action_var)).sample() / .log_prob()
+    # in plain tensor ops
+    action_std = action_var.sqrt()
+    action = action_mean + action_std * torch.randn_like(action_mean)
+    z = (action - action_mean) / action_std
+    action_logprob = -0.5 * (action_mean.shape[-1] * math.log(2 * math.pi) + (z * z).sum(-1)) - action_std.log().sum(-1)
+    return action, action_logprob
@@ -0,0 +1,101 @@
+import argparse
+import os
+import socket
+
+import torch
+import torch.distributed as dist
+import torch.multiprocessing as mp
+
+# Data parallel PPO updates over torch.distributed (gloo, CPU). Every rank
+# runs train_place.train() with its own PlaceEnv and collects
+# 1 / world_size of each rollout; PPO.update() averages the gradients of
+# all ranks before optimizer.step(), so the ranks keep identical weights.
+#
+# One machine, 4 ranks:
+#   python ddp.py --nproc 4
+# Short run on a small synthetic design, checks that every rank stops at the
+# same step with the same weights:
+#   python ddp.py --nproc 2 --smoke
+# Several machines (run on every node, node_rank 0..nnodes-1):
+#   torchrun --nnodes 2 --nproc_per_node 4 --node_rank 0 --master_addr host0 --master_port 29500 train_place.py
+#
+# init_distributed() picks the rank / world size up from the environment
+# (RANK, WORLD_SIZE, MASTER_ADDR, MASTER_PORT, as set by torchrun or
+# launch()); without WORLD_SIZE > 1 training stays single process.
+
+
+def init_distributed(backend = 'gloo'):
+    # -> (rank, world_size)
+    world_size = int(os.environ.get('WORLD_SIZE', 1))
+    if world_size <= 1:
+        return 0, 1
+    if not dist.is_initialized():
+        dist.init_process_group(backend)
+    return dist.get_rank(), dist.get_world_size()
+
+
+def broadcast_module(module, src = 0):
+    # parameters and buffers of every rank set to the ones of rank src
+    with torch.no_grad():
+        for tensor in list(module.parameters()) + list(module.buffers()):
+            dist.broadcast(tensor.data, src)
+
+
+def allreduce_gradients(parameters):
+    # mean gradient over the ranks, one all_reduce over a flat bucket
+    grads = [p.grad for p in parameters if p.grad is not None]
+    if not grads:
+        return
+    flat = torch.cat([g.reshape(-1) for g in grads])
+    dist.all_reduce(flat)
+    flat /= dist.get_world_size()
+    offset = 0
+    for g in grads:
+        g.copy_(flat[offset:offset + g.numel()].view_as(g))
+        offset += g.numel()
+
+
+def max_replica_difference(module):
+    # largest abs difference of the parameters of any rank to rank 0, a
+    # collective: every rank has to call it
+    flat = torch.cat([p.detach().reshape(-1) for p in module.parameters()])
+    reference = flat.clone()
+    dist.broadcast(reference, 0)
+    diff = (flat - reference).abs().max()
+    dist.all_reduce(diff, op = dist.ReduceOp.MAX)
+    return float(diff)
+
+
+def free_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def _run_rank(rank, world_size, port, fn, args):
+    os.environ.update({'RANK' : str(rank), 'LOCAL_RANK' : str(rank), 'WORLD_SIZE' : str(world_size),
+                       'MASTER_ADDR' : '127.0.0.1', 'MASTER_PORT' : str(port)})
+    # share the cores between the ranks
+    torch.set_num_threads(max(1, (os.cpu_count() or 1) // world_size))
+    try:
+        fn(*args)
+    finally:
+        if dist.is_initialized():
+            dist.destroy_process_group()
+
+
+def launch(fn, nproc, *args):
+    # fn(*args) in nproc local processes forming one gloo process group
+    mp.spawn(_run_rank, args = (nproc, free_port(), fn, args), nprocs = nproc, join = True)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--nproc', type = int, default = 2, help = 'local ranks')
+    parser.add_argument('--smoke', action = 'store_true', help = 'short run on a synthetic design')
+    args = parser.parse_args()
+
+    from train_place import train
+    launch(train, args.nproc, args.smoke)
+    if args.smoke:
+        print("smoke run finished on {} ranks".format(args.nproc))
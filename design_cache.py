@@ -0,0 +1,125 @@
+import hashlib
+import json
+import os
+import shutil
+import time
+
+import numpy as np
+
+from place_db import PlaceDB, design_files
+
+# bump when the parser or the graph builder changes what they produce
+CACHE_VERSION = 3
+CACHE_DIR = ".design_cache"
+
+
+def file_fingerprint(paths, content_hash = False):
+    # (name, size, mtime) of every input file, plus a sha1 of the contents
+    # with content_hash = True for caches shared across checkouts / machines
+    fingerprint = []
+    for path in paths:
+        stat = os.stat(path)
+        entry = [os.path.basename(path), stat.st_size, stat.st_mtime_ns]
+        if content_hash:
+            sha1 = hashlib.sha1()
+            with open(path, "rb") as f:
+                for chunk in iter(lambda: f.read(1 << 20), b""):
+                    sha1.update(chunk)
+            entry[2] = sha1.hexdigest()
+        fingerprint.append(entry)
+    return fingerprint
+
+
+def cache_key(kind, fingerprint, options = None):
+    key = json.dumps({"version": CACHE_VERSION, "kind": kind, "inputs": fingerprint,
+                      "options": options or {}}, sort_keys = True)
+    return hashlib.sha1(key.encode()).hexdigest()[:16]
+
+
+def save_arrays(path, arrays):
+    # one .npy per array so that load_arrays() can memory-map them; written
+    # to a temporary directory first and renamed, readers never see a
+    # partial entry
+    tmp_path = "{}.tmp{}".format(path, os.getpid())
+    os.makedirs(tmp_path, exist_ok = True)
+    for name, array in arrays.items():
+        np.save(os.path.join(tmp_path, name + ".npy"), np.ascontiguousarray(array))
+    try:
+        os.rename(tmp_path, path)
+    except OSError:
+        # another process stored the same entry meanwhile
+        shutil.rmtree(tmp_path, ignore_errors = True)
+
+
+def load_arrays(path, mmap_mode = "r"):
+    return {name[:-4]: np.load(os.path.join(path, name), mmap_mode = mmap_mode)
+            for name in os.listdir(path) if name.endswith(".npy")}
+
+
+def load_placedb(benchmark = "adaptec1", cache_dir = CACHE_DIR, content_hash = False):
+    # PlaceDB(benchmark), parsed once and then loaded from cache_dir
+    name = os.path.basename(os.path.normpath(benchmark))
+    key = cache_key("placedb", file_fingerprint(design_files(benchmark), content_hash))
+    path = os.path.join(cache_dir, "{}-placedb-{}".format(name, key))
+    if os.path.isdir(path):
+        placedb = PlaceDB.from_arrays(load_arrays(path))
+    else:
+        placedb = PlaceDB(benchmark)
+        os.makedirs(cache_dir, exist_ok = True)
+        save_arrays(path, placedb.to_arrays())
+    placedb.cache_key = key
+    return placedb
+
+
+def placedb_fingerprint(placedb):
+    # content hash of the netlist arrays the graph is built from
+    sha1 = hashlib.sha1()
+    sha1.update(str(placedb.node_cnt).encode())
+    sha1.update(np.ascontiguousarray(placedb.net_pin_nodes).tobytes())
+    sha1.update(np.ascontiguousarray(placedb.net_offsets).tobytes())
+    return sha1.hexdigest()
+
+
+def load_edges(placedb, cache_dir = CACHE_DIR, options = None):
+    # build_edges_from_placedb(placedb, **options) through the cache; options
+    # are the graph builder options and take part in the key
+    from build_graph import build_edges_from_placedb
+    key = cache_key("graph", placedb_fingerprint(placedb), options)
+    path = os.path.join(cache_dir, "graph-{}".format(key))
+    if os.path.isdir(path):
+        arrays = load_arrays(path)
+        return arrays["src"], arrays["dst"], arrays["weight"]
+    src, dst, weight = build_edges_from_placedb(placedb, **(options or {}))
+    os.makedirs(cache_dir, exist_ok = True)
+    save_arrays(path, {"src": src, "dst": dst, "weight": weight})
+    return src, dst, weight
+
+
+def load_graph(placedb, cache_dir = CACHE_DIR, options = None, backend = None):
+    # backend = 'spmm' returns a gcn.SparseGraph, which does not need DGL;
+    # None picks 'dgl' when DGL can be imported
+    from build_graph import graph_from_edges, sparse_graph_from_edges
+    from gcn import DEFAULT_BACKEND
+    src, dst, weight = load_edges(placedb, cache_dir, options)
+    if (backend or DEFAULT_BACKEND) == 'spmm':
+        return sparse_graph_from_edges(src, dst, placedb.node_cnt, weight)
+    return graph_from_edges(np.array(src), np.array(dst), placedb.node_cnt, np.array(weight))
+
+
+if __name__ == "__main__":
+    import sys
+    benchmark = sys.argv[1] if len(sys.argv) > 1 else "adaptec1"
+    cache_dir = os.path.join(CACHE_DIR, "timing")
+    shutil.rmtree(cache_dir, ignore_errors = True)
+
+    print("============================================================================================")
+    for run in ("cold", "warm"):
+        start = time.perf_counter()
+        placedb = load_placedb(benchmark, cache_dir)
+        placedb_time = time.perf_counter() - start
+        start = time.perf_counter()
+        g = load_graph(placedb, cache_dir)
+        graph_time = time.perf_counter() - start
+        print("{} \t placedb : {:.1f} ms \t graph : {:.1f} ms \t nodes : {} \t edges : {}".format(
+            run, placedb_time * 1000, graph_time * 1000, g.num_nodes(), g.num_edges()))
+    print("============================================================================================")
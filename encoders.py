@@ -0,0 +1,77 @@
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+
+import resnet
+
+# Canvas encoders of ActorCritic: (B, 1, grid, grid) occupancy -> (B, out_dim)
+# features. Every encoder sets out_dim and works for any grid size.
+
+
+class SmallCNN(nn.Module):
+    # three 3x3 conv + max pool stages, global average pool
+    def __init__(self, out_dim = 64):
+        super(SmallCNN, self).__init__()
+        self.conv1 = nn.Conv2d(1, 16, kernel_size=3, padding=1)
+        self.conv2 = nn.Conv2d(16, 32, kernel_size=3, padding=1)
+        self.conv3 = nn.Conv2d(32, out_dim, kernel_size=3, padding=1)
+        self.out_dim = out_dim
+
+    def forward(self, x):
+        out = F.max_pool2d(F.relu(self.conv1(x)), 2)
+        out = F.max_pool2d(F.relu(self.conv2(out)), 2)
+        out = F.relu(self.conv3(out))
+        return F.adaptive_avg_pool2d(out, 1).flatten(1)
+
+
+class StridedConvEncoder(nn.Module):
+    # stride 2 convs only, no pooling until the global average
+    def __init__(self, out_dim = 64):
+        super(StridedConvEncoder, self).__init__()
+        self.convs = nn.Sequential(
+            nn.Conv2d(1, 16, kernel_size=4, stride=2, padding=1),
+            nn.ReLU(),
+            nn.Conv2d(16, 32, kernel_size=4, stride=2, padding=1),
+            nn.ReLU(),
+            nn.Conv2d(32, out_dim, kernel_size=4, stride=2, padding=1),
+            nn.ReLU(),
+        )
+        self.out_dim = out_dim
+
+    def forward(self, x):
+        return F.adaptive_avg_pool2d(self.convs(x), 1).flatten(1)
+
+
+class PooledOccupancyMLP(nn.Module):
+    # occupancy fraction of pooled_size x pooled_size blocks fed to an MLP
+    def __init__(self, pooled_size = 8, hidden_dim = 128, out_dim = 64):
+        super(PooledOccupancyMLP, self).__init__()
+        self.pooled_size = pooled_size
+        self.mlp = nn.Sequential(
+            nn.Linear(pooled_size * pooled_size, hidden_dim),
+            nn.ReLU(),
+            nn.Linear(hidden_dim, out_dim),
+            nn.ReLU(),
+        )
+        self.out_dim = out_dim
+
+    def forward(self, x):
+        return self.mlp(F.adaptive_avg_pool2d(x, self.pooled_size).flatten(1))
+
+
+CANVAS_ENCODERS = {
+    'resnet20': resnet.resnet20,
+    'resnet32': resnet.resnet32,
+    'resnet44': resnet.resnet44,
+    'resnet56': resnet.resnet56,
+    'resnet110': resnet.resnet110,
+    'resnet1202': resnet.resnet1202,
+    'cnn': SmallCNN,
+    'strided': StridedConvEncoder,
+    'pooled_mlp': PooledOccupancyMLP,
+}
+
+
+def make_canvas_encoder(name):
+    assert name in CANVAS_ENCODERS, "unknown canvas encoder {}, one of {}".format(name, sorted(CANVAS_ENCODERS))
+    return CANVAS_ENCODERS[name]()
@@ -0,0 +1,82 @@
+import numpy as np
+import torch
+import sys
+sys.path.append("..")
+from place_db import PlaceDB
+from build_graph import build_graph_from_placedb
+from hpwl import comp_simple_hpwl
+from metrics import metrics
+
+
+class BatchPlaceEnv():
+    # batch_size independent PlaceEnv episodes advanced by one vectorized
+    # step() call. All canvases live in one (B, grid, grid) uint8 tensor and
+    # node positions in one (B, N, 2) int array. Slots whose episode ends are
+    # reset automatically, so step() always returns observations that can be
+    # fed straight back to the policy.
+
+    def __init__(self, placedb, batch_size, grid = 32, graph = None):
+        assert grid * grid >= 1.5 * placedb.node_cnt
+        self.grid = grid
+        self.batch_size = batch_size
+        self.placedb = placedb
+        self.num_macro = placedb.node_cnt
+        self.num_net = placedb.net_cnt
+        self.graph = graph if graph is not None else build_graph_from_placedb(self.placedb)
+
+        self.canvas = torch.zeros((batch_size, grid, grid), dtype = torch.uint8)
+        self.node_pos = np.zeros((batch_size, self.num_macro, 2), dtype = np.int32)
+        self.num_macro_placed = np.zeros(batch_size, dtype = np.int64)
+
+    def observation(self):
+        # (node ids to place, flattened canvases), shared with the env state,
+        # copy before the next step() if kept around
+        return torch.from_numpy(self.num_macro_placed), self.canvas.view(self.batch_size, -1)
+
+    def reset(self):
+        self.canvas.zero_()
+        self.node_pos.fill(0)
+        self.num_macro_placed.fill(0)
+        return self.observation()
+
+    def reset_slots(self, slots):
+        self.canvas[torch.from_numpy(slots)] = 0
+        self.node_pos[slots] = 0
+        self.num_macro_placed[slots] = 0
+
+    # hpwl without pin offset, node_pos : (b, N, 2) finished placements
+    def comp_simple_hpwl(self, node_pos):
+        return comp_simple_hpwl(node_pos, self.placedb)[0]
+
+    def step(self, actions):
+        actions = np.asarray(actions, dtype = np.int64)
+        assert actions.shape == (self.batch_size,)
+        slots = np.arange(self.batch_size)
+        x = actions // self.grid
+        y = actions % self.grid
+
+        occupied = self.canvas.numpy()[slots, x, y] == 1
+        ok = slots[~occupied]
+        self.canvas.numpy()[ok, x[ok], y[ok]] = 1
+        self.node_pos[ok, self.num_macro_placed[ok], 0] = x[ok]
+        self.node_pos[ok, self.num_macro_placed[ok], 1] = y[ok]
+        self.num_macro_placed[ok] += 1
+
+        rewards = np.zeros(self.batch_size, dtype = np.float64)
+        hpwl = np.full(self.batch_size, np.nan)
+        finished = self.num_macro_placed == self.num_macro
+        if finished.any():
+            hpwl[finished] = self.comp_simple_hpwl(self.node_pos[finished])
+            rewards[finished] = self.grid * 2 * self.num_net - hpwl[finished]
+            for slot in np.flatnonzero(finished):
+                metrics.emit('placement', reward = float(rewards[slot]), hpwl = float(hpwl[slot]),
+                             macros = self.num_macro)
+        dones = occupied | finished
+
+        infos = {"hpwl": hpwl, "num_macro_placed": self.num_macro_placed.copy()}
+        if dones.any():
+            self.reset_slots(slots[dones])
+        return self.observation(), rewards, dones, infos
+
+    def close(self):
+        return None
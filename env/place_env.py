@@ -9,10 +9,11 @@ import sys
 sys.path.append("..")
 from place_db import PlaceDB
 from build_graph import build_graph_from_placedb
+from metrics import metrics
 
 class PlaceEnv(gym.Env):
 
-    def __init__(self, placedb, grid = 32):
+    def __init__(self, placedb, grid = 32, with_graph = True, dense_reward = False, graph = None):
         
         # need to get GCN vector and CNN 
         assert grid * grid >= 1.5 * placedb.node_cnt 
@@ -21,19 +22,58 @@ class PlaceEnv(gym.Env):
         self.max_width = placedb.max_width
         self.placedb = placedb
         self.num_macro = placedb.node_cnt
-        self.node_name_list = list(self.placedb.node_info.keys())
+        self.node_name_list = self.placedb.node_names
         self.action_space = spaces.Discrete(self.grid * self.grid)
         self.state = None
-        self.graph = build_graph_from_placedb(self.placedb)
+        # rollout workers that do not run the policy can skip the graph, a
+        # prebuilt one (design_cache.load_graph) can be passed in
+        if graph is None and with_graph:
+            graph = build_graph_from_placedb(self.placedb)
+        self.graph = graph
+        # dense_reward : -(hpwl increase) on every placement plus the
+        # grid * 2 * num_net constant at the end, same episode return as
+        # the terminal-only reward
+        self.dense_reward = dense_reward
+
+        # node id -> indices of the nets it belongs to, used to update the
+        # per-net bounding boxes in O(degree) per placed macro
+        self.num_net = self.placedb.net_cnt
+        node_nets, node_offsets = self.placedb.node_net_csr()
+        self.node_nets = [node_nets[node_offsets[i]:node_offsets[i + 1]] for i in range(self.num_macro)]
     
     def reset(self):
         num_macro_placed = 0
         num_macro = self.num_macro
-        canvas = np.zeros((self.grid, self.grid))
+        canvas = np.zeros((self.grid, self.grid), dtype = np.uint8)
         node_pos = {}
         self.state = (canvas, num_macro_placed, num_macro, node_pos)
+
+        # bounding boxes of the placed pins of every net and the hpwl of the
+        # partial placement (nets with no placed pin count 0)
+        self.net_min_x = np.full(self.num_net, self.grid, dtype = np.int64)
+        self.net_min_y = np.full(self.num_net, self.grid, dtype = np.int64)
+        self.net_max_x = np.zeros(self.num_net, dtype = np.int64)
+        self.net_max_y = np.zeros(self.num_net, dtype = np.int64)
+        self.net_placed = np.zeros(self.num_net, dtype = np.int64)
+        self.hpwl = 0
         return self.state
 
+    def net_hpwl(self, nets):
+        return (self.net_max_x[nets] - self.net_min_x[nets] + 1) + (self.net_max_y[nets] - self.net_min_y[nets] + 1)
+
+    # update the nets of a newly placed macro, returns the hpwl increase
+    def place_node(self, node_id, x, y):
+        nets = self.node_nets[node_id]
+        old_hpwl = (self.net_hpwl(nets) * (self.net_placed[nets] > 0)).sum()
+        self.net_min_x[nets] = np.minimum(self.net_min_x[nets], x)
+        self.net_min_y[nets] = np.minimum(self.net_min_y[nets], y)
+        self.net_max_x[nets] = np.maximum(self.net_max_x[nets], x)
+        self.net_max_y[nets] = np.maximum(self.net_max_y[nets], y)
+        self.net_placed[nets] += 1
+        delta = int(self.net_hpwl(nets).sum() - old_hpwl)
+        self.hpwl += delta
+        return delta
+
     # hpwl without pin offset
     def comp_simple_hpwl(self, node_pos):
         simple_hpwl = 0
@@ -72,18 +112,23 @@ class PlaceEnv(gym.Env):
         else:
             canvas[x][y] = 1
             node_pos[self.node_name_list[num_macro_placed]] = (x, y)
+            hpwl_delta = self.place_node(num_macro_placed, x, y)
             num_macro_placed += 1
             
             if num_macro_placed == num_macro:
-                reward = self.grid * 2 * len(self.placedb.net_info)  - self.comp_simple_hpwl(node_pos)
-                print("reward = {}".format(reward))
+                # self.hpwl == self.comp_simple_hpwl(node_pos) here
+                if self.dense_reward:
+                    reward = self.grid * 2 * self.num_net - hpwl_delta
+                else:
+                    reward = self.grid * 2 * self.num_net - self.hpwl
+                metrics.emit('placement', reward = reward, hpwl = self.hpwl, macros = num_macro_placed)
                 done = True
             else:
-                reward = 0
+                reward = -hpwl_delta if self.dense_reward else 0
                 done = False
         
         self.state = (canvas, num_macro_placed, num_macro, node_pos)
-        return self.state, reward, done, {}
+        return self.state, reward, done, {"hpwl": self.hpwl, "macros": num_macro_placed}
 
     def render(self, mode='human'):
         return None
@@ -0,0 +1,144 @@
+import time
+import multiprocessing as mp
+from multiprocessing import shared_memory
+
+import numpy as np
+import torch
+
+from env.place_env import PlaceEnv
+from metrics import metrics
+
+
+def _worker(remote, parent_remote, placedb, grid, shm_name, num_envs, index, dense_reward):
+    parent_remote.close()
+    shm = shared_memory.SharedMemory(name = shm_name)
+    canvases = np.ndarray((num_envs, grid, grid), dtype = np.uint8, buffer = shm.buf)
+    # PlaceEnv (place_env-v0) without the gym.make() wrappers, workers never
+    # need the netlist graph
+    place_env = PlaceEnv(placedb, grid, with_graph = False, dense_reward = dense_reward)
+    try:
+        while True:
+            wait_start = time.perf_counter()
+            cmd, data = remote.recv()
+            step_start = time.perf_counter()
+            idle_time = step_start - wait_start
+            if cmd == 'step':
+                state, reward, done, info = place_env.step(data)
+                if done:
+                    state = place_env.reset()
+                # observation goes straight into this worker's slot of the
+                # shared canvas block, only scalars travel through the pipe
+                canvases[index] = state[0]
+                remote.send((state[1], reward, done, info, time.perf_counter() - step_start, idle_time))
+            elif cmd == 'reset':
+                state = place_env.reset()
+                canvases[index] = state[0]
+                remote.send(state[1])
+            elif cmd == 'close':
+                break
+    finally:
+        place_env.close()
+        del canvases
+        shm.close()
+        remote.close()
+
+
+class SubprocPlaceVecEnv():
+    # num_envs place_env-v0 instances, each in its own process. Workers write
+    # canvases into one shared (num_envs, grid, grid) uint8 block, so a step
+    # only pickles the action and (node id, reward, done, info) scalars.
+    # Episodes are reset automatically when they end, like BatchPlaceEnv,
+    # and step() returns the same (observation, rewards, dones, infos).
+
+    def __init__(self, placedb, num_envs, grid = 32, start_method = None, dense_reward = False):
+        self.num_envs = num_envs
+        self.batch_size = num_envs
+        self.num_macro = placedb.node_cnt
+        self.grid = grid
+        self.waiting = False
+        self.closed = False
+
+        self.shm = shared_memory.SharedMemory(create = True, size = num_envs * grid * grid)
+        self.canvas = np.ndarray((num_envs, grid, grid), dtype = np.uint8, buffer = self.shm.buf)
+        self.canvas.fill(0)
+        self.node_ids = np.zeros(num_envs, dtype = np.int64)
+
+        # per worker accounting, see worker_timings()
+        self.num_steps = np.zeros(num_envs, dtype = np.int64)
+        self.step_time = np.zeros(num_envs)
+        self.idle_time = np.zeros(num_envs)
+
+        ctx = mp.get_context(start_method)
+        self.remotes, work_remotes = zip(*[ctx.Pipe() for _ in range(num_envs)])
+        self.processes = []
+        for index, (work_remote, remote) in enumerate(zip(work_remotes, self.remotes)):
+            args = (work_remote, remote, placedb, grid, self.shm.name, num_envs, index, dense_reward)
+            process = ctx.Process(target = _worker, args = args, daemon = True)
+            process.start()
+            self.processes.append(process)
+            work_remote.close()
+
+    def observation(self):
+        # (node ids to place, flattened canvases); the canvases are a view of
+        # the shared block and are overwritten by the next step
+        return torch.from_numpy(self.node_ids), torch.from_numpy(self.canvas.reshape(self.num_envs, -1))
+
+    def reset(self):
+        for remote in self.remotes:
+            remote.send(('reset', None))
+        for index, remote in enumerate(self.remotes):
+            self.node_ids[index] = remote.recv()
+        return self.observation()
+
+    def step_async(self, actions):
+        assert not self.waiting
+        for remote, action in zip(self.remotes, actions):
+            remote.send(('step', int(action)))
+        self.waiting = True
+
+    def step_wait(self):
+        rewards = np.zeros(self.num_envs)
+        dones = np.zeros(self.num_envs, dtype = bool)
+        hpwl = np.zeros(self.num_envs)
+        for index, remote in enumerate(self.remotes):
+            node_id, reward, done, info, step_time, idle_time = remote.recv()
+            self.node_ids[index] = node_id
+            rewards[index] = reward
+            dones[index] = done
+            hpwl[index] = info["hpwl"]
+            if done and info["macros"] == self.num_macro:
+                # PlaceEnv's event, metrics are closed in the workers
+                metrics.emit('placement', reward = reward, hpwl = info["hpwl"], macros = info["macros"])
+            self.num_steps[index] += 1
+            self.step_time[index] += step_time
+            self.idle_time[index] += idle_time
+        self.waiting = False
+        # hpwl of each episode after this step, like BatchPlaceEnv's infos
+        return self.observation(), rewards, dones, {"hpwl": hpwl}
+
+    def step(self, actions):
+        self.step_async(actions)
+        return self.step_wait()
+
+    def worker_timings(self):
+        # time each worker spent in env.step() and waiting for commands
+        return [{"steps": int(self.num_steps[i]),
+                 "step_time": float(self.step_time[i]),
+                 "idle_time": float(self.idle_time[i]),
+                 "mean_step_us": float(self.step_time[i] / max(self.num_steps[i], 1) * 1e6)}
+                for i in range(self.num_envs)]
+
+    def close(self):
+        if self.closed:
+            return
+        if self.waiting:
+            for remote in self.remotes:
+                remote.recv()
+        for remote in self.remotes:
+            remote.send(('close', None))
+        for process in self.processes:
+            process.join()
+        del self.canvas
+        self.shm.close()
+        self.shm.unlink()
+        self.closed = True
@@ -1,7 +1,16 @@
-import dgl
+import warnings
+
 import numpy as np
 import torch
-from dgl.nn import GraphConv
+try:
+    import dgl
+except (ImportError, OSError):
+    # not installed, or an install with missing native libraries (e.g.
+    # graphbolt); only the 'spmm' backend is available, see SparseGraph
+    dgl = None
+
+# backend used when none is given
+DEFAULT_BACKEND = 'dgl' if dgl is not None else 'spmm'
 
 # def make_gcn_model(in_feats):
 #     gcn = torch.nn.Sequential(
@@ -14,8 +23,65 @@ from dgl.nn import GraphConv
 #              activation = torch.nn.ReLU, allow_zero_in_degree=True)
 #     return gcn
 
-gcn_msg = dgl.function.copy_u(u='h', out='m')
-gcn_reduce = dgl.function.sum(msg='m', out='h')
+if dgl is not None:
+    gcn_msg = dgl.function.copy_u(u='h', out='m')
+    gcn_reduce = dgl.function.sum(msg='m', out='h')
+    # graphs with merged duplicate edges carry the multiplicity in edata['w']
+    gcn_weighted_msg = dgl.function.u_mul_e('h', 'w', 'm')
+
+
+def gcn_message(g):
+    return gcn_weighted_msg if 'w' in g.edata else gcn_msg
+
+
+class SparseGraph():
+    # DGL-free graph for the 'spmm' backend: the (weighted) adjacency as a
+    # torch.sparse_csr (N, N) matrix with adj[dst, src] = edge weight, so the
+    # copy_u / u_mul_e + sum message passing of a layer is one adj @ h SpMM.
+    # Duplicate edges are summed, like sum aggregation does.
+    def __init__(self, adj):
+        self.adj = adj
+
+    @classmethod
+    def from_edges(cls, src, dst, num_nodes, weight = None):
+        # directed edges src -> dst as stored in a DGL graph (reverse edges
+        # and self loops already included)
+        src = np.asarray(src, dtype = np.int64)
+        dst = np.asarray(dst, dtype = np.int64)
+        weight = np.ones(len(src), dtype = np.float32) if weight is None else np.asarray(weight, dtype = np.float32).reshape(-1)
+        keys, inverse = np.unique(dst * num_nodes + src, return_inverse = True)
+        values = np.bincount(inverse.reshape(-1), weights = weight, minlength = len(keys)).astype(np.float32)
+        crow = np.zeros(num_nodes + 1, dtype = np.int64)
+        np.cumsum(np.bincount(keys // num_nodes, minlength = num_nodes), out = crow[1:])
+        with warnings.catch_warnings():
+            # sparse CSR "beta state" notice
+            warnings.simplefilter("ignore", UserWarning)
+            adj = torch.sparse_csr_tensor(torch.from_numpy(crow), torch.from_numpy(keys % num_nodes),
+                                          torch.from_numpy(values), size = (num_nodes, num_nodes))
+        return cls(adj)
+
+    @classmethod
+    def from_dgl(cls, g):
+        src, dst = g.edges()
+        weight = g.edata['w'].cpu().numpy() if 'w' in g.edata else None
+        return cls.from_edges(src.cpu().numpy(), dst.cpu().numpy(), g.num_nodes(), weight).to(src.device)
+
+    def num_nodes(self):
+        return self.adj.shape[0]
+
+    def num_edges(self):
+        return self.adj.values().shape[0]
+
+    def to(self, device):
+        return SparseGraph(self.adj.to(device))
+
+    def aggregate(self, h):
+        # sparse CSR matmul has no reduced precision CPU kernel, it runs in
+        # float32 (or float64) outside of any autocast region
+        dtype = torch.promote_types(h.dtype, torch.float32)
+        with torch.autocast(h.device.type, enabled = False):
+            adj = self.adj if self.adj.dtype == dtype else self.adj.to(dtype)
+            return torch.sparse.mm(adj, h.to(dtype))
 
 class GCNLayer(torch.nn.Module):
     def __init__(self, in_feats, out_feats):
@@ -23,26 +89,80 @@ class GCNLayer(torch.nn.Module):
         self.linear = torch.nn.Linear(in_feats, out_feats)
 
     def forward(self, g, feature):
+        if isinstance(g, SparseGraph):
+            return self.linear(g.aggregate(feature))
         # Creating a local scope so that all the stored ndata and edata
         # (such as the `'h'` ndata below) are automatically popped out
         # when the scope exits.
         with g.local_scope():
             g.ndata['h'] = feature
-            g.update_all(gcn_msg, gcn_reduce)
+            g.update_all(gcn_message(g), gcn_reduce)
             h = g.ndata['h']
             return self.linear(h)
 
 
+class GCNEmbeddingLayer(torch.nn.Module):
+    # GCNLayer applied to one-hot node features: linear(A @ I) == A @ W^T + b,
+    # so the weight is stored as an (num_nodes, out_feats) embedding table and
+    # indexed by node id. Memory and FLOPs are O(N * out_feats) instead of
+    # O(N^2) for the identity matrix input.
+    def __init__(self, num_nodes, out_feats):
+        super(GCNEmbeddingLayer, self).__init__()
+        self.embedding = torch.nn.Embedding(num_nodes, out_feats)
+        self.bias = torch.nn.Parameter(torch.empty(out_feats))
+        # same initial distribution as the nn.Linear(num_nodes, out_feats) it replaces
+        bound = 1.0 / num_nodes ** 0.5
+        torch.nn.init.uniform_(self.embedding.weight, -bound, bound)
+        torch.nn.init.uniform_(self.bias, -bound, bound)
+
+    def forward(self, g, node_ids):
+        if isinstance(g, SparseGraph):
+            return g.aggregate(self.embedding(node_ids)) + self.bias
+        with g.local_scope():
+            g.ndata['h'] = self.embedding(node_ids)
+            g.update_all(gcn_message(g), gcn_reduce)
+            h = g.ndata['h']
+            return h + self.bias
+
+
 class PlaceGCN(torch.nn.Module):
-    def __init__(self, in_feats):
+    # input_mode = 'one_hot' : features are a dense (N, in_feats) matrix,
+    #                          usually torch.eye(N)
+    # input_mode = 'embedding' : features are int64 node ids and the first
+    #                          layer is an embedding lookup with in_feats rows
+    # backend = 'dgl' : DGL message passing on a DGL graph
+    # backend = 'spmm' : one torch.sparse_csr SpMM per layer on a SparseGraph,
+    #                    does not need DGL; prepare_graph() converts
+    # the default is 'dgl' when DGL can be imported, else 'spmm'
+    def __init__(self, in_feats, input_mode = 'one_hot', backend = DEFAULT_BACKEND):
         super(PlaceGCN, self).__init__()
         # self.layer1 = GraphConv(in_feats = in_feats, out_feats = 64, norm='both', weight=True, bias=True, 
         #     allow_zero_in_degree=False)
         # self.layer2 = GraphConv(in_feats = 64, out_feats = 32, norm='both', weight=True, bias=True, 
         #     allow_zero_in_degree=False)
-        self.layer1 = GCNLayer(in_feats, 64)
+        assert input_mode in ('one_hot', 'embedding')
+        assert backend in ('dgl', 'spmm')
+        self.input_mode = input_mode
+        self.backend = backend
+        if input_mode == 'embedding':
+            self.layer1 = GCNEmbeddingLayer(in_feats, 64)
+        else:
+            self.layer1 = GCNLayer(in_feats, 64)
         self.layer2 = GCNLayer(64, 32)
 
+    def prepare_graph(self, g):
+        # the graph in the form the backend runs on
+        if self.backend == 'spmm' and not isinstance(g, SparseGraph):
+            return SparseGraph.from_dgl(g)
+        assert self.backend == 'spmm' or not isinstance(g, SparseGraph)
+        return g
+
+    def node_features(self, num_nodes):
+        # input that gives every node its own embedding
+        if self.input_mode == 'embedding':
+            return torch.arange(num_nodes)
+        return torch.eye(num_nodes)
+
     def forward(self, g, features):
         x = torch.nn.functional.relu(self.layer1(g, features))
         x = self.layer2(g, x)
@@ -50,6 +170,7 @@ class PlaceGCN(torch.nn.Module):
 
 
 if __name__ == "__main__":
+    from dgl.nn import GraphConv
     # in_feats = 500
     g = dgl.graph(([0,1,2,3,2,5], [1,2,3,4,0,3]))
     g = dgl.add_self_loop(g)
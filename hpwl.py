@@ -0,0 +1,18 @@
+import numpy as np
+
+
+# hpwl without pin offset on the PlaceDB net CSR layout; node_pos holds grid
+# positions as (N, 2) or a batch (B, N, 2). Every net has >= 2 pins, so the
+# segmented min / max reductions never see an empty segment.
+def comp_net_hpwl(node_pos, net_pin_nodes, net_offsets):
+    pin_pos = np.take(node_pos, net_pin_nodes, axis=-2)
+    starts = net_offsets[:-1]
+    net_min = np.minimum.reduceat(pin_pos, starts, axis=-2)
+    net_max = np.maximum.reduceat(pin_pos, starts, axis=-2)
+    return (net_max - net_min + 1).sum(axis=-1)
+
+
+def comp_simple_hpwl(node_pos, placedb):
+    # (total, per net) hpwl, same value as PlaceEnv.comp_simple_hpwl()
+    net_hpwl = comp_net_hpwl(node_pos, placedb.net_pin_nodes, placedb.net_offsets)
+    return net_hpwl.sum(axis=-1), net_hpwl
@@ -86,7 +86,8 @@ def save_gif_images(env_name, has_continuous_action_space, max_ep_len, action_st
 
 
 
-	ppo_agent = PPO(state_dim, action_dim, lr_actor, lr_critic, gamma, K_epochs, eps_clip, has_continuous_action_space, action_std)
+	ppo_agent = PPO(state_dim, action_dim, lr_actor, lr_critic, gamma, K_epochs, eps_clip, has_continuous_action_space, action_std,
+	                buffer_size=max_ep_len)
 
 
 	# preTrained weights directory
@@ -0,0 +1,314 @@
+import collections
+import csv
+import json
+import os
+import struct
+import threading
+import time
+
+# Training metrics written in the background: emit(event, **fields) appends
+# (event, time, fields) to a deque (append / popleft are atomic, no lock on
+# the hot path) and returns; a writer thread wakes up every flush_interval
+# seconds, or once batch_size records are queued, and hands the batch to
+# every sink, which writes and flushes its file once per batch.
+#
+# Events emitted during training :
+#   placement  PlaceEnv / BatchPlaceEnv, every complete placement : reward, hpwl, macros
+#   update     PPO.update() : rows, loss, entropy, clip_fraction, seconds
+#   episode    train_place : episode, timestep, reward, length, hpwl, steps_per_sec
+#   log        train_place, every log_freq steps : episode, timestep, reward (the plot_graph.py CSV)
+#   progress   train_place, every print_freq steps : episode, timestep, reward
+#   actors     train_place, actor / learner training : ActorLearner.utilization()
+#
+# With no sinks open emit() returns right away. Forked processes (env
+# workers, actors) start with metrics closed; SubprocPlaceVecEnv and
+# ActorLearner emit 'placement' in the training process for the episodes
+# their workers finish (benchmarks/bench_metrics.py --check counts them).
+
+
+class Metrics:
+    def __init__(self, flush_interval = 1.0, batch_size = 1024):
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.sinks = []
+        self.enabled = False
+        self.records = collections.deque()
+        self.wake = threading.Event()
+        self.error = None
+        self.thread = None
+
+
+    def open(self, sinks, flush_interval = None):
+        assert not self.enabled, "metrics already open"
+        if flush_interval is not None:
+            self.flush_interval = flush_interval
+        self.sinks = list(sinks)
+        self.enabled = bool(self.sinks)
+        if self.enabled:
+            self.thread = threading.Thread(target = self._run, daemon = True)
+            self.thread.start()
+
+
+    def emit(self, event, **fields):
+        if not self.enabled:
+            return
+        self.records.append((event, time.time(), fields))
+        if len(self.records) >= self.batch_size:
+            self.wake.set()
+
+
+    def flush(self):
+        # block until every record emitted so far is written and flushed
+        if not self.enabled:
+            return
+        done = threading.Event()
+        self.records.append(done)
+        self.wake.set()
+        done.wait()
+        self._raise_error()
+
+
+    def offsets(self):
+        # {path : file offset} of the file sinks, after flush(); a resumed
+        # run truncates its files back to these (see FileSink)
+        self.flush()
+        return {sink.path : sink.tell() for sink in self.sinks if isinstance(sink, FileSink)}
+
+
+    def close(self):
+        if not self.enabled:
+            return
+        self.flush()
+        self.enabled = False
+        self.records.append(None)
+        self.wake.set()
+        self.thread.join()
+        self.thread = None
+        for sink in self.sinks:
+            sink.close()
+        self.sinks = []
+        self._raise_error()
+
+
+    def _reset_after_fork(self):
+        # a forked child inherits enabled and the queued records but not the
+        # writer thread, nothing it emitted would ever be written. The sink
+        # files stay with the parent, the child must not flush them.
+        self.enabled = False
+        self.sinks = []
+        self.records = collections.deque()
+        self.wake = threading.Event()
+        self.error = None
+        self.thread = None
+
+
+    def _raise_error(self):
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise RuntimeError("metrics writing failed") from error
+
+
+    def _write(self, batch):
+        if not batch:
+            return
+        try:
+            for sink in self.sinks:
+                sink.write(batch)
+                sink.flush()
+        except Exception as e:
+            self.error = e
+
+
+    def _run(self):
+        while True:
+            self.wake.wait(self.flush_interval)
+            self.wake.clear()
+            batch = []
+            while self.records:
+                record = self.records.popleft()
+                if record is None:
+                    self._write(batch)
+                    return
+                if isinstance(record, threading.Event):
+                    self._write(batch)
+                    batch = []
+                    record.set()
+                    continue
+                batch.append(record)
+            self._write(batch)
+
+
+class Sink:
+    # events : names written by this sink, None for all
+    def __init__(self, events = None):
+        self.events = None if events is None else set(events)
+
+
+    def select(self, batch):
+        if self.events is None:
+            return batch
+        return [record for record in batch if record[0] in self.events]
+
+
+    def write(self, batch):
+        raise NotImplementedError
+
+
+    def flush(self):
+        pass
+
+
+    def close(self):
+        pass
+
+
+class ConsoleSink(Sink):
+    # formats : event -> format string of its fields, e.g.
+    # {'placement' : "reward = {reward}"}
+    def __init__(self, formats):
+        super().__init__(formats.keys())
+        self.formats = formats
+
+
+    def write(self, batch):
+        for event, _, fields in self.select(batch):
+            print(self.formats[event].format(**fields))
+
+
+class FileSink(Sink):
+    # offset None : new file with header(), else an existing file cut back
+    # to offset (a resumed run) and appended to
+    binary = False
+
+    def __init__(self, path, events = None, offset = None):
+        super().__init__(events)
+        self.path = path
+        mode = "w" if offset is None else "r+"
+        self.f = open(path, mode + "b") if self.binary else open(path, mode, newline = "")
+        if offset is None:
+            self.header()
+        else:
+            self.f.seek(offset)
+            self.f.truncate()
+
+
+    def header(self):
+        pass
+
+
+    def tell(self):
+        return self.f.tell()
+
+
+    def flush(self):
+        self.f.flush()
+
+
+    def close(self):
+        self.f.close()
+
+
+class CsvSink(FileSink):
+    # one row per event, the fields as columns; the default is the
+    # episode,timestep,reward log read by plot_graph.py
+    def __init__(self, path, fields = ('episode', 'timestep', 'reward'), events = ('log',), offset = None):
+        self.fields = list(fields)
+        super().__init__(path, events, offset)
+        self.writer = csv.writer(self.f, lineterminator = "\n")
+
+
+    def header(self):
+        self.f.write(",".join(self.fields) + "\n")
+
+
+    def write(self, batch):
+        self.writer.writerows([[fields.get(name, "") for name in self.fields] for _, _, fields in self.select(batch)])
+
+
+class JsonLinesSink(FileSink):
+    # {"event" : ..., "time" : ..., **fields} per line
+    def write(self, batch):
+        # default : numpy scalars
+        lines = [json.dumps({"event" : event, "time" : t, **fields}, default = float) + "\n"
+                 for event, t, fields in self.select(batch)]
+        self.f.write("".join(lines))
+
+
+# binary records : a schema record (kind 0, id, event name, field names) is
+# written before the first record of every (event, field names) pair, then
+# data records (kind 1, id, time, values) of float64s. A resumed file may
+# redefine an id, a schema record holds until the next one for its id.
+_SCHEMA, _DATA = 0, 1
+_RECORD = struct.Struct("<BH")
+_COUNT = struct.Struct("<H")
+
+
+def _pack_str(s):
+    data = s.encode("utf-8")
+    return _COUNT.pack(len(data)) + data
+
+
+class BinarySink(FileSink):
+    binary = True
+    magic = b"PPOMETR1"
+
+    def __init__(self, path, events = None, offset = None):
+        self.schemas = {}
+        super().__init__(path, events, offset)
+
+
+    def header(self):
+        self.f.write(self.magic)
+
+
+    def write(self, batch):
+        chunks = []
+        for event, t, fields in self.select(batch):
+            key = (event, tuple(fields))
+            schema_id = self.schemas.get(key)
+            if schema_id is None:
+                schema_id = self.schemas[key] = len(self.schemas)
+                chunks.append(_RECORD.pack(_SCHEMA, schema_id) + _pack_str(event) + _COUNT.pack(len(fields))
+                              + b"".join(_pack_str(name) for name in fields))
+            chunks.append(_RECORD.pack(_DATA, schema_id)
+                          + struct.pack("<{}d".format(len(fields) + 1), t, *[float(v) for v in fields.values()]))
+        self.f.write(b"".join(chunks))
+
+
+def read_binary(path):
+    # -> list of (event, time, fields) of a BinarySink file
+    with open(path, "rb") as f:
+        data = f.read()
+    assert data[:len(BinarySink.magic)] == BinarySink.magic, "not a metrics file : " + path
+    offset = len(BinarySink.magic)
+
+    def read_str(offset):
+        (n,) = _COUNT.unpack_from(data, offset)
+        offset += _COUNT.size
+        return data[offset:offset + n].decode("utf-8"), offset + n
+
+    schemas = {}
+    records = []
+    while offset < len(data):
+        kind, schema_id = _RECORD.unpack_from(data, offset)
+        offset += _RECORD.size
+        if kind == _SCHEMA:
+            event, offset = read_str(offset)
+            (num_fields,) = _COUNT.unpack_from(data, offset)
+            offset += _COUNT.size
+            names = []
+            for _ in range(num_fields):
+                name, offset = read_str(offset)
+                names.append(name)
+            schemas[schema_id] = (event, names)
+        else:
+            event, names = schemas[schema_id]
+            values = struct.unpack_from("<{}d".format(len(names) + 1), data, offset)
+            offset += 8 * (len(names) + 1)
+            records.append((event, values[0], dict(zip(names, values[1:]))))
+    return records
+
+
+metrics = Metrics()
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child = metrics._reset_after_fork)
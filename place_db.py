@@ -1,83 +1,274 @@
 import numpy as np
 import os
-# Macro dict (macro id -> name, x, y)
+import multiprocessing as mp
+from array import array
+# Macros (terminal nodes) are numbered 0..node_cnt-1 in .nodes order. Nets
+# are kept in a CSR layout over those ids: pins of net i are
+# net_pin_nodes[net_offsets[i]:net_offsets[i+1]]. The parsers stream the
+# files line by line and append to compact arrays, nothing is ever held as
+# one string per line or one dict per pin.
+
+
+def read_aux_file(benchmark):
+    # {".nodes": path, ".nets": path, ...} from <benchmark>/<name>.aux, falls
+    # back to <name>.<ext> when there is no .aux file
+    name = os.path.basename(os.path.normpath(benchmark))
+    files = {ext: os.path.join(benchmark, name + ext) for ext in (".nodes", ".nets", ".pl", ".scl", ".wts")}
+    aux_path = os.path.join(benchmark, name + ".aux")
+    if os.path.exists(aux_path):
+        with open(aux_path, "r") as fopen:
+            for line in fopen:
+                if ":" not in line:
+                    continue
+                for file_name in line.split(":", 1)[1].split():
+                    files[os.path.splitext(file_name)[1]] = os.path.join(benchmark, file_name)
+    return files
+
+
+def design_files(benchmark):
+    # Bookshelf files PlaceDB reads, in (nodes, nets, pl) order
+    files = read_aux_file(benchmark)
+    return [files[".nodes"], files[".nets"], files[".pl"]]
+
 
 def read_node_file(fopen):
-    node_info = {}
-    node_cnt = 0
-    for line in fopen.readlines():
+    # terminal nodes -> (names, size x, size y)
+    node_names = []
+    size_x = array("q")
+    size_y = array("q")
+    for line in fopen:
         if not line.startswith("\t"):
             continue
-        line = line.strip().split()
+        line = line.split()
         if line[-1] != "terminal":
             continue
-        node_name = line[0]
-        x = int(line[1])
-        y = int(line[2])
-        node_info[node_name] = {"id": node_cnt, "x": x, "y": y}
-        node_cnt += 1
-    return node_info
+        node_names.append(line[0])
+        size_x.append(int(line[1]))
+        size_y.append(int(line[2]))
+    return node_names, np.frombuffer(size_x, dtype=np.int64), np.frombuffer(size_y, dtype=np.int64)
 
 
-def read_net_file(fopen, node_info):
-    net_info = {}
+def _read_nets(lines, node_ids, end = None):
+    # nets with >= 2 macro pins from an iterator of (offset, line); stops at
+    # the first NetDegree line at or after byte offset end
+    net_names = []
+    pin_nodes = array("q")
+    x_offsets = array("f")
+    y_offsets = array("f")
+    offsets = array("q", [0])
     net_name = None
-    for line in fopen.readlines():
-        if not line.startswith("\t") and not line.startswith("NetDegree"):
-            continue
-        line = line.strip().split()
-        if line[0] == "NetDegree":
-            net_name = line[-1]
+    net_pins = {}   # macro pins of the current net, node id -> index in pin arrays
+
+    def close_net():
+        if len(net_pins) <= 1:
+            del pin_nodes[offsets[-1]:], x_offsets[offsets[-1]:], y_offsets[offsets[-1]:]
         else:
-            node_name = line[0]
-            if node_name in node_info:
-                if not net_name in net_info:
-                    net_info[net_name] = {}
-                x_offset = float(line[-2])
-                y_offset = float(line[-1])
-                net_info[net_name][node_name] = {}
-                net_info[net_name][node_name] = {"x_offset": x_offset, "y_offset": y_offset}
-    for net_name in list(net_info.keys()):
-        if len(net_info[net_name]) <= 1:
-            net_info.pop(net_name)
-    return net_info
-
-
-def read_pl_file(fopen, node_info):
+            net_names.append(net_name)
+            offsets.append(len(pin_nodes))
+
+    for offset, line in lines:
+        if line.startswith("NetDegree"):
+            if end is not None and offset >= end:
+                break
+            if net_name is not None:
+                close_net()
+            net_name = line.split()[-1]
+            net_pins = {}
+        elif net_name is not None and line[:1] in ("\t", " "):
+            line = line.split()
+            node_id = node_ids.get(line[0])
+            if node_id is None:
+                continue
+            if node_id in net_pins:
+                # repeated pin of the same macro, last offsets win
+                idx = net_pins[node_id]
+            else:
+                idx = net_pins[node_id] = len(pin_nodes)
+                pin_nodes.append(node_id)
+                x_offsets.append(0.0)
+                y_offsets.append(0.0)
+            x_offsets[idx] = float(line[-2])
+            y_offsets[idx] = float(line[-1])
+    if net_name is not None:
+        close_net()
+    return (net_names, np.frombuffer(pin_nodes, dtype=np.int64), np.frombuffer(x_offsets, dtype=np.float32),
+            np.frombuffer(y_offsets, dtype=np.float32), np.frombuffer(offsets, dtype=np.int64))
+
+
+def _line_offsets(fopen, start):
+    # (byte offset, decoded line) of every line of a binary file from start
+    offset = start
+    for line in fopen:
+        yield offset, line.decode()
+        offset += len(line)
+
+
+def _read_net_chunk(args):
+    # nets whose NetDegree line starts in [start, end)
+    path, start, end, node_ids = args
+    with open(path, "rb") as fopen:
+        if start > 0:
+            # skip to the first line beginning at or after start
+            fopen.seek(start - 1)
+            start += len(fopen.readline()) - 1
+        return _read_nets(_line_offsets(fopen, start), node_ids, end)
+
+
+def read_net_file(path, node_ids, num_workers = 1):
+    # num_workers > 1 splits the file into byte ranges parsed in parallel
+    # processes, the results are concatenated in file order
+    if num_workers <= 1:
+        with open(path, "r") as fopen:
+            return _read_nets(((0, line) for line in fopen), node_ids)
+
+    size = os.path.getsize(path)
+    bounds = [size * i // num_workers for i in range(num_workers + 1)]
+    tasks = [(path, bounds[i], bounds[i + 1], node_ids) for i in range(num_workers)]
+    with mp.get_context("fork").Pool(num_workers) as pool:
+        chunks = pool.map(_read_net_chunk, tasks)
+
+    net_names = []
+    offsets = [np.zeros(1, dtype=np.int64)]
+    num_pins = 0
+    for chunk_names, chunk_pins, _, _, chunk_offsets in chunks:
+        net_names.extend(chunk_names)
+        offsets.append(chunk_offsets[1:] + num_pins)
+        num_pins += len(chunk_pins)
+    return (net_names, np.concatenate([chunk[1] for chunk in chunks]), np.concatenate([chunk[2] for chunk in chunks]),
+            np.concatenate([chunk[3] for chunk in chunks]), np.concatenate(offsets))
+
+
+def read_pl_file(fopen, node_ids, size_x, size_y):
     max_height = 0
     max_width = 0
-    for line in fopen.readlines():
-        if not line.startswith('o'):
+    for line in fopen:
+        line = line.split()
+        if not line:
             continue
-        line = line.strip().split()
-        node_name = line[0]
-        if not node_name in node_info:
+        node_id = node_ids.get(line[0])
+        if node_id is None:
             continue
-        place_x = int(line[1])
-        place_y = int(line[2])
-        max_height = max(max_height, node_info[node_name]["x"] + place_x)
-        max_width = max(max_width, node_info[node_name]["y"] + place_y)
+        place_x = int(float(line[1]))
+        place_y = int(float(line[2]))
+        max_height = max(max_height, int(size_x[node_id]) + place_x)
+        max_width = max(max_width, int(size_y[node_id]) + place_y)
     return max_height, max_width
 
 
 class PlaceDB():
 
-    def __init__(self, benchmark = "adaptec1"):
+    def __init__(self, benchmark = "adaptec1", net_workers = 1):
         assert os.path.exists(benchmark)
-        node_file = open(os.path.join(benchmark, benchmark+".nodes"), "r")
-        self.node_info = read_node_file(node_file)
-        self.node_cnt = len(self.node_info)
-        node_file.close()
-        net_file = open(os.path.join(benchmark, benchmark+".nets"), "r")
-        self.net_info = read_net_file(net_file, self.node_info)
-        net_file.close()
-        pl_file = open(os.path.join(benchmark, benchmark+".pl"), "r")
-        self.max_height, self.max_width = read_pl_file(pl_file, self.node_info)
+        node_path, net_path, pl_path = design_files(benchmark)
+        with open(node_path, "r") as node_file:
+            self.node_names, self.node_size_x, self.node_size_y = read_node_file(node_file)
+        self.node_cnt = len(self.node_names)
+        node_ids = {name: i for i, name in enumerate(self.node_names)}
+        (self.net_names, self.net_pin_nodes, self.net_pin_x_offset, self.net_pin_y_offset,
+            self.net_offsets) = read_net_file(net_path, node_ids, net_workers)
+        self.net_cnt = len(self.net_names)
+        with open(pl_path, "r") as pl_file:
+            self.max_height, self.max_width = read_pl_file(pl_file, node_ids, self.node_size_x, self.node_size_y)
+        self._node_info = None
+        self._net_info = None
+
+    @classmethod
+    def from_dicts(cls, node_info, net_info, max_height, max_width):
+        # PlaceDB from the node_info / net_info dict layout, e.g. for designs
+        # generated in memory
+        placedb = cls.__new__(cls)
+        placedb.node_names = list(node_info.keys())
+        placedb.node_size_x = np.array([node_info[name]["x"] for name in placedb.node_names], dtype=np.int64)
+        placedb.node_size_y = np.array([node_info[name]["y"] for name in placedb.node_names], dtype=np.int64)
+        placedb.node_cnt = len(placedb.node_names)
+        placedb.net_names = list(net_info.keys())
+        placedb.net_cnt = len(placedb.net_names)
+        pins = [(node_info[node_name]["id"], pin["x_offset"], pin["y_offset"])
+                for net_name in placedb.net_names for node_name, pin in net_info[net_name].items()]
+        pins = np.array(pins, dtype=np.float64).reshape(-1, 3)
+        placedb.net_pin_nodes = pins[:, 0].astype(np.int64)
+        placedb.net_pin_x_offset = pins[:, 1].astype(np.float32)
+        placedb.net_pin_y_offset = pins[:, 2].astype(np.float32)
+        placedb.net_offsets = np.zeros(placedb.net_cnt + 1, dtype=np.int64)
+        np.cumsum([len(net_info[net_name]) for net_name in placedb.net_names], out=placedb.net_offsets[1:])
+        placedb.max_height = max_height
+        placedb.max_width = max_width
+        placedb._node_info = node_info
+        placedb._net_info = net_info
+        return placedb
+
+    # dict views of the arrays, built on first access only
+
+    @property
+    def node_info(self):
+        # node name -> {"id", "x", "y"} with x, y the node size
+        if self._node_info is None:
+            size_x = self.node_size_x.tolist()
+            size_y = self.node_size_y.tolist()
+            self._node_info = {name: {"id": i, "x": size_x[i], "y": size_y[i]} for i, name in enumerate(self.node_names)}
+        return self._node_info
+
+    @property
+    def net_info(self):
+        # net name -> {node name -> {"x_offset", "y_offset"}}
+        if self._net_info is None:
+            pin_nodes = self.net_pin_nodes.tolist()
+            x_offset = self.net_pin_x_offset.tolist()
+            y_offset = self.net_pin_y_offset.tolist()
+            offsets = self.net_offsets.tolist()
+            self._net_info = {}
+            for i, net_name in enumerate(self.net_names):
+                self._net_info[net_name] = {self.node_names[pin_nodes[j]]: {"x_offset": x_offset[j], "y_offset": y_offset[j]}
+                                            for j in range(offsets[i], offsets[i + 1])}
+        return self._net_info
+
+    def node_net_csr(self):
+        # transpose of the net CSR: nets of node i are
+        # node_nets[node_offsets[i]:node_offsets[i+1]]
+        net_degree = np.diff(self.net_offsets)
+        pin_nets = np.repeat(np.arange(len(net_degree), dtype=np.int64), net_degree)
+        order = np.argsort(self.net_pin_nodes, kind="stable")
+        node_offsets = np.zeros(self.node_cnt + 1, dtype=np.int64)
+        np.cumsum(np.bincount(self.net_pin_nodes, minlength=self.node_cnt), out=node_offsets[1:])
+        return pin_nets[order], node_offsets
+
+    def to_arrays(self):
+        # compact array form of the parsed design, see from_arrays()
+        return {
+            "node_names": np.array(self.node_names, dtype=str),
+            "node_size_x": self.node_size_x,
+            "node_size_y": self.node_size_y,
+            "net_names": np.array(self.net_names, dtype=str),
+            "net_pin_nodes": self.net_pin_nodes,
+            "net_pin_x_offset": self.net_pin_x_offset,
+            "net_pin_y_offset": self.net_pin_y_offset,
+            "net_offsets": self.net_offsets,
+            "max_size": np.array([self.max_height, self.max_width], dtype=np.int64),
+        }
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        placedb = cls.__new__(cls)
+        placedb.node_names = arrays["node_names"].tolist()
+        placedb.node_size_x = arrays["node_size_x"]
+        placedb.node_size_y = arrays["node_size_y"]
+        placedb.node_cnt = len(placedb.node_names)
+        placedb.net_names = arrays["net_names"].tolist()
+        placedb.net_cnt = len(placedb.net_names)
+        placedb.net_pin_nodes = arrays["net_pin_nodes"]
+        placedb.net_pin_x_offset = arrays["net_pin_x_offset"]
+        placedb.net_pin_y_offset = arrays["net_pin_y_offset"]
+        placedb.net_offsets = arrays["net_offsets"]
+        placedb.max_height, placedb.max_width = (int(v) for v in arrays["max_size"])
+        placedb._node_info = None
+        placedb._net_info = None
+        return placedb
 
     def debug_str(self):
-        print("node_cnt = {}".format(len(self.node_info)))
+        print("node_cnt = {}".format(self.node_cnt))
         # print("node_info", self.node_info)
-        print("net_cnt = {}".format(len(self.net_info)))
+        print("net_cnt = {}".format(self.net_cnt))
+        print("pin_cnt = {}".format(len(self.net_pin_nodes)))
         # print("net_info", self.net_info)
         print("max_height = {}".format(self.max_height))
         print("max_width = {}".format(self.max_width))
@@ -88,4 +279,4 @@ if __name__ == "__main__":
     placedb.debug_str()
 
 
-        
\ No newline at end of file
+
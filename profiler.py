@@ -0,0 +1,132 @@
+import contextlib
+import json
+import os
+import threading
+import time
+
+import torch
+
+# Wall clock split of training into named phases:
+#
+#   with profiler.phase('env step'):
+#       ...
+#
+# Nested phases are reported under their full path ('update/evaluate/gcn').
+# Disabled (the default), phase() returns a shared no-op context manager.
+# Enabled, phase totals are accumulated for summary(); between start_trace()
+# and stop_trace() every phase is also recorded as a Chrome trace event
+# (chrome://tracing, https://ui.perfetto.dev), optionally together with a
+# torch.profiler capture of the same window.
+
+_NULL_PHASE = contextlib.nullcontext()
+
+
+class _Phase:
+    __slots__ = ('profiler', 'name', 'path', 'start', 'record')
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        stack = self.profiler._stack()
+        stack.append(self.name)
+        self.path = '/'.join(stack)
+        self.record = None
+        if self.profiler.torch_profile is not None:
+            self.record = torch.profiler.record_function(self.path)
+            self.record.__enter__()
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        profiler = self.profiler
+        if profiler.sync_cuda and torch.cuda.is_available():
+            torch.cuda.synchronize()
+        end = time.perf_counter_ns()
+        if self.record is not None:
+            self.record.__exit__(*exc)
+        profiler._stack().pop()
+        total, count = profiler.totals.get(self.path, (0, 0))
+        profiler.totals[self.path] = (total + end - self.start, count + 1)
+        if profiler.events is not None:
+            profiler.events.append({
+                'name' : self.name, 'cat' : self.path, 'ph' : 'X', 'pid' : os.getpid(),
+                'tid' : threading.get_ident(), 'ts' : self.start / 1000.0, 'dur' : (end - self.start) / 1000.0,
+            })
+        return False
+
+
+class PhaseProfiler:
+    def __init__(self, enabled = False, sync_cuda = False):
+        # sync_cuda : wait for the GPU at the end of every phase, so that
+        # asynchronous kernels are charged to the phase that launched them
+        self.enabled = enabled
+        self.sync_cuda = sync_cuda
+        self.totals = {}    # phase path -> (total ns, count)
+        self.events = None  # Chrome trace events while tracing
+        self.torch_profile = None
+        self.local = threading.local()
+        self.reset()
+
+
+    def phase(self, name):
+        if not self.enabled:
+            return _NULL_PHASE
+        return _Phase(self, name)
+
+
+    def _stack(self):
+        stack = getattr(self.local, 'stack', None)
+        if stack is None:
+            stack = self.local.stack = []
+        return stack
+
+
+    def reset(self):
+        self.totals = {}
+        self.reset_time = time.perf_counter_ns()
+
+
+    def summary(self):
+        # one line per phase path: total time, share of the wall time since
+        # the last reset(), number of calls and mean time per call
+        wall = max(time.perf_counter_ns() - self.reset_time, 1)
+        lines = ["phase \t\t\t\t total (s) \t share \t calls \t mean (ms)"]
+        for path in sorted(self.totals):
+            total, count = self.totals[path]
+            depth = path.count('/')
+            lines.append("{:<32} \t {:.3f} \t {:5.1f}% \t {} \t {:.3f}".format(
+                "  " * depth + path.rsplit('/', 1)[-1], total / 1e9, 100.0 * total / wall, count, total / 1e6 / count))
+        lines.append("wall time : {:.3f} s".format(wall / 1e9))
+        return "\n".join(lines)
+
+
+    def start_trace(self, torch_profile = False):
+        self.events = []
+        if torch_profile:
+            activities = [torch.profiler.ProfilerActivity.CPU]
+            if torch.cuda.is_available():
+                activities.append(torch.profiler.ProfilerActivity.CUDA)
+            self.torch_profile = torch.profiler.profile(activities = activities)
+            self.torch_profile.__enter__()
+
+
+    def stop_trace(self, path):
+        # writes the phase trace to path and the torch.profiler capture, if
+        # any, next to it as <path without .json>.torch.json
+        with open(path, 'w') as f:
+            json.dump({'traceEvents' : self.events, 'displayTimeUnit' : 'ms'}, f)
+        self.events = None
+        paths = [path]
+        if self.torch_profile is not None:
+            self.torch_profile.__exit__(None, None, None)
+            torch_path = os.path.splitext(path)[0] + '.torch.json'
+            self.torch_profile.export_chrome_trace(torch_path)
+            self.torch_profile = None
+            paths.append(torch_path)
+        return paths
+
+
+# shared by train_place.py and PPO_place.py, enabled by train()
+profiler = PhaseProfiler()
@@ -0,0 +1,46 @@
+import torch
+
+
+def reverse_discounted_scan(values, discounts):
+    # y[t] = values[t] + discounts[t] * y[t+1] along dim 0 (y[n] = 0), for any
+    # trailing shape. Computed with a log-step (Hillis-Steele) scan, i.e.
+    # O(log n) vectorized passes instead of a Python loop over the buffer.
+    # The scan stops early once every carried discount product is zero,
+    # which happens after log2(longest episode) passes when episodes end
+    # with is_terminal.
+    y = values.flip(0).to(torch.float64)
+    a = discounts.flip(0).to(torch.float64)
+    n = y.shape[0]
+    step = 1
+    while step < n and a[step:].any():
+        y = torch.cat((y[:step], y[step:] + a[step:] * y[:-step]))
+        a = torch.cat((a[:step], a[step:] * a[:-step]))
+        step *= 2
+    return y.flip(0)
+
+
+def discounted_returns(rewards, is_terminals, gamma, last_value=None):
+    # Monte Carlo returns, G[t] = r[t] + gamma * G[t+1], reset after each
+    # terminal step. last_value bootstraps the return of an episode that is
+    # cut off by the end of the buffer.
+    rewards = torch.as_tensor(rewards, dtype=torch.float64)
+    not_done = 1.0 - torch.as_tensor(is_terminals, dtype=torch.float64)
+    if last_value is not None:
+        rewards = rewards.clone()
+        rewards[-1] += gamma * not_done[-1] * last_value
+    return reverse_discounted_scan(rewards, gamma * not_done).to(torch.float32)
+
+
+def gae(rewards, values, is_terminals, gamma, lam, last_value=0.0):
+    # Generalized Advantage Estimation (Schulman et al. 2016). values[t] is
+    # V(s_t) and last_value is V(s_n) of the state following the last stored
+    # transition (0 if it is terminal or unknown). Returns (advantages,
+    # returns) with returns = advantages + values as the critic target.
+    rewards = torch.as_tensor(rewards, dtype=torch.float64)
+    values = torch.as_tensor(values, dtype=torch.float64)
+    not_done = 1.0 - torch.as_tensor(is_terminals, dtype=torch.float64)
+    last_value = torch.as_tensor(last_value, dtype=torch.float64).reshape((1,) + values.shape[1:])
+    next_values = torch.cat((values[1:], last_value.expand((1,) + values.shape[1:])))
+    deltas = rewards + gamma * not_done * next_values - values
+    advantages = reverse_discounted_scan(deltas, gamma * lam * not_done)
+    return advantages.to(torch.float32), (advantages + values).to(torch.float32)
@@ -0,0 +1,229 @@
+import argparse
+import os
+import time
+
+import numpy as np
+
+from place_db import PlaceDB
+
+# Synthetic Bookshelf designs for scaling tests. generate_design() returns
+# the design as arrays (the PlaceDB.to_arrays() layout over all nodes, plus
+# positions and the die), write_bookshelf() writes a complete design
+# directory (.aux .nodes .nets .pl .scl .wts) that PlaceDB parses, and
+# placedb_from_design() builds the same PlaceDB in memory.
+#
+# Nodes 0..num_macros-1 are the macros (terminals), the rest standard cells.
+# Net degrees follow a power law on [2, max_degree] plus a fraction of high
+# fanout nets. Locality is Rent style: nodes sit at the leaves of a
+# hierarchy (a random order), and a net of degree d spans an aligned block
+# of B >= 2 d leaves with P(B > b) ~ b ** (rent_exponent - 1), so that low
+# exponents give local netlists and exponents close to 1 global ones.
+# Everything is drawn from one seeded RandomState, the output only depends
+# on the arguments.
+
+
+def power_law_degrees(rng, num_nets, exponent, max_degree):
+    degrees = np.arange(2, max_degree + 1)
+    prob = degrees.astype(np.float64) ** -exponent
+    return rng.choice(degrees, num_nets, p = prob / prob.sum())
+
+
+def lognormal_sizes(rng, num, median, sigma, max_size):
+    return np.clip(np.rint(median * np.exp(sigma * rng.randn(num))), 1, max_size).astype(np.int64)
+
+
+def generate_design(num_macros, num_nets, num_cells = 0, seed = 0,
+                    degree_exponent = 2.5, max_degree = 32,
+                    high_fanout_fraction = 0.001, high_fanout_degree = (100, 1000),
+                    macro_size = 16, macro_size_sigma = 0.5, max_macro_size = 128,
+                    cell_width = (1, 8), row_height = 1, utilization = 0.5,
+                    rent_exponent = 0.6):
+    assert num_macros >= 2 and 0.0 <= rent_exponent < 1.0
+    rng = np.random.RandomState(seed)
+    num_nodes = num_macros + num_cells
+
+    # node sizes, cells are one row high
+    size_x = np.empty(num_nodes, dtype = np.int64)
+    size_y = np.empty(num_nodes, dtype = np.int64)
+    size_x[:num_macros] = lognormal_sizes(rng, num_macros, macro_size, macro_size_sigma, max_macro_size)
+    size_y[:num_macros] = lognormal_sizes(rng, num_macros, macro_size, macro_size_sigma, max_macro_size)
+    size_x[num_macros:] = rng.randint(cell_width[0], cell_width[1] + 1, num_cells)
+    size_y[num_macros:] = row_height
+
+    # degrees, a fraction of the nets is high fanout
+    degrees = power_law_degrees(rng, num_nets, degree_exponent, max_degree)
+    high_fanout = rng.rand(num_nets) < high_fanout_fraction
+    degrees[high_fanout] = rng.randint(high_fanout_degree[0], high_fanout_degree[1] + 1, high_fanout.sum())
+    degrees = np.minimum(degrees, num_nodes)
+    net_offsets = np.zeros(num_nets + 1, dtype = np.int64)
+    np.cumsum(degrees, out = net_offsets[1:])
+
+    # Rent style span per net, an aligned block of the hierarchy order
+    spans = 2.0 * degrees * rng.rand(num_nets) ** (-1.0 / (1.0 - rent_exponent))
+    spans = np.minimum(np.ceil(spans), num_nodes).astype(np.int64)
+    starts = rng.randint(0, num_nodes, num_nets) // spans * spans
+    starts = np.minimum(starts, num_nodes - spans)
+
+    # stratified pins: pin k of a degree d net falls in [k B // d, (k + 1) B // d),
+    # the k-th of d disjoint parts of the block, pins of one net are distinct
+    num_pins = int(net_offsets[-1])
+    pin_nets = np.repeat(np.arange(num_nets), degrees)
+    pin_rank = np.arange(num_pins) - net_offsets[pin_nets]
+    pin_span = spans[pin_nets]
+    pin_degree = degrees[pin_nets]
+    lo = pin_rank * pin_span // pin_degree
+    hi = (pin_rank + 1) * pin_span // pin_degree
+    pin_leaf = starts[pin_nets] + lo + (rng.rand(num_pins) * (hi - lo)).astype(np.int64)
+    leaf_node = rng.permutation(num_nodes)
+    pin_nodes = leaf_node[pin_leaf]
+
+    # pin offsets from the node center, inside the node
+    pin_x_offset = ((rng.rand(num_pins) - 0.5) * size_x[pin_nodes]).astype(np.float32)
+    pin_y_offset = ((rng.rand(num_pins) - 0.5) * size_y[pin_nodes]).astype(np.float32)
+
+    # square die at the given utilization, fixed macros at random positions
+    area = float((size_x * size_y).sum())
+    die = int(max(np.ceil(np.sqrt(area / utilization)), size_x.max(), size_y.max()))
+    die = -(-die // row_height) * row_height
+    node_x = np.zeros(num_nodes, dtype = np.int64)
+    node_y = np.zeros(num_nodes, dtype = np.int64)
+    node_x[:num_macros] = rng.randint(0, die - size_x[:num_macros] + 1)
+    node_y[:num_macros] = rng.randint(0, die - size_y[:num_macros] + 1)
+
+    return {
+        "node_names" : np.array(["o{}".format(i) for i in range(num_macros)] +
+                                ["c{}".format(i) for i in range(num_cells)], dtype = str),
+        "node_size_x" : size_x,
+        "node_size_y" : size_y,
+        "num_macros" : num_macros,
+        "node_x" : node_x,
+        "node_y" : node_y,
+        "net_names" : np.array(["n{}".format(i) for i in range(num_nets)], dtype = str),
+        "net_pin_nodes" : pin_nodes,
+        "net_pin_x_offset" : pin_x_offset,
+        "net_pin_y_offset" : pin_y_offset,
+        "net_offsets" : net_offsets,
+        "die" : die,
+        "row_height" : row_height,
+    }
+
+
+def placedb_from_design(design):
+    # the PlaceDB that parsing the written design gives: macros only, nets
+    # with at least two macro pins, pin offsets rounded to the one decimal
+    # write_bookshelf() writes
+    num_macros = design["num_macros"]
+    net_offsets = design["net_offsets"]
+    pin_nets = np.repeat(np.arange(len(net_offsets) - 1), np.diff(net_offsets))
+    is_macro = design["net_pin_nodes"] < num_macros
+    macro_pins = np.bincount(pin_nets[is_macro], minlength = len(net_offsets) - 1)
+    keep_net = macro_pins >= 2
+    keep_pin = is_macro & keep_net[pin_nets]
+    offsets = np.zeros(keep_net.sum() + 1, dtype = np.int64)
+    np.cumsum(macro_pins[keep_net], out = offsets[1:])
+    size_x = design["node_size_x"][:num_macros]
+    size_y = design["node_size_y"][:num_macros]
+    round_offsets = lambda offsets: np.round(offsets[keep_pin].astype(np.float64), 1).astype(np.float32)
+    return PlaceDB.from_arrays({
+        "node_names" : design["node_names"][:num_macros],
+        "node_size_x" : size_x,
+        "node_size_y" : size_y,
+        "net_names" : design["net_names"][keep_net],
+        "net_pin_nodes" : design["net_pin_nodes"][keep_pin],
+        "net_pin_x_offset" : round_offsets(design["net_pin_x_offset"]),
+        "net_pin_y_offset" : round_offsets(design["net_pin_y_offset"]),
+        "net_offsets" : offsets,
+        # as read_pl_file() computes it
+        "max_size" : np.array([(size_x + design["node_x"][:num_macros]).max(),
+                               (size_y + design["node_y"][:num_macros]).max()], dtype = np.int64),
+    })
+
+
+def write_bookshelf(design, directory):
+    # directory/<name>.{aux,nodes,nets,pl,scl,wts}, name = directory basename
+    name = os.path.basename(os.path.normpath(directory))
+    os.makedirs(directory, exist_ok = True)
+    path = lambda ext: os.path.join(directory, name + ext)
+    node_names = design["node_names"].tolist()
+    num_macros = design["num_macros"]
+    size_x = design["node_size_x"].tolist()
+    size_y = design["node_size_y"].tolist()
+    num_nodes = len(node_names)
+    net_offsets = design["net_offsets"].tolist()
+    num_pins = net_offsets[-1]
+
+    with open(path(".aux"), "w") as f:
+        f.write("RowBasedPlacement : {0}.nodes {0}.nets {0}.wts {0}.pl {0}.scl\n".format(name))
+
+    with open(path(".nodes"), "w") as f:
+        f.write("UCLA nodes 1.0\n\nNumNodes : \t{}\nNumTerminals : \t{}\n".format(num_nodes, num_macros))
+        f.writelines(["\t{}\t{}\t{}\tterminal\n".format(node_names[i], size_x[i], size_y[i]) for i in range(num_macros)])
+        f.writelines(["\t{}\t{}\t{}\n".format(node_names[i], size_x[i], size_y[i]) for i in range(num_macros, num_nodes)])
+
+    with open(path(".nets"), "w") as f:
+        f.write("UCLA nets 1.0\n\nNumNets : {}\nNumPins : {}\n\n".format(len(net_offsets) - 1, num_pins))
+        pin_names = [node_names[i] for i in design["net_pin_nodes"].tolist()]
+        pin_lines = ["\t{} I : {:.1f} {:.1f}\n".format(*pin) for pin in zip(
+            pin_names, design["net_pin_x_offset"].tolist(), design["net_pin_y_offset"].tolist())]
+        lines = []
+        for i, net_name in enumerate(design["net_names"].tolist()):
+            start, end = net_offsets[i], net_offsets[i + 1]
+            lines.append("NetDegree : {} {}\n".format(end - start, net_name))
+            lines.extend(pin_lines[start:end])
+        f.writelines(lines)
+
+    with open(path(".pl"), "w") as f:
+        f.write("UCLA pl 1.0\n\n")
+        node_x = design["node_x"].tolist()
+        node_y = design["node_y"].tolist()
+        f.writelines(["{}\t{}\t{}\t: N /FIXED\n".format(node_names[i], node_x[i], node_y[i]) for i in range(num_macros)])
+        f.writelines(["{}\t{}\t{}\t: N\n".format(node_names[i], node_x[i], node_y[i]) for i in range(num_macros, num_nodes)])
+
+    with open(path(".scl"), "w") as f:
+        die, row_height = design["die"], design["row_height"]
+        num_rows = die // row_height
+        f.write("UCLA scl 1.0\n\nNumRows : {}\n\n".format(num_rows))
+        f.writelines(["CoreRow Horizontal\n  Coordinate    :   {}\n  Height        :   {}\n  Sitewidth     :    1\n"
+                      "  Sitespacing   :    1\n  Siteorient    :    1\n  Sitesymmetry  :    1\n"
+                      "  SubrowOrigin  :    0\tNumSites  :  {}\nEnd\n".format(r * row_height, row_height, die)
+                      for r in range(num_rows)])
+
+    with open(path(".wts"), "w") as f:
+        f.write("UCLA wts 1.0\n\n")
+        f.writelines(["{} 1\n".format(net_name) for net_name in design["net_names"].tolist()])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("directory", help = "output design directory, its basename is the design name")
+    parser.add_argument("--macros", type = int, default = 543)
+    parser.add_argument("--nets", type = int, default = 5000)
+    parser.add_argument("--cells", type = int, default = 0)
+    parser.add_argument("--seed", type = int, default = 0)
+    parser.add_argument("--degree-exponent", type = float, default = 2.5)
+    parser.add_argument("--max-degree", type = int, default = 32)
+    parser.add_argument("--high-fanout-fraction", type = float, default = 0.001)
+    parser.add_argument("--high-fanout-degree", type = int, nargs = 2, default = [100, 1000])
+    parser.add_argument("--macro-size", type = float, default = 16)
+    parser.add_argument("--macro-size-sigma", type = float, default = 0.5)
+    parser.add_argument("--rent-exponent", type = float, default = 0.6)
+    parser.add_argument("--utilization", type = float, default = 0.5)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    design = generate_design(args.macros, args.nets, args.cells, args.seed,
+                             degree_exponent = args.degree_exponent, max_degree = args.max_degree,
+                             high_fanout_fraction = args.high_fanout_fraction,
+                             high_fanout_degree = tuple(args.high_fanout_degree),
+                             macro_size = args.macro_size, macro_size_sigma = args.macro_size_sigma,
+                             rent_exponent = args.rent_exponent, utilization = args.utilization)
+    generate_time = time.perf_counter() - start
+    start = time.perf_counter()
+    write_bookshelf(design, args.directory)
+    write_time = time.perf_counter() - start
+    print("============================================================================================")
+    print("design : " + args.directory)
+    print("macros : {} \t cells : {} \t nets : {} \t pins : {} \t die : {}".format(
+        args.macros, args.cells, args.nets, len(design["net_pin_nodes"]), design["die"]))
+    print("generated in {:.2f} s, written in {:.2f} s".format(generate_time, write_time))
+    print("============================================================================================")
@@ -61,6 +61,8 @@ def test():
     lr_actor = 0.0003           # learning rate for actor
     lr_critic = 0.001           # learning rate for critic
 
+    rollout_compile = 'trace'   # compiled policy for select_action : None (eager), 'trace' or 'compile'
+
     #####################################################
 
 
@@ -77,7 +79,8 @@ def test():
 
 
     # initialize a PPO agent
-    ppo_agent = PPO(state_dim, action_dim, lr_actor, lr_critic, gamma, K_epochs, eps_clip, has_continuous_action_space, action_std)
+    ppo_agent = PPO(state_dim, action_dim, lr_actor, lr_critic, gamma, K_epochs, eps_clip, has_continuous_action_space, action_std,
+                    buffer_size=max_ep_len, rollout_compile=rollout_compile)
 
 
     # preTrained weights directory
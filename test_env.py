@@ -1,8 +1,9 @@
 import gym
 import env
 
-from place_db import PlaceDB
-placedb = PlaceDB('adaptec1')
+from design_cache import load_graph, load_placedb
+placedb = load_placedb('adaptec1')
+graph = load_graph(placedb)
 
-place_env = gym.make('place_env-v0', placedb = placedb)
+place_env = gym.make('place_env-v0', placedb = placedb, graph = graph)
 print("place_env success")
\ No newline at end of file
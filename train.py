@@ -180,7 +180,8 @@ def train():
     ################# training procedure ################
 
     # initialize a PPO agent
-    ppo_agent = PPO(state_dim, action_dim, lr_actor, lr_critic, gamma, K_epochs, eps_clip, has_continuous_action_space, action_std)
+    ppo_agent = PPO(state_dim, action_dim, lr_actor, lr_critic, gamma, K_epochs, eps_clip, has_continuous_action_space, action_std,
+                    buffer_size=update_timestep)
 
 
     # track total training time
@@ -219,8 +220,7 @@ def train():
             state, reward, done, _ = env.step(action)
 
             # saving reward and is_terminals
-            ppo_agent.buffer.rewards.append(reward)
-            ppo_agent.buffer.is_terminals.append(done)
+            ppo_agent.buffer.add_reward(reward, done)
 
             time_step +=1
             current_ep_reward += reward
@@ -1,4 +1,5 @@
 import os
+import sys
 import glob
 import time
 from datetime import datetime
@@ -12,34 +13,101 @@ import gym
 # import pybullet_envs
 
 from PPO_place import PPO
+from gcn import DEFAULT_BACKEND
+from profiler import profiler
+from ddp import init_distributed, max_replica_difference
+from metrics import metrics, BinarySink, ConsoleSink, CsvSink, JsonLinesSink
+from checkpoint import AsyncCheckpointer, latest_checkpoint, load_checkpoint, rng_state, set_rng_state
 
 device = torch.device("cuda:0" if torch.cuda.is_available() else "cpu")
 
 
+def make_state_input(state):
+    # (canvas, num_macro_placed, ...) env state -> (node_ids, canvases) policy
+    # input for one state; the uint8 canvas is passed as is (a view of the
+    # env canvas), the buffer bit packs it and the policy converts to float
+    now_node_id = torch.tensor([state[1]], dtype = torch.int32)
+    canvas = torch.from_numpy(state[0]).reshape(1, -1)
+    return (now_node_id, canvas)
+
+
+def collect_batch_rollout(batch_env, ppo_agent, num_rows, episode_returns = None, episode_lengths = None):
+    # fill num_rows rows of the agent buffer from a BatchPlaceEnv or a
+    # SubprocPlaceVecEnv with one batched policy call and one vectorized env
+    # step per row. Episodes run across calls, episode_returns / episode_lengths hold the (num_envs,)
+    # running sums of the unfinished ones and are updated in place. Returns
+    # (return, length, hpwl) of every episode finished meanwhile.
+    if episode_returns is None:
+        episode_returns = np.zeros(batch_env.batch_size)
+        episode_lengths = np.zeros(batch_env.batch_size, dtype = np.int64)
+    episodes = []
+    node_ids, canvases = batch_env.observation()
+    for _ in range(num_rows):
+        actions = ppo_agent.select_actions(node_ids, canvases)
+        with profiler.phase('env step'):
+            (node_ids, canvases), rewards, dones, infos = batch_env.step(actions)
+        with profiler.phase('reward bookkeeping'):
+            ppo_agent.buffer.add_reward(rewards, dones)
+            episode_returns += rewards
+            episode_lengths += 1
+            for i in np.flatnonzero(dones):
+                episodes.append((float(episode_returns[i]), int(episode_lengths[i]), float(infos["hpwl"][i])))
+            episode_returns[dones] = 0
+            episode_lengths[dones] = 0
+    return episodes
+
+
 ################################### Training ###################################
 
-def train():
+def train(smoke_test = False):
+
+    # smoke_test = True : a short run on a small synthetic design with its own
+    # log / checkpoint directories (python ddp.py --smoke)
+
+    # rank / world size of a data parallel run (ddp.py), (0, 1) otherwise;
+    # only rank 0 prints, logs and saves the policy weights
+    rank, world_size = init_distributed()
+    if rank > 0:
+        sys.stdout = open(os.devnull, "w")
 
     print("============================================================================================")
 
     print("====reading place db====")
-    from place_db import PlaceDB
-    placedb = PlaceDB('adaptec1')
+    from design_cache import load_graph, load_placedb
+    start = time.perf_counter()
+    if smoke_test:
+        from synthetic_design import generate_design, placedb_from_design
+        placedb = placedb_from_design(generate_design(120, 600))
+    else:
+        placedb = load_placedb('adaptec1')
+    graph_options = {
+        'net_model' : 'clique',     # 'clique', 'star' or 'hybrid' (clique up to degree_threshold pins, star above)
+        'degree_threshold' : 16,
+        'max_edges' : None,         # edge budget, the largest nets become stars until the graph fits
+    }
+    gcn_backend = DEFAULT_BACKEND   # 'dgl' when DGL can be imported, else 'spmm' (torch.sparse_csr GCN that does not need DGL)
+    design_graph = load_graph(placedb, options = graph_options, backend = gcn_backend)
+    print("design loaded in {:.2f} s".format(time.perf_counter() - start))
 
     ####### initialize environment hyperparameters ######
 
     # env_name = "RoboschoolWalker2d-v1"
     env_name = "place_env-v0"
     # place_env = gym.make('place_env-v0', placedb = placedb)
+    if smoke_test:
+        env_name = "place_env-smoke"
 
     has_continuous_action_space = False  # continuous action space; else discrete
+    dense_reward = False                 # per placement -(hpwl increase) rewards instead of a terminal-only reward
 
     max_ep_len = 1000                   # max timesteps in one episode
     max_training_timesteps = int(3e6)   # break training loop if timeteps > max_training_timesteps
 
-    print_freq = max_ep_len * 2        # print avg reward in the interval (in num timesteps)
-    log_freq = max_ep_len * 2           # log avg reward in the interval (in num timesteps)
+    print_freq = max_ep_len * 2 * world_size    # print avg reward in the interval (in num timesteps, of all ranks)
+    log_freq = max_ep_len * 2 * world_size      # log avg reward in the interval (in num timesteps, of all ranks)
     save_model_freq = int(1e5)          # save model frequency (in num timesteps)
+    keep_checkpoints = 3                # full training state checkpoints kept, written at the episode end following a save
+    resume = False                      # continue from the latest full checkpoint of this run if there is one
 
     action_std = 0.6                    # starting std for action distribution (Multivariate Normal)
     action_std_decay_rate = 0.05        # linearly decay action_std (action_std = action_std - action_std_decay_rate)
@@ -49,29 +117,67 @@ def train():
     #####################################################
 
 
-    ## Note : print/log frequencies should be > than max_ep_len
+    ## Note : print/log frequencies should be > than max_ep_len (times the number of ranks)
 
 
     ################ PPO hyperparameters ################
 
     update_timestep = max_ep_len * 4      # update policy every n timesteps
     K_epochs = 80               # update policy for K epochs in one PPO update
+    minibatch_size = None       # None : full buffer per gradient step, else shuffled minibatches of this size
 
     eps_clip = 0.2          # clip parameter for PPO
     gamma = 0.99            # discount factor
+    gae_lambda = None       # None : Monte Carlo returns, else GAE(lambda) advantages, e.g. 0.95
 
     lr_actor = 0.0003       # learning rate for actor network
     lr_critic = 0.001       # learning rate for critic network
 
     random_seed = 0         # set random seed if required (0 = no random seed)
 
+    gcn_input_mode = 'one_hot'  # 'embedding' : O(N) node embedding table instead of an (N, N) one-hot input
+    rollout_bf16 = False        # bfloat16 autocast for the rollout policy (policy_old), fast on CPUs with AVX512-BF16 / AMX
+    rollout_compile = 'trace'   # compiled rollout policy : None (eager), 'trace' (TorchScript) or 'compile' (torch.compile)
+    canvas_encoder = 'resnet20' # see encoders.CANVAS_ENCODERS, e.g. 'cnn', 'strided', 'pooled_mlp' (benchmarks/bench_encoders.py)
+    single_network = False      # sample rollouts from the trained network itself, no policy_old replica (benchmarks/bench_single_network.py)
+
+    num_envs = 1                # > 1 : collect num_envs episodes at once, one batched policy call per step
+    vec_env = 'batch'           # num_envs > 1 : 'batch' (BatchPlaceEnv, vectorized in process) or 'subproc' (SubprocPlaceVecEnv, a PlaceEnv process per episode)
+    num_actors = 0              # > 0 : actor / learner training (actor_learner.py), episodes collected by this many processes
+    max_staleness = 2           # actor / learner : drop episodes collected with weights more than this many updates old
+
+    profile = False             # per phase wall time summary (profiler.py) every log interval
+    profile_trace_updates = None    # (first, last) PPO updates (1 based) whose rollouts and updates go to a Chrome trace, e.g. (2, 3)
+    profile_torch = False       # also capture torch.profiler over the trace window
+
+    metrics_files = ('csv', 'jsonl')    # files of the background metrics writer (metrics.py) : 'csv' (log read by plot_graph.py), 'jsonl', 'bin'
+    metrics_flush_interval = 1.0        # seconds between batched metrics writes
+
     #####################################################
 
+    if smoke_test:
+        # a few updates; episodes are cut at max_ep_len < 120 macros, at a
+        # different step on every rank, and training stops inside an episode
+        dense_reward = True
+        max_ep_len = 100 - 7 * (rank % 4)
+        max_training_timesteps = 2210
+        print_freq = log_freq = 200 * world_size
+        save_model_freq = 800
+        update_timestep = 400
+        K_epochs = 2
+        minibatch_size = 200
+        rollout_compile = None
+        canvas_encoder = 'cnn'
+
 
 
     print("training environment name : " + env_name)
 
-    place_env = gym.make(env_name, placedb = placedb)
+    if smoke_test:
+        from env.place_env import PlaceEnv
+        place_env = PlaceEnv(placedb, dense_reward = dense_reward, graph = design_graph)
+    else:
+        place_env = gym.make(env_name, placedb = placedb, dense_reward = dense_reward, graph = design_graph)
 
     # state space dimension
     # state_dim = env.observation_space.shape[0]
@@ -93,13 +199,12 @@ def train():
 
     #### log files for multiple runs are NOT overwritten
 
+    # exist_ok : the ranks of a data parallel run create the same directories
     log_dir = "PPO_logs"
-    if not os.path.exists(log_dir):
-          os.makedirs(log_dir)
+    os.makedirs(log_dir, exist_ok = True)
 
     log_dir = log_dir + '/' + env_name + '/'
-    if not os.path.exists(log_dir):
-          os.makedirs(log_dir)
+    os.makedirs(log_dir, exist_ok = True)
 
 
     #### get number of log files in log directory
@@ -111,8 +216,21 @@ def train():
     #### create new log file for each run
     log_f_name = log_dir + '/PPO_' + env_name + "_log_" + str(run_num) + ".csv"
 
+    #### per episode / update metrics, kept out of log_dir (run numbers count its files)
+    metrics_dir = "PPO_metrics/" + env_name + '/'
+    metrics_paths = {'csv' : log_f_name}
+    for kind in metrics_files:
+        if kind != 'csv':
+            metrics_paths[kind] = metrics_dir + "PPO_" + env_name + "_metrics_" + str(run_num) + "." + kind
+    if rank > 0:
+        metrics_paths = {}
+
     print("current logging run number for " + env_name + " : ", run_num)
-    print("logging at : " + log_f_name)
+    print("logging at : " + ", ".join(metrics_paths.values()))
+
+    #### Chrome traces of the profiler, kept out of log_dir (run numbers count its files)
+    trace_dir = "PPO_traces/" + env_name + '/'
+    trace_path = trace_dir + "PPO_" + env_name + "_trace_" + str(run_num) + ("_rank{}".format(rank) if world_size > 1 else "") + ".json"
 
     #####################################################
 
@@ -122,17 +240,27 @@ def train():
     run_num_pretrained = 0      #### change this to prevent overwriting weights in same env_name folder
 
     directory = "PPO_preTrained"
-    if not os.path.exists(directory):
-          os.makedirs(directory)
+    os.makedirs(directory, exist_ok = True)
 
     directory = directory + '/' + env_name + '/'
-    if not os.path.exists(directory):
-          os.makedirs(directory)
+    os.makedirs(directory, exist_ok = True)
 
 
     checkpoint_path = directory + "PPO_{}_{}_{}.pth".format(env_name, random_seed, run_num_pretrained)
     print("save checkpoint path : " + checkpoint_path)
 
+    # full training state (optimizer, counters, RNG, log position), written
+    # by a background thread
+    full_checkpoint_dir = directory + "full/"
+    full_checkpoint_prefix = "PPO_{}_{}_{}".format(env_name, random_seed, run_num_pretrained)
+    if world_size > 1:
+        # buffers and RNG states differ per rank
+        full_checkpoint_prefix += "_rank{}".format(rank)
+    print("full checkpoint directory : " + full_checkpoint_dir)
+    resume_path = latest_checkpoint(full_checkpoint_dir, full_checkpoint_prefix) if resume else None
+    if resume:
+        print("resume from : ", resume_path)
+
     #####################################################
 
 
@@ -144,6 +272,7 @@ def train():
     print("max timesteps per episode : ", max_ep_len)
 
     print("model saving frequency : " + str(save_model_freq) + " timesteps")
+    print("full checkpoints kept : ", keep_checkpoints)
     print("log frequency : " + str(log_freq) + " timesteps")
     print("printing average reward over episodes in last : " + str(print_freq) + " timesteps")
 
@@ -169,8 +298,31 @@ def train():
 
     print("PPO update frequency : " + str(update_timestep) + " timesteps")
     print("PPO K epochs : ", K_epochs)
+    print("PPO minibatch size : ", minibatch_size)
+    print("data parallel ranks : ", world_size)
     print("PPO epsilon clip : ", eps_clip)
     print("discount factor (gamma) : ", gamma)
+    print("GAE lambda : ", gae_lambda)
+    print("GCN input mode : ", gcn_input_mode)
+    print("graph options : ", graph_options)
+    print("GCN backend : ", gcn_backend)
+    print("bfloat16 rollout policy : ", rollout_bf16)
+    print("compiled rollout policy : ", rollout_compile)
+    print("canvas encoder : ", canvas_encoder)
+    print("single network : ", single_network)
+    print("environments per step : ", num_envs)
+    if num_envs > 1:
+        print("vectorized environment : ", vec_env)
+    print("actor processes : ", num_actors)
+    if num_actors > 0:
+        print("max staleness (updates) : ", max_staleness)
+    print("metrics files : ", metrics_files)
+    print("metrics flush interval : " + str(metrics_flush_interval) + " s")
+    print("phase profiler : ", profile)
+    print("profiler trace updates : ", profile_trace_updates)
+    if profile_trace_updates:
+        print("profiler trace path : " + trace_path)
+        print("torch.profiler capture : ", profile_torch)
 
     print("--------------------------------------------------------------------------------------------")
 
@@ -180,9 +332,26 @@ def train():
     if random_seed:
         print("--------------------------------------------------------------------------------------------")
         print("setting random seed to ", random_seed)
-        torch.manual_seed(random_seed)
-        place_env.seed(random_seed)
-        np.random.seed(random_seed)
+        # ranks collect different rollouts
+        torch.manual_seed(random_seed + rank)
+        place_env.seed(random_seed + rank)
+        np.random.seed(random_seed + rank)
+
+    if world_size > 1:
+        # every rank collects 1 / world_size of each rollout and of each
+        # minibatch; time_step counts the steps of all ranks
+        assert num_actors == 0, "actor / learner training runs in a single process"
+        # ranks end episodes, and so take their full checkpoints, at different steps
+        assert not resume, "resuming a data parallel run is not supported"
+        for freq in (update_timestep, log_freq, print_freq, save_model_freq):
+            assert freq % world_size == 0, "step frequencies must be multiples of the number of ranks"
+
+    if num_envs > 1:
+        # every update consumes update_timestep // num_envs batched steps
+        assert num_actors == 0 and world_size == 1, "num_envs > 1 runs in a single process"
+        assert update_timestep % num_envs == 0, "update_timestep must be a multiple of num_envs"
+        assert vec_env in ('batch', 'subproc'), "unknown vec_env : " + vec_env
+        assert vec_env == 'subproc' or not dense_reward, "BatchPlaceEnv has terminal rewards only"
 
     #####################################################
 
@@ -192,7 +361,16 @@ def train():
 
     # initialize a PPO agent
     ppo_agent = PPO(state_dim, action_dim, graph_emb_dim, graph, lr_actor, lr_critic, gamma, K_epochs, eps_clip, 
-                    has_continuous_action_space, action_std)
+                    has_continuous_action_space, action_std, gcn_input_mode = gcn_input_mode,
+                    minibatch_size = minibatch_size and minibatch_size // world_size,
+                    # actors deliver whole episodes, room for one past update_timestep
+                    buffer_size = update_timestep // world_size + (max_ep_len if num_actors > 0 else 0),
+                    gae_lambda = gae_lambda, gcn_backend = gcn_backend, rollout_bf16 = rollout_bf16,
+                    rollout_compile = rollout_compile, canvas_encoder = canvas_encoder,
+                    single_network = single_network, distributed = world_size > 1, num_envs = num_envs)
+
+
+    checkpointer = AsyncCheckpointer(full_checkpoint_dir, full_checkpoint_prefix, keep_checkpoints)
 
 
     # track total training time
@@ -202,11 +380,6 @@ def train():
     print("============================================================================================")
 
 
-    # logging file
-    log_f = open(log_f_name,"w+")
-    log_f.write('episode,timestep,reward\n')
-
-
     # printing and logging variables
     print_running_reward = 0
     print_running_episodes = 0
@@ -217,40 +390,242 @@ def train():
     time_step = 0
     i_episode = 0
 
+    metrics_offsets = {}
+    if resume_path is not None:
+        checkpoint = load_checkpoint(resume_path)
+        ppo_agent.load_checkpoint_state(checkpoint['agent'])
+        set_rng_state(checkpoint['rng'])
+        time_step = checkpoint['time_step']
+        i_episode = checkpoint['i_episode']
+        print_running_reward, print_running_episodes = checkpoint['print_running']
+        log_running_reward, log_running_episodes = checkpoint['log_running']
+        # same metrics files, records written after the checkpoint are dropped
+        metrics_paths = checkpoint['metrics_paths']
+        metrics_offsets = checkpoint['metrics_offsets']
+        print("resumed at timestep {}, episode {}, logging at : {}".format(
+            time_step, i_episode, ", ".join(metrics_paths.values())))
+        print("============================================================================================")
+
+    # console output goes through the writer thread as well
+    sinks = [ConsoleSink({
+        'placement' : "reward = {reward}",
+        'progress' : "Episode : {episode} \t\t Timestep : {timestep} \t\t Average Reward : {reward}",
+        'actors' : "learner busy : {learner:.0%} \t actors busy : {actors:.0%} (env {actor_env:.0%}, blocked on queue "
+                   "{actor_blocked:.0%}) \t policy version : {version} \t mean staleness : {staleness:.2f} \t "
+                   "dropped episodes : {dropped}",
+    })]
+    sink_types = {'csv' : CsvSink, 'jsonl' : JsonLinesSink, 'bin' : BinarySink}
+    for kind, path in metrics_paths.items():
+        os.makedirs(os.path.dirname(path), exist_ok = True)
+        sinks.append(sink_types[kind](path, offset = metrics_offsets.get(path)))
+    metrics.open(sinks, metrics_flush_interval)
+
+    # set when a save is due, the checkpoint is taken at the end of the
+    # episode so that a resumed run starts with a fresh one
+    checkpoint_due = False
+
+    profiler.enabled = profile or bool(profile_trace_updates)
+    num_updates = time_step // update_timestep
+
+    def update_trace():
+        # the trace window opens before the rollout of update `first` and
+        # closes after update `last`
+        if not profile_trace_updates:
+            return
+        first, last = profile_trace_updates
+        if profiler.events is None and num_updates == first - 1:
+            profiler.start_trace(torch_profile = profile_torch)
+        elif profiler.events is not None and num_updates == last:
+            os.makedirs(trace_dir, exist_ok = True)
+            print("profiler trace saved at : ", ", ".join(profiler.stop_trace(trace_path)))
+
+    def save_checkpoint():
+        # policy weights and full training state, taken at an episode end
+        with profiler.phase('checkpoint'):
+            # flushes the metrics, console output stays in order
+            metrics_offsets = metrics.offsets()
+        print("--------------------------------------------------------------------------------------------")
+        print("saving model at : " + checkpoint_path)
+        with profiler.phase('checkpoint'):
+            if rank == 0:
+                checkpointer.write(checkpoint_path, ppo_agent.policy_old.state_dict())
+            saved_path = checkpointer.save({
+                'agent' : ppo_agent.checkpoint_state(),
+                'rng' : rng_state(),
+                'time_step' : time_step,
+                'i_episode' : i_episode,
+                'print_running' : (print_running_reward, print_running_episodes),
+                'log_running' : (log_running_reward, log_running_episodes),
+                'metrics_paths' : metrics_paths,
+                'metrics_offsets' : metrics_offsets,
+            }, time_step)
+        print("saving full checkpoint at : " + saved_path)
+        print("Elapsed Time  : ", datetime.now().replace(microsecond=0) - start_time)
+        print("--------------------------------------------------------------------------------------------")
+
+    update_trace()
+    profiler.reset()
+
+
+    if num_actors > 0:
+        # actor / learner training loop, episodes arrive whole from the actor
+        # processes and update() runs inside actor_learner.episodes(). It
+        # stops once time_step > max_training_timesteps, so the serial loop
+        # below does not run.
+        from actor_learner import ActorLearner
+        actor_learner = ActorLearner(ppo_agent, placedb, place_env.grid, num_actors, update_timestep, max_staleness,
+                                     seed = random_seed)
+        learner_updates = num_updates
+        episode_start = time.perf_counter()
+        for episode_reward, episode_len, episode_hpwl in actor_learner.episodes():
+            previous_step = time_step
+            time_step += episode_len
+            i_episode += 1
+            episode_end = time.perf_counter()
+            metrics.emit('episode', episode = i_episode, timestep = time_step, reward = episode_reward,
+                         length = episode_len, hpwl = episode_hpwl,
+                         steps_per_sec = episode_len / max(episode_end - episode_start, 1e-9))
+            episode_start = episode_end
+            print_running_reward += episode_reward
+            print_running_episodes += 1
+            log_running_reward += episode_reward
+            log_running_episodes += 1
+
+            if learner_updates + actor_learner.num_updates != num_updates:
+                num_updates = learner_updates + actor_learner.num_updates
+                update_trace()
+
+            # log in logging file
+            if time_step // log_freq != previous_step // log_freq:
+                log_avg_reward = round(log_running_reward / log_running_episodes, 4)
+                metrics.emit('log', episode = i_episode, timestep = time_step, reward = log_avg_reward)
+                log_running_reward = 0
+                log_running_episodes = 0
+
+                if profile:
+                    metrics.flush()
+                    print("--------------------------------------------------------------------------------------------")
+                    print(profiler.summary())
+                    print("--------------------------------------------------------------------------------------------")
+                    profiler.reset()
+
+            # printing average reward and utilization
+            if time_step // print_freq != previous_step // print_freq:
+                print_avg_reward = round(print_running_reward / print_running_episodes, 2)
+                metrics.emit('progress', episode = i_episode, timestep = time_step, reward = print_avg_reward)
+                print_running_reward = 0
+                print_running_episodes = 0
+                metrics.emit('actors', **actor_learner.utilization())
+
+            if time_step // save_model_freq != previous_step // save_model_freq:
+                save_checkpoint()
+
+            if time_step > max_training_timesteps:
+                break
+        actor_learner.close()
+
+
+    if num_envs > 1:
+        # batched training loop, num_envs episodes advance together and
+        # every update collects update_timestep // num_envs rows. Episodes
+        # run across updates (a resumed run starts fresh ones). It stops once
+        # time_step > max_training_timesteps, so the serial loop below does
+        # not run.
+        if vec_env == 'subproc':
+            from env.subproc_vec_env import SubprocPlaceVecEnv
+            batch_env = SubprocPlaceVecEnv(placedb, num_envs, place_env.grid, dense_reward = dense_reward)
+        else:
+            from env.batch_place_env import BatchPlaceEnv
+            batch_env = BatchPlaceEnv(placedb, num_envs, place_env.grid, graph = design_graph)
+        with profiler.phase('env reset'):
+            batch_env.reset()
+        episode_returns = np.zeros(num_envs)
+        episode_lengths = np.zeros(num_envs, dtype = np.int64)
+        while time_step <= max_training_timesteps:
+            previous_step = time_step
+            collect_start = time.perf_counter()
+            episodes = collect_batch_rollout(batch_env, ppo_agent, update_timestep // num_envs,
+                                             episode_returns, episode_lengths)
+            time_step += update_timestep
+            steps_per_sec = update_timestep / max(time.perf_counter() - collect_start, 1e-9)
+            for episode_reward, episode_len, episode_hpwl in episodes:
+                i_episode += 1
+                metrics.emit('episode', episode = i_episode, timestep = time_step, reward = episode_reward,
+                             length = episode_len, hpwl = episode_hpwl, steps_per_sec = steps_per_sec)
+                print_running_reward += episode_reward
+                print_running_episodes += 1
+                log_running_reward += episode_reward
+                log_running_episodes += 1
+
+            # update PPO agent
+            with profiler.phase('update'):
+                ppo_agent.update(next_state = batch_env.observation())
+            num_updates += 1
+            update_trace()
+
+            # log in logging file, once an episode has finished in the interval
+            if time_step // log_freq != previous_step // log_freq and log_running_episodes > 0:
+                log_avg_reward = round(log_running_reward / log_running_episodes, 4)
+                metrics.emit('log', episode = i_episode, timestep = time_step, reward = log_avg_reward)
+                log_running_reward = 0
+                log_running_episodes = 0
+
+                if profile:
+                    metrics.flush()
+                    print("--------------------------------------------------------------------------------------------")
+                    print(profiler.summary())
+                    print("--------------------------------------------------------------------------------------------")
+                    profiler.reset()
+
+            # printing average reward
+            if time_step // print_freq != previous_step // print_freq and print_running_episodes > 0:
+                print_avg_reward = round(print_running_reward / print_running_episodes, 2)
+                metrics.emit('progress', episode = i_episode, timestep = time_step, reward = print_avg_reward)
+                print_running_reward = 0
+                print_running_episodes = 0
+
+            if time_step // save_model_freq != previous_step // save_model_freq:
+                save_checkpoint()
+        batch_env.close()
+
 
     # training loop
-    while time_step <= max_training_timesteps:
+    training_done = False
+    while not training_done and time_step <= max_training_timesteps:
 
-        state = place_env.reset()
+        with profiler.phase('env reset'):
+            state = place_env.reset()
         
         current_ep_reward = 0
+        episode_start = time.perf_counter()
 
         for t in range(1, max_ep_len+1):
 
             # select action with policy
             # print("state[1]", state[1])
             # print("now_node_id = {}".format(state[1]))
-            now_node_id = torch.Tensor([state[1]]).reshape(1)
-            canvas = torch.flatten(torch.from_numpy(state[0]))
-            # print("now_node_id shape", now_node_id.shape)
-            # print("canvas shape", canvas.shape)
-            state_input = torch.cat((now_node_id, canvas)) # now_node_id
+            with profiler.phase('state input'):
+                state_input = make_state_input(state)
             # state_input = torch.tensor([now_node_id], dtype = torch.int32) # (now_node_id, env.graph)
             action = ppo_agent.select_action(state_input)
             # print("action = {}".format(action))
-            state, reward, done, _ = place_env.step(action)
+            with profiler.phase('env step'):
+                state, reward, done, info = place_env.step(action)
             # print("node_pos", state[3])
             # print("====state :", state)
             # saving reward and is_terminals
-            ppo_agent.buffer.rewards.append(reward)
-            ppo_agent.buffer.is_terminals.append(done)
+            with profiler.phase('reward bookkeeping'):
+                ppo_agent.buffer.add_reward(reward, done)
 
-            time_step +=1
-            current_ep_reward += reward
+                time_step += world_size
+                current_ep_reward += reward
 
             # update PPO agent
             if time_step % update_timestep == 0:
-                ppo_agent.update()
+                with profiler.phase('update'):
+                    ppo_agent.update(next_state = None if done else make_state_input(state))
+                num_updates += 1
+                update_trace()
 
             # if continuous action space; then decay action std of ouput action distribution
             if has_continuous_action_space and time_step % action_std_decay_freq == 0:
@@ -263,12 +638,18 @@ def train():
                 log_avg_reward = log_running_reward / log_running_episodes
                 log_avg_reward = round(log_avg_reward, 4)
 
-                log_f.write('{},{},{}\n'.format(i_episode, time_step, log_avg_reward))
-                log_f.flush()
+                metrics.emit('log', episode = i_episode, timestep = time_step, reward = log_avg_reward)
 
                 log_running_reward = 0
                 log_running_episodes = 0
 
+                if profile:
+                    metrics.flush()
+                    print("--------------------------------------------------------------------------------------------")
+                    print(profiler.summary())
+                    print("--------------------------------------------------------------------------------------------")
+                    profiler.reset()
+
             # printing average reward
             if time_step % print_freq == 0:
 
@@ -276,24 +657,29 @@ def train():
                 print_avg_reward = print_running_reward / print_running_episodes
                 print_avg_reward = round(print_avg_reward, 2)
 
-                print("Episode : {} \t\t Timestep : {} \t\t Average Reward : {}".format(i_episode, time_step, print_avg_reward))
+                metrics.emit('progress', episode = i_episode, timestep = time_step, reward = print_avg_reward)
 
                 print_running_reward = 0
                 print_running_episodes = 0
 
-            # save model weights
+            # save model weights and full training state
             if time_step % save_model_freq == 0:
-                print("--------------------------------------------------------------------------------------------")
-                print("saving model at : " + checkpoint_path)
-                ppo_agent.save(checkpoint_path)
-                print("model saved")
-                print("Elapsed Time  : ", datetime.now().replace(microsecond=0) - start_time)
-                print("--------------------------------------------------------------------------------------------")
+                checkpoint_due = True
+
+            # time_step moves in lockstep on all ranks but episodes end at
+            # different steps, every rank stops at this step so that none is
+            # left waiting in the gradient all-reduce of update()
+            if world_size > 1 and time_step > max_training_timesteps:
+                training_done = True
+                break
 
             # break; if the episode is over
             if done:
                 break
 
+        if training_done:
+            break
+
         print_running_reward += current_ep_reward
         print_running_episodes += 1
 
@@ -302,10 +688,27 @@ def train():
 
         i_episode += 1
 
+        metrics.emit('episode', episode = i_episode, timestep = time_step, reward = current_ep_reward, length = t,
+                     hpwl = info["hpwl"], steps_per_sec = t / max(time.perf_counter() - episode_start, 1e-9))
 
-    log_f.close()
+        if checkpoint_due:
+            checkpoint_due = False
+            save_checkpoint()
+
+
+    checkpointer.close()
+    if profiler.events is not None:
+        # training ended inside the trace window
+        os.makedirs(trace_dir, exist_ok = True)
+        print("profiler trace saved at : ", ", ".join(profiler.stop_trace(trace_path)))
+    metrics.close()
     place_env.close()
 
+    if smoke_test and world_size > 1:
+        max_diff = max_replica_difference(ppo_agent.policy)
+        assert max_diff == 0.0, "rank weights differ by {}".format(max_diff)
+        print("ranks stopped at timestep {} with identical weights".format(time_step))
+
 
 
 